@@ -0,0 +1,78 @@
+# app/bench_ann.py
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+from typing import List, Optional, Set
+
+from settings import DATABASE_URL, require_env
+
+
+def exact_ids(conn, q: str, k: int, doc_id: Optional[str]) -> Set[str]:
+    # Materialized CTE: the planner can't use the ANN index, so this is the ground truth.
+    rows = conn.execute(
+        """
+        with scored as materialized (
+          select id, embedding <=> %s::vector as dist
+          from chunks
+          where %s::uuid is null or doc_id = %s::uuid
+        )
+        select id from scored order by dist limit %s
+        """,
+        (q, doc_id, doc_id, k),
+    ).fetchall()
+    return {str(r[0]) for r in rows}
+
+
+def main() -> None:
+    # Allow: python app/bench_ann.py [n_queries] [k] [doc_id]
+    # Needs DATABASE_URL and sql/004 + sql/005 applied.
+    n_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    doc_id = sys.argv[3] if len(sys.argv) > 3 else None
+    require_env("DATABASE_URL", DATABASE_URL)
+
+    import psycopg
+
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        total = conn.execute("select count(*) from chunks").fetchone()[0]
+        # Real chunk embeddings as queries (what handbook headings look like is unknown here).
+        queries: List[str] = [
+            r[0]
+            for r in conn.execute(
+                "select embedding::text from chunks order by random() limit %s", (n_queries,)
+            ).fetchall()
+        ]
+        print(f"chunks={total} queries={len(queries)} k={k} doc={doc_id or 'all'}")
+
+        truth = []
+        t_exact: List[float] = []
+        for q in queries:
+            t0 = time.perf_counter()
+            truth.append(exact_ids(conn, q, k, doc_id))
+            t_exact.append(time.perf_counter() - t0)
+        print(f"exact        recall@{k}=1.000  p50={statistics.median(t_exact) * 1000:6.1f}ms")
+
+        for ef in (16, 40, 64, 128, 256):
+            recalls: List[float] = []
+            lat: List[float] = []
+            for q, gold in zip(queries, truth):
+                t0 = time.perf_counter()
+                rows = conn.execute(
+                    "select id from match_chunks_v2(%s::vector, %s, %s::uuid, %s, %s, 0)",
+                    (q, k, doc_id, ef, max(1, ef // 8)),
+                ).fetchall()
+                lat.append(time.perf_counter() - t0)
+                got = {str(r[0]) for r in rows}
+                recalls.append(len(got & gold) / max(len(gold), 1))
+            lat.sort()
+            p95 = lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+            print(
+                f"ef_search={ef:<4} recall@{k}={statistics.mean(recalls):.3f}  "
+                f"p50={statistics.median(lat) * 1000:6.1f}ms  p95={p95 * 1000:6.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
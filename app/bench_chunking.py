@@ -0,0 +1,78 @@
+# app/bench_chunking.py
+from __future__ import annotations
+
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from ingest import Chunk, chunk_pages, extract_text_from_pdf, iter_sentence_chunks
+from resources import get_embedder
+from retrieval_local import LocalVectorStore
+
+
+def make_queries(pages: List[Tuple[int, str]], n: int, seed: int = 0) -> List[Tuple[str, int]]:
+    """(sentence, page) pairs sampled from the document; a hit must come from that page."""
+    rng = random.Random(seed)
+    pool = [
+        (" ".join(s.split()), page)
+        for page, text in pages
+        for s in re.split(r"(?<=[.!?])\s+", text)
+        if len(s.split()) >= 8
+    ]
+    return rng.sample(pool, min(n, len(pool)))
+
+
+def evaluate(name: str, chunks: List[Chunk], queries: List[Tuple[str, int]], top_k: int) -> None:
+    model = get_embedder()
+
+    t0 = time.perf_counter()
+    vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
+    embed_s = time.perf_counter() - t0
+
+    store = LocalVectorStore()
+    store.add(
+        [
+            {"document_id": "bench", "chunk_index": c.idx, "content": c.text, "pages": c.pages, "embedding": v}
+            for c, v in zip(chunks, vectors)
+        ]
+    )
+    q_vecs = model.encode([q for q, _ in queries], normalize_embeddings=True)
+    results = store.search_batch(q_vecs, top_k=top_k)
+    hits = sum(any(page in h["pages"] for h in res) for (_, page), res in zip(queries, results))
+
+    avg_chars = sum(len(c.text) for c in chunks) / max(len(chunks), 1)
+    print(
+        f"{name:<10} chunks={len(chunks):<6} avg_chars={avg_chars:<7.0f} "
+        f"embed={embed_s:.2f}s hit@{top_k}={hits / max(len(queries), 1):.3f}"
+    )
+
+
+def main() -> None:
+    # Allow: python app/bench_chunking.py "Sample PDF.pdf" [n_queries] [top_k]
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("Sample PDF.pdf")
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path.resolve()}")
+
+    pages = extract_text_from_pdf(str(pdf_path))
+    queries = make_queries(pages, n_queries)
+    print(f"pages={len(pages)} queries={len(queries)}")
+
+    t0 = time.perf_counter()
+    char_chunks = chunk_pages(pages)
+    print(f"chars chunking:     {time.perf_counter() - t0:.3f}s")
+    t0 = time.perf_counter()
+    sent_chunks = list(iter_sentence_chunks(pages))
+    print(f"sentences chunking: {time.perf_counter() - t0:.3f}s")
+
+    evaluate("chars", char_chunks, queries, top_k)
+    evaluate("sentences", sent_chunks, queries, top_k)
+
+
+if __name__ == "__main__":
+    main()
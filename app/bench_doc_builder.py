@@ -0,0 +1,80 @@
+# app/bench_doc_builder.py
+from __future__ import annotations
+
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import List
+
+from doc_builder import MarkdownBuilder, word_count
+from llm_mock import MockLLM
+
+
+def make_sections(total_words: int, section_words: int = 1600) -> List[str]:
+    llm = MockLLM()
+    sections: List[str] = []
+    words = 0
+    while words < total_words:
+        md = llm.generate(f'Now write this section:\n- Start with "## Section {len(sections) + 1}"')
+        sections.append(md)
+        words += word_count(md)
+    return sections
+
+
+def assemble_rejoin(sections: List[str]) -> int:
+    """The old handbook loop: re-join and re-count the whole document per section."""
+    parts: List[str] = []
+    total = 0
+    for md in sections:
+        parts.append(md)
+        total = len(re.findall(r"\b\w+\b", "\n\n".join(parts)))
+    return total
+
+
+def assemble_builder(sections: List[str], path: str = None, with_tokens: bool = False) -> int:
+    with MarkdownBuilder(path=path, keep_text=path is None, with_tokens=with_tokens) as doc:
+        for md in sections:
+            doc.append(md)
+        return doc.words
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    # Allow: python app/bench_doc_builder.py [total_words ...]
+    sizes = [int(a) for a in sys.argv[1:]] or [20_000, 100_000, 200_000]
+
+    for total_words in sizes:
+        sections = make_sections(total_words)
+        old_words, t_old = timed(assemble_rejoin, sections)
+        new_words, t_new = timed(assemble_builder, sections)
+        _, t_tok = timed(assemble_builder, sections, with_tokens=True)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "handbook.md")
+            disk_words, t_disk = timed(assemble_builder, sections, path=path)
+
+        if not old_words == new_words == disk_words:
+            raise AssertionError(f"Word counts differ: {old_words} vs {new_words} vs {disk_words}")
+
+        print(
+            f"{new_words:>7} words / {len(sections):>3} sections: "
+            f"re-join {t_old * 1000:8.1f}ms · builder {t_new * 1000:6.1f}ms "
+            f"(+tokens {t_tok * 1000:6.1f}ms, streamed to disk {t_disk * 1000:6.1f}ms) · "
+            f"{t_old / max(t_new, 1e-9):.0f}x"
+        )
+
+    llm = MockLLM()
+    prompt = 'Now write this section:\n- Start with "## Mock"'
+    n = 200
+    _, t_mock = timed(lambda: [llm.generate(prompt) for _ in range(n)])
+    print(f"MockLLM section: {t_mock * 1000 / n:.2f}ms each")
+
+
+if __name__ == "__main__":
+    main()
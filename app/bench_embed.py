@@ -0,0 +1,65 @@
+# app/bench_embed.py
+from __future__ import annotations
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embed_onnx import OnnxEmbedder, export_onnx, is_verified, onnx_model_dir, read_meta
+from ingest import extract_text_from_pdf, iter_document_chunks
+from settings import EMBED_MODEL, EMBED_ONNX_DIR, EMBED_ONNX_MIN_COSINE
+
+
+def main() -> None:
+    # Allow: python app/bench_embed.py "Sample PDF.pdf" [n_sentences] [batch_size]
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("Sample PDF.pdf")
+    n_sentences = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path.resolve()}")
+
+    chunks = [c.text for c in iter_document_chunks(extract_text_from_pdf(str(pdf_path)))]
+    texts = (chunks * (n_sentences // max(len(chunks), 1) + 1))[:n_sentences]
+    print(f"model={EMBED_MODEL} texts={len(texts)} (from {len(chunks)} chunks) batch={batch_size}")
+
+    def run(name: str, load) -> np.ndarray:
+        t0 = time.perf_counter()
+        model = load()
+        load_s = time.perf_counter() - t0
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        t0 = time.perf_counter()
+        vecs = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        elapsed = time.perf_counter() - t0
+        line = f"{name:<22} load {load_s:5.1f}s  {len(texts) / elapsed:7.1f} sentences/s"
+        if reference is not None:
+            cos = (vecs * reference).sum(axis=1)
+            line += f"  cosine vs torch min={cos.min():.4f} mean={cos.mean():.5f}"
+        print(line)
+        return np.asarray(vecs, dtype=np.float32)
+
+    def torch_model():
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(EMBED_MODEL, device="cpu")
+
+    reference = None
+    reference = run("torch", torch_model)
+
+    for quantize in (False, True):
+        model_dir = onnx_model_dir(EMBED_ONNX_DIR, EMBED_MODEL, quantize)
+        if not is_verified(model_dir):
+            export_onnx(EMBED_MODEL, model_dir, quantize=quantize, min_cos=EMBED_ONNX_MIN_COSINE)
+        label = "onnx-int8" if quantize else "onnx"
+        tuned = int(read_meta(model_dir).get("threads", 0))
+        cores = os.cpu_count() or 1
+        for threads in sorted({1, tuned, cores} - {0}):
+            tag = " (tuned)" if threads == tuned else ""
+            run(f"{label} {threads}t{tag}", lambda: OnnxEmbedder(model_dir, threads=threads, batch_size=batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# app/bench_extract.py
+from __future__ import annotations
+
+import os
+import sys
+import time
+from pathlib import Path
+
+from ingest import extract_text_from_pdf, extract_text_from_pdf_parallel
+
+
+def main() -> None:
+    # Allow: python app/bench_extract.py "Sample PDF.pdf" [workers]
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("Sample PDF.pdf")
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path.resolve()}")
+
+    t0 = time.perf_counter()
+    serial = extract_text_from_pdf(str(pdf_path))
+    t_serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    parallel = extract_text_from_pdf_parallel(str(pdf_path), workers=workers, min_pages_per_worker=1)
+    t_parallel = time.perf_counter() - t0
+
+    if serial != parallel:
+        raise AssertionError("Parallel extraction output differs from serial output")
+
+    print(f"pages with text: {len(serial)}")
+    print(f"serial:   {t_serial:.2f}s")
+    print(f"parallel: {t_parallel:.2f}s ({workers} workers)")
+    print(f"speed-up: {t_serial / max(t_parallel, 1e-9):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# app/bench_hybrid.py
+from __future__ import annotations
+
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Set, Tuple
+
+from ingest import Chunk, extract_text_from_pdf, iter_document_chunks
+from lexical import BM25Index, rrf_fuse
+from resources import get_embedder
+from retrieval_local import LocalVectorStore
+
+# Manual-style fixture: near-identical prose that differs only in codes and numbers,
+# which is exactly where embeddings alone struggle.
+_SYMPTOMS = [
+    "the pump does not start after power-on",
+    "the pressure reading drifts during operation",
+    "the controller reboots under load",
+    "the display shows no output",
+    "the valve fails to close fully",
+    "the motor overheats after a few minutes",
+]
+_ACTIONS = [
+    "check the fuse and the supply cable",
+    "recalibrate the sensor from the service menu",
+    "update the controller firmware",
+    "replace the display ribbon cable",
+    "clean the valve seat and retest",
+    "verify the fan and the airflow path",
+]
+
+
+def fixture_chunks(n: int = 600, seed: int = 0) -> List[Chunk]:
+    rng = random.Random(seed)
+    chunks: List[Chunk] = []
+    for i in range(n):
+        code = f"E-{1000 + i}"
+        section = f"{1 + i // 60}.{1 + (i // 6) % 10}.{1 + i % 6}"
+        text = (
+            f"Section {section}. Error {code}: {rng.choice(_SYMPTOMS)}. "
+            f"If {code} persists, {rng.choice(_ACTIONS)}. See also the {rng.choice(['PLC', 'HMI', 'VFD'])} manual."
+        )
+        chunks.append(Chunk(idx=i, text=text, pages=[1 + i // 6]))
+    return chunks
+
+
+def fixture_queries(chunks: List[Chunk], n: int, seed: int = 0) -> List[Tuple[str, Set[int]]]:
+    rng = random.Random(seed)
+    out: List[Tuple[str, Set[int]]] = []
+    for c in rng.sample(chunks, min(n, len(chunks))):
+        code = re.search(r"E-\d+", c.text).group(0)
+        out.append((f"What does error {code} mean and how do I fix it?", {c.idx}))
+    return out
+
+
+def term_queries(chunks: List[Chunk], n: int, seed: int = 0) -> List[Tuple[str, Set[int]]]:
+    """Queries built around exact terms (codes, numbers, acronyms) found in the document."""
+    rng = random.Random(seed)
+    term_re = re.compile(r"\b(?:[A-Z]{2,}[A-Z0-9]*|\w*\d[\w.\-]*\w)\b")
+    by_term = {}
+    for c in chunks:
+        for t in set(term_re.findall(c.text)):
+            by_term.setdefault(t, set()).add(c.idx)
+    # Terms that pinpoint a few chunks are the interesting case.
+    rare = [t for t, idx in by_term.items() if len(idx) <= 3 and len(t) >= 3]
+    out: List[Tuple[str, Set[int]]] = []
+    for t in rng.sample(rare, min(n, len(rare))):
+        c = chunks[min(by_term[t])]
+        words = [w for w in re.findall(r"[A-Za-z]{4,}", c.text) if w != t]
+        context = " ".join(rng.sample(words, min(2, len(words))))
+        out.append((f"{t} {context}", by_term[t]))
+    return out
+
+
+def main() -> None:
+    # Allow: python app/bench_hybrid.py ["Sample PDF.pdf"] [n_queries] [top_k]
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != "-" else None
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    if pdf_path is not None:
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF not found: {pdf_path.resolve()}")
+        chunks = list(iter_document_chunks(extract_text_from_pdf(str(pdf_path))))
+        queries = term_queries(chunks, n_queries)
+    else:
+        chunks = fixture_chunks()
+        queries = fixture_queries(chunks, n_queries)
+    print(f"chunks={len(chunks)} queries={len(queries)} top_k={top_k}")
+
+    model = get_embedder()
+    rows = [{"document_id": "bench", "chunk_index": c.idx, "content": c.text, "pages": c.pages} for c in chunks]
+    store = LocalVectorStore()
+    vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
+    store.add([dict(r, embedding=v) for r, v in zip(rows, vectors)])
+
+    t0 = time.perf_counter()
+    lexical = BM25Index()
+    lexical.add(rows)
+    lexical.scores("warm-up")  # compile postings
+    print(f"bm25 build: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    q_vecs = model.encode([q for q, _ in queries], normalize_embeddings=True)
+    vector_results = store.search_batch(q_vecs, top_k=2 * top_k)
+
+    recall = {"vector": [], "bm25": [], "hybrid": []}
+    lex_ms: List[float] = []
+    for (q, gold), vec_hits in zip(queries, vector_results):
+        t0 = time.perf_counter()
+        lex_hits = lexical.search(q, top_k=2 * top_k)
+        fused = rrf_fuse([vec_hits, lex_hits], top_k=top_k)
+        lex_ms.append((time.perf_counter() - t0) * 1000)
+
+        for name, hits in (("vector", vec_hits[:top_k]), ("bm25", lex_hits[:top_k]), ("hybrid", fused)):
+            found = {h["chunk_index"] for h in hits} & gold
+            recall[name].append(len(found) / len(gold))
+
+    for name, values in recall.items():
+        print(f"{name:<7} recall@{top_k}={statistics.mean(values):.3f}")
+    lex_ms.sort()
+    print(
+        f"hybrid overhead (bm25 + fusion): p50={statistics.median(lex_ms):.2f}ms "
+        f"p95={lex_ms[min(len(lex_ms) - 1, int(0.95 * len(lex_ms)))]:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
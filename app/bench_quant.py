@@ -0,0 +1,87 @@
+# app/bench_quant.py
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from retrieval_local import LocalVectorStore
+
+
+def synthetic_embeddings(n: int, dim: int = 384, clusters: int = 500, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors: topic centroids plus per-chunk noise."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    x = centroids[rng.integers(0, clusters, n)] + rng.normal(size=(n, dim)).astype(np.float32) * 0.6
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def main() -> None:
+    # Allow: python app/bench_quant.py [embeddings.npy | -] [n_rows] [n_queries] [top_k]
+    source = sys.argv[1] if len(sys.argv) > 1 else "-"
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    top_k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+    if source == "-":
+        vectors = synthetic_embeddings(n_rows)
+    else:
+        vectors = np.load(source).astype(np.float32)[:n_rows]
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    dim = vectors.shape[1]
+
+    # Queries: stored vectors nudged off their position, like a paraphrased chunk.
+    rng = np.random.default_rng(1)
+    noise = rng.normal(size=(n_queries, dim)).astype(np.float32) * 0.3
+    queries = vectors[rng.integers(0, len(vectors), n_queries)] + noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    rows = [
+        {"document_id": "bench", "chunk_index": i, "content": "", "pages": [], "embedding": v}
+        for i, v in enumerate(vectors)
+    ]
+    print(f"rows={len(rows)} dim={dim} queries={n_queries} top_k={top_k}")
+
+    configs = [
+        ("float32 exact", dict()),
+        ("int8 + float rescore", dict(quantize="int8", rescore_factor=4)),
+        ("int8 only", dict(quantize="int8", keep_float=False)),
+        ("binary + float x4", dict(quantize="binary", rescore_factor=4)),
+        ("binary + float x16", dict(quantize="binary", rescore_factor=16)),
+        ("binary + int8 x16", dict(quantize="binary", keep_float=False, rescore_factor=16)),
+        ("binary + int8 x32", dict(quantize="binary", keep_float=False, rescore_factor=32)),
+    ]
+
+    gold: List[set] = []
+    base_bytes = 0
+    for name, kwargs in configs:
+        store = LocalVectorStore(dim=dim, **kwargs)
+        store.add(rows)
+        if not gold:
+            base_bytes = store.memory_bytes()
+
+        latencies: List[float] = []
+        results = []
+        for q in queries:
+            t0 = time.perf_counter()
+            results.append(store.search(q, top_k=top_k))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        found = [{h["chunk_index"] for h in hits} for hits in results]
+        if not gold:
+            gold = found
+        recall = statistics.mean(len(f & g) / max(len(g), 1) for f, g in zip(found, gold))
+
+        mem = store.memory_bytes()
+        latencies.sort()
+        print(
+            f"{name:<22} {mem / 2**20:8.1f} MiB ({base_bytes / max(mem, 1):4.1f}x smaller) "
+            f"recall@{top_k}={recall:.3f}  p50={statistics.median(latencies):6.2f}ms "
+            f"p95={latencies[int(0.95 * (len(latencies) - 1))]:6.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
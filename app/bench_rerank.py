@@ -0,0 +1,71 @@
+# app/bench_rerank.py
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from bench_chunking import make_queries
+from ingest import extract_text_from_pdf, iter_document_chunks
+from rerank import get_reranker
+from resources import get_embedder
+from retrieval_local import LocalVectorStore
+
+
+def main() -> None:
+    # Allow: python app/bench_rerank.py "Sample PDF.pdf" [n_queries] [top_k]
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("Sample PDF.pdf")
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path.resolve()}")
+
+    pages = extract_text_from_pdf(str(pdf_path))
+    chunks = list(iter_document_chunks(pages))
+    queries = make_queries(pages, n_queries)
+
+    model = get_embedder()
+    store = LocalVectorStore()
+    vectors = model.encode([c.text for c in chunks], normalize_embeddings=True)
+    store.add(
+        [
+            {"document_id": "bench", "chunk_index": c.idx, "content": c.text, "pages": c.pages, "embedding": v}
+            for c, v in zip(chunks, vectors)
+        ]
+    )
+    q_vecs = model.encode([q for q, _ in queries], normalize_embeddings=True)
+    print(f"chunks={len(chunks)} queries={len(queries)} top_k={top_k}")
+
+    def hit_rate(results) -> float:
+        return sum(any(page in h["pages"] for h in res) for (_, page), res in zip(queries, results)) / len(queries)
+
+    base = store.search_batch(q_vecs, top_k=top_k)
+    print(f"vector only       hit@{top_k}={hit_rate(base):.3f}")
+
+    reranker = get_reranker()
+    for factor in (2, 4, 8):
+        candidates = store.search_batch(q_vecs, top_k=factor * top_k)
+        for label in ("cold", "cached"):
+            per_query = []
+            results = []
+            for (q, _), hits in zip(queries, candidates):
+                t0 = time.perf_counter()
+                results.append(reranker.rerank(q, hits, top_k=top_k, path="bench"))
+                per_query.append((time.perf_counter() - t0) * 1000)
+            print(
+                f"rerank {factor}x ({label:<6}) hit@{top_k}={hit_rate(results):.3f} "
+                f"+{statistics.median(per_query):.1f}ms p50 / +{max(per_query):.1f}ms max per query"
+            )
+
+    # Handbook-style: every section's candidates in one predict() call.
+    reranker.clear_cache()
+    candidates = store.search_batch(q_vecs, top_k=4 * top_k)
+    t0 = time.perf_counter()
+    reranker.rerank_batch([q for q, _ in queries], candidates, top_k=top_k, path="bench-batch")
+    print(f"rerank 4x batched: {(time.perf_counter() - t0) * 1000 / len(queries):.1f}ms per query")
+
+
+if __name__ == "__main__":
+    main()
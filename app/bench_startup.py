@@ -0,0 +1,91 @@
+# app/bench_startup.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Must not be imported before the user indexes a PDF or asks a question.
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "pdfplumber",
+    "supabase",
+    "psycopg",
+    "openai",
+    "tiktoken",
+)
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def render_once() -> None:
+    """Child process: render main.py once and report timing plus which heavy modules got loaded."""
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    framework_s = time.perf_counter() - t0
+    app = AppTest.from_file(os.path.join(APP_DIR, "main.py"), default_timeout=120)
+    t0 = time.perf_counter()
+    app.run()
+    render_s = time.perf_counter() - t0
+
+    loaded = sorted(m for m in HEAVY_MODULES if m in sys.modules)
+    errors = [e.value for e in app.exception]
+    print(json.dumps({"framework_s": framework_s, "render_s": render_s, "heavy": loaded, "errors": errors}))
+
+
+def top_imports(stderr: str, top: int) -> List[Tuple[str, float]]:
+    """Cumulative import time (ms) per top-level package, from `python -X importtime` output."""
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m and len(m.group(3)) == 1:  # direct imports only; nested ones are in their parent's total
+            totals[m.group(4).split(".")[0]] += int(m.group(2)) / 1000.0
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def main() -> None:
+    # Allow: python app/bench_startup.py [top_n]
+    if len(sys.argv) > 1 and sys.argv[1] == "--render":
+        render_once()
+        return
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--render"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(APP_DIR),
+    )
+    wall_s = time.perf_counter() - t0
+    if proc.returncode != 0:
+        sys.exit(proc.stderr[-4000:])
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"Top {top} imports by cumulative time (first render):")
+    for name, ms in top_imports(proc.stderr, top):
+        print(f"  {name:<28} {ms:8.1f} ms")
+    print(
+        f"time to first render: {report['render_s']:.2f}s script + {report['framework_s']:.2f}s streamlit import "
+        f"({wall_s:.2f}s process wall time, importtime overhead included)"
+    )
+    for err in report["errors"]:
+        print(f"  render error: {err}")
+
+    if report["heavy"]:
+        sys.exit(f"FAIL: heavy modules imported before first use: {', '.join(report['heavy'])}")
+    print("OK: no heavy modules imported by the first render")
+
+
+if __name__ == "__main__":
+    main()
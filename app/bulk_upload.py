@@ -0,0 +1,266 @@
+# app/bulk_upload.py
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def vector_literal(vec: Sequence[float], digits: int = 6) -> str:
+    """
+    Compact pgvector text literal, e.g. "[0.0123,-0.4]".
+    ~9 chars per dimension instead of ~20 for a JSON float list; well within
+    float32 precision for normalized embeddings.
+    """
+    return "[" + ",".join(f"{x:.{digits}g}" for x in vec) + "]"
+
+
+# SQLSTATE classes worth retrying: connection exceptions (08), transaction
+# rollbacks such as serialization failures and deadlocks (40), insufficient
+# resources (53) and admin shutdown / cannot-connect-now (57P).
+_TRANSIENT_SQLSTATES = ("08", "40", "53", "57P")
+
+# The chunk columns both sinks write (sql/001_tables.sql). The unique index
+# chunks_doc_chunk_hash_uidx on CONFLICT_COLUMNS makes retried batches no-ops.
+CHUNK_COLUMNS = ("doc_id", "chunk_index", "content", "content_hash", "pages", "embedding")
+CONFLICT_COLUMNS = ("doc_id", "chunk_index", "content_hash")
+
+
+def is_transient(e: BaseException) -> bool:
+    """Errors worth retrying: timeouts, dropped connections, HTTP 429/5xx, transient SQLSTATEs."""
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(e, "status_code", None)
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    if status is not None:
+        return status == 429 or status >= 500
+
+    # postgrest's APIError.code and psycopg's sqlstate are SQLSTATE strings, never HTTP statuses.
+    sqlstate = getattr(e, "sqlstate", None) or getattr(e, "code", None)
+    if isinstance(sqlstate, str) and len(sqlstate) == 5 and sqlstate.isalnum():
+        return sqlstate.upper().startswith(_TRANSIENT_SQLSTATES)
+
+    name = type(e).__name__.lower()
+    text = str(e).lower()
+    return any(s in name for s in ("timeout", "connect", "operational")) or any(
+        s in text for s in ("timed out", "timeout", "connection reset", "temporarily", "503", "502", "429")
+    )
+
+
+def chunk_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A chunk row reduced to CHUNK_COLUMNS. Also accepts the document_id /
+    metadata.pages spelling used by the local store.
+    """
+    pages = row.get("pages")
+    if pages is None:
+        pages = (row.get("metadata") or {}).get("pages") or []
+    return {
+        "doc_id": row.get("doc_id") or row["document_id"],
+        "chunk_index": row["chunk_index"],
+        "content": row["content"],
+        "content_hash": row.get("content_hash"),
+        "pages": [int(p) for p in pages],
+        "embedding": row["embedding"],
+    }
+
+
+class ChunkSink(ABC):
+    """Writes one batch of chunk rows. Must be idempotent, so a retried batch can't duplicate rows."""
+
+    @abstractmethod
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+
+class SupabaseRestSink(ChunkSink):
+    """
+    PostgREST upsert of CHUNK_COLUMNS that ignores rows already present (unique on
+    CONFLICT_COLUMNS), with text-literal vectors.
+    """
+
+    def __init__(self, client: Any, table: str = "chunks"):
+        self.client = client
+        self.table = table
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        payload = []
+        for r in rows:
+            rec = chunk_record(r)
+            rec["embedding"] = vector_literal(rec["embedding"])
+            payload.append(rec)
+        res = (
+            self.client.table(self.table)
+            .upsert(payload, on_conflict=",".join(CONFLICT_COLUMNS), ignore_duplicates=True)
+            .execute()
+        )
+        if res.data is None:
+            raise RuntimeError(f"Chunk upsert failed: {res}")
+
+
+class PostgresCopySink(ChunkSink):
+    """
+    COPY into a temp staging table, then INSERT ... ON CONFLICT DO NOTHING, over a
+    direct Postgres connection (Supabase's DB URL or a local Postgres+pgvector).
+    Writes CHUNK_COLUMNS, like SupabaseRestSink. One connection per uploader thread.
+    """
+
+    def __init__(self, dsn: str, table: str = "chunks"):
+        self.dsn = dsn
+        self.table = table
+        self._local = threading.local()
+
+    def _conn(self) -> Any:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            import psycopg
+
+            conn = psycopg.connect(self.dsn)
+            self._local.conn = conn
+        return conn
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        cols = ", ".join(CHUNK_COLUMNS)
+        conflict = ", ".join(CONFLICT_COLUMNS)
+        conn = self._conn()
+        try:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(
+                    f"create temp table if not exists _chunks_stage "
+                    f"(like {self.table} including defaults) on commit delete rows"
+                )
+                with cur.copy(f"copy _chunks_stage ({cols}) from stdin") as copy:
+                    for r in rows:
+                        rec = chunk_record(r)
+                        copy.write_row(
+                            (
+                                rec["doc_id"],
+                                rec["chunk_index"],
+                                rec["content"],
+                                rec["content_hash"],
+                                "{" + ",".join(str(p) for p in rec["pages"]) + "}",
+                                vector_literal(rec["embedding"]),
+                            )
+                        )
+                cur.execute(
+                    f"insert into {self.table} ({cols}) select {cols} from _chunks_stage "
+                    f"on conflict ({conflict}) do nothing"
+                )
+        except Exception:
+            # A broken connection is rebuilt on the next attempt.
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._local.conn = None
+            raise
+
+
+class BulkUploader:
+    """
+    Feeds rows to a ChunkSink in parallel batches.
+
+    - Adaptive sizing: batches grow while they finish under `target_s` and halve
+      when they are slow or fail (bounded by min/max_batch).
+    - Up to `max_in_flight` batches are written concurrently.
+    - Transient failures are retried with exponential backoff and jitter; the
+      sink is idempotent, so a retried batch never duplicates rows.
+
+    Use add() for each row, then close() to flush and re-raise the first error.
+    """
+
+    def __init__(
+        self,
+        sink: ChunkSink,
+        batch_size: int = 100,
+        min_batch: int = 20,
+        max_batch: int = 1000,
+        max_in_flight: int = 4,
+        retries: int = 5,
+        target_s: float = 1.0,
+        backoff_s: float = 0.5,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.retries = retries
+        self.target_s = target_s
+        self.backoff_s = backoff_s
+
+        self.rows_written = 0
+        self.batches = 0
+        self.retried = 0
+        self.busy_s = 0.0
+
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="chunk-upload")
+        self._futures: List[Future] = []
+        self._error: Optional[BaseException] = None
+
+    def add(self, row: Dict[str, Any]) -> None:
+        if self._error is not None:
+            raise self._error
+        self._buf.append(row)
+        if len(self._buf) >= self.batch_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        batch, self._buf = self._buf, []
+        self._slots.acquire()  # backpressure: at most max_in_flight batches queued/running
+        self._futures.append(self._pool.submit(self._write, batch))
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            for attempt in range(self.retries + 1):
+                t0 = time.perf_counter()
+                try:
+                    self.sink.write(batch)
+                except Exception as e:
+                    self._resize(slow=True)
+                    if attempt >= self.retries or not is_transient(e):
+                        self._error = self._error or e
+                        raise
+                    with self._lock:
+                        self.retried += 1
+                    delay = self.backoff_s * (2 ** attempt) * (0.5 + random.random())
+                    logging.warning("Chunk batch failed (%s); retry %d in %.1fs", e, attempt + 1, delay)
+                    time.sleep(delay)
+                    continue
+
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self.rows_written += len(batch)
+                    self.batches += 1
+                    self.busy_s += elapsed
+                self._resize(slow=elapsed > 2 * self.target_s, fast=elapsed < self.target_s / 2)
+                return
+        finally:
+            self._slots.release()
+
+    def _resize(self, slow: bool = False, fast: bool = False) -> None:
+        with self._lock:
+            if slow:
+                self.batch_size = max(self.min_batch, self.batch_size // 2)
+            elif fast:
+                self.batch_size = min(self.max_batch, int(self.batch_size * 1.5) + 1)
+
+    def close(self) -> None:
+        try:
+            if self._buf and self._error is None:
+                self._submit()
+            for fut in self._futures:
+                fut.exception()  # wait for every batch
+        finally:
+            self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,186 @@
+# app/context_pack.py
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+# Prompt budgets (tokens) for retrieved excerpts, per model family.
+# Keys are matched as prefixes of the model name; "default" is the fallback.
+# Tokens are counted with tiktoken's o200k_base (see requirements.txt). Grok's
+# tokenizer isn't public, so for Grok models counts (and budgets) are approximate.
+CONTEXT_BUDGETS: Dict[str, Dict[str, int]] = {
+    "grok-4": {"chat": 2000, "section": 3500, "memory": 500},
+    "default": {"chat": 1500, "section": 3000, "memory": 500},
+}
+
+
+def budget_for(model: Optional[str], kind: str) -> int:
+    """Token budget for `kind` ("chat", "section", "memory") for this model."""
+    name = (model or "").lower()
+    for prefix, budgets in CONTEXT_BUDGETS.items():
+        if prefix != "default" and name.startswith(prefix):
+            return budgets[kind]
+    return CONTEXT_BUDGETS["default"][kind]
+
+
+@lru_cache(maxsize=8)
+def _encoding(name: str) -> Any:
+    """
+    The tiktoken encoding, imported on first count (keeps app startup light).
+    If tiktoken or its encoding file is unavailable, counts fall back to
+    ~4 chars/token; cached, so that is logged once per encoding.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(
+            "tiktoken encoding %r unavailable (%s); token budgets and 'tokens saved' figures "
+            "are estimates (len(text) / 4) until it is installed",
+            name,
+            e,
+        )
+        return None
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """Tokens in `text` under a tiktoken encoding (approximate for non-OpenAI models such as Grok)."""
+    enc = _encoding(encoding)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, encoding: str = "o200k_base") -> str:
+    """Cut text to max_tokens, backing off to the last line/sentence break when possible."""
+    if count_tokens(text, encoding) <= max_tokens:
+        return text
+    enc = _encoding(encoding)
+    if enc is None:
+        cut = text[: max_tokens * 4]
+    else:
+        cut = enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    brk = max(cut.rfind("\n"), cut.rfind(". "))
+    return cut[: brk + 1] if brk > len(cut) // 2 else cut
+
+
+def get_pages_from_hit(hit: dict) -> List[int]:
+    pages = hit.get("pages")
+    if pages is None:
+        pages = (hit.get("metadata") or {}).get("pages")
+    if not pages:
+        return []
+    out: List[int] = []
+    for p in pages:
+        try:
+            out.append(int(p))
+        except Exception:
+            pass
+    return out
+
+
+def _shingles(text: str, n: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i : i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def _overlap_len(a: str, b: str, min_len: int = 40, max_len: int = 300) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (chunk_pages overlap)."""
+    for k in range(min(max_len, len(a), len(b)), min_len - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def rank_score(hit: dict) -> float:
+    # Re-ranked hits order by cross-encoder score; fused (hybrid) hits by RRF
+    # score, since lexical-only hits have no similarity.
+    for key in ("rerank_score", "rrf_score", "similarity"):
+        if hit.get(key) is not None:
+            return float(hit[key])
+    return 0.0
+
+
+def format_hit(hit: dict, content: str) -> str:
+    sim = float(hit.get("similarity", 0.0) or 0.0)
+    return f"[pages={get_pages_from_hit(hit)} sim={sim:.3f}]\n{content}".strip()
+
+
+@dataclass
+class PackedContext:
+    text: str = ""
+    hits: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    baseline_tokens: int = 0  # what the unpacked excerpts would have cost
+    dropped_duplicates: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.baseline_tokens - self.tokens, 0)
+
+    @property
+    def pages(self) -> List[int]:
+        return sorted({p for h in self.hits for p in get_pages_from_hit(h)})
+
+
+def pack_hits(
+    hits: List[dict],
+    budget_tokens: int,
+    baseline: Optional[Callable[[str], str]] = None,
+    dup_jaccard: float = 0.8,
+    encoding: str = "o200k_base",
+) -> PackedContext:
+    """
+    Pack retrieved hits into at most `budget_tokens`:
+      - best ranked first (cross-encoder score, else RRF score, else similarity);
+        a hit that doesn't fit is skipped whole (never cut mid-chunk)
+      - near-duplicates (word-shingle Jaccard >= dup_jaccard) are dropped
+      - text repeated from the end of an already packed chunk (the chunker's overlap) is trimmed
+
+    `baseline` maps the naive joined excerpts to what would have been sent before
+    (e.g. a fixed character slice) so the saving can be reported.
+    """
+    sep = "\n\n---\n\n"
+    naive = sep.join(format_hit(h, h.get("content", "") or "") for h in hits)
+    packed = PackedContext(baseline_tokens=count_tokens(baseline(naive) if baseline else naive, encoding))
+
+    ordered = sorted(hits, key=rank_score, reverse=True)
+    kept: List[tuple] = []  # (hit, content, shingles)
+    blocks: List[str] = []
+    used = 0
+
+    for hit in ordered:
+        content = (hit.get("content", "") or "").strip()
+        if not content:
+            continue
+        sh = _shingles(content)
+        if any(len(sh & s) / max(len(sh | s), 1) >= dup_jaccard for _, _, s in kept):
+            packed.dropped_duplicates += 1
+            continue
+        for _, prev, _ in kept:
+            k = _overlap_len(prev, content)  # content continues prev
+            if k:
+                content = content[k:].lstrip()
+            k = _overlap_len(content, prev)  # content precedes prev
+            if k:
+                content = content[:-k].rstrip()
+        if not content:
+            packed.dropped_duplicates += 1
+            continue
+
+        block = format_hit(hit, content)
+        cost = count_tokens(block, encoding) + (count_tokens(sep, encoding) if blocks else 0)
+        if used + cost > budget_tokens:
+            continue
+        used += cost
+        kept.append((hit, content, sh))
+        blocks.append(block)
+
+    packed.text = sep.join(blocks)
+    packed.hits = [h for h, _, _ in kept]
+    packed.tokens = count_tokens(packed.text, encoding) if blocks else 0
+    return packed
@@ -0,0 +1,118 @@
+# app/doc_builder.py
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from typing import IO, Iterable, List, Optional
+
+from context_pack import count_tokens
+
+_WORD_RE = re.compile(r"\b\w+\b")
+
+
+def word_count(text: str) -> int:
+    return len(_WORD_RE.findall(text))
+
+
+@dataclass
+class DocPart:
+    text: str
+    words: int
+    tokens: int
+
+
+class MarkdownBuilder:
+    """
+    Append-only markdown document with running word and token totals.
+
+    Each part is counted once when appended, so totals cost O(part) instead of
+    re-scanning the whole document after every section. Parts are joined with
+    `sep` (whitespace), which never merges or splits words, so `words` equals
+    word_count() of the assembled text; `tokens` is the sum of per-part counts
+    (a close upper bound of tokenizing the whole document).
+
+    With `path`, parts are also streamed to that file as they arrive (written to
+    `<path>.tmp`, moved into place on close()); keep_text=False then avoids
+    holding the whole document in memory. Used as a context manager, an
+    exception discards the partial file instead (abort()).
+    """
+
+    def __init__(
+        self,
+        sep: str = "\n\n",
+        path: Optional[str] = None,
+        keep_text: bool = True,
+        with_tokens: bool = True,
+    ):
+        if not keep_text and not path:
+            raise ValueError("keep_text=False needs a path to stream the document to")
+        self.sep = sep
+        self.path = path
+        self.keep_text = keep_text
+        self.with_tokens = with_tokens
+        self.parts: List[DocPart] = []
+        self.words = 0
+        self.tokens = 0
+        self._file: Optional[IO[str]] = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path + ".tmp", "w", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self.parts)
+
+    def append(self, text: str) -> DocPart:
+        part = DocPart(
+            text=text if self.keep_text else "",
+            words=word_count(text),
+            tokens=count_tokens(text) if self.with_tokens else 0,
+        )
+        if self._file is not None:
+            if self.parts:
+                self._file.write(self.sep)
+            self._file.write(text)
+        self.parts.append(part)
+        self.words += part.words
+        self.tokens += part.tokens
+        return part
+
+    def extend(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            self.append(text)
+
+    def markdown(self) -> str:
+        """The assembled document (one join, O(total length))."""
+        if not self.keep_text:
+            raise RuntimeError("Document text was streamed to disk only; read it from the file")
+        return self.sep.join(p.text for p in self.parts)
+
+    def close(self) -> None:
+        """Flush the streamed file and move it into place."""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self) -> None:
+        """Close the streamed file and delete it, leaving any existing `path` untouched."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self.path + ".tmp")
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "MarkdownBuilder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,231 @@
+# app/embed_cache.py
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from resources import embedder_cache_name, get_embedder, registry
+from settings import EMBED_CACHE_CAPACITY, EMBED_CACHE_DIR, EMBED_DIM
+
+KEY_BYTES = 32  # SHA-256 digest of a cache key, stored next to each slot's vector
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, text hash).
+
+    Layout in `directory`:
+      vectors.f32  - memory-mapped float32 array of shape (capacity, dim)
+      keys.bin     - memory-mapped key digest per slot, shape (capacity, 32)
+      index.json   - key -> slot, stored in LRU order (oldest first)
+
+    index.json is only written every `flush_every` puts, so after a crash it can
+    map an evicted key to a slot that now holds another text's vector. Reads
+    check the slot's stored digest and treat a mismatch as a miss.
+
+    If the model turns out to produce vectors of another width than `dim`
+    (EMBED_MODEL changed), the cache is emptied and resized on that first miss.
+
+    Thread-safe within a process. Not meant to be shared by concurrent processes.
+    """
+
+    def __init__(self, directory: str, dim: int, capacity: int = 100_000, flush_every: int = 256):
+        self.directory = directory
+        self.dim = dim
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._free: List[int] = []
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.json")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.bin")
+
+        meta = self._load_index()
+        fresh = (
+            meta.get("dim") != dim
+            or meta.get("capacity") != capacity
+            or not os.path.exists(self._vectors_path)
+            or not os.path.exists(self._keys_path)
+        )
+        if fresh:
+            # New cache, or the shape changed: start over.
+            meta = {"entries": []}
+
+        self._open(fresh)
+        for key, slot in meta["entries"]:
+            self._lru[key] = int(slot)
+        used = set(self._lru.values())
+        self._free = [i for i in range(capacity - 1, -1, -1) if i not in used]
+
+    def _open(self, fresh: bool) -> None:
+        mode = "w+" if fresh else "r+"
+        shape = (self.capacity, self.dim)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=shape)
+        self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode=mode, shape=(self.capacity, KEY_BYTES))
+
+    def _reset_locked(self, dim: int) -> None:
+        """Drop every entry and reopen the memmaps for vectors of width `dim`."""
+        self.dim = dim
+        self._lru.clear()
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._open(fresh=True)
+        self._flush_locked()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # ---- lookup / store ----
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        out: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = cache_key(model_name, text)
+                slot = self._lru.get(key)
+                if slot is not None and self._keys[slot].tobytes() != bytes.fromhex(key):
+                    # Stale index entry (crash between eviction and flush): the slot was reused.
+                    del self._lru[key]
+                    slot = None
+                if slot is None:
+                    self.misses += 1
+                    out.append(None)
+                else:
+                    self.hits += 1
+                    self._lru.move_to_end(key)
+                    out.append(np.array(self._vectors[slot]))
+        return out
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Any) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = cache_key(model_name, text)
+                slot = self._lru.get(key)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        # Evict least recently used entry and reuse its slot.
+                        _, slot = self._lru.popitem(last=False)
+                    self._lru[key] = slot
+                else:
+                    self._lru.move_to_end(key)
+                self._vectors[slot] = vec
+                self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._dirty += 1
+            if self._dirty >= self.flush_every:
+                self._flush_locked()
+
+    def encode(self, load_model: Callable[[], Any], model_name: str, texts: Sequence[str]) -> np.ndarray:
+        """
+        Return normalized embeddings, calling model.encode only for cache misses.
+        `load_model` is only called on a miss, so an all-hit batch never loads the model.
+        """
+        cached = self.get_many(model_name, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # Dedupe within the batch so repeated headings are encoded once.
+            uniq = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = np.asarray(load_model().encode(uniq, normalize_embeddings=True), dtype=np.float32)
+            if fresh.shape[1] != self.dim:
+                logging.warning(
+                    "Embedding cache holds %d-dim vectors but %s returns %d; clearing it",
+                    self.dim, model_name, fresh.shape[1],
+                )
+                with self._lock:
+                    self._reset_locked(fresh.shape[1])
+            self.put_many(model_name, uniq, fresh)
+            by_text = dict(zip(uniq, fresh))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+        if not cached:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(cached)
+
+    # ---- persistence / metrics ----
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._vectors.flush()
+        self._keys.flush()
+        meta = {
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "entries": [[k, s] for k, s in self._lru.items()],
+        }
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._index_path)
+        self._dirty = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "size": len(self._lru),
+            "capacity": self.capacity,
+        }
+
+
+def _stored_dim(directory: str) -> Optional[int]:
+    """Vector width recorded in an existing cache's index.json, if any."""
+    try:
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            return int(json.load(f)["dim"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _create_cache() -> EmbeddingCache:
+    # Sized from the cache's own metadata (or EMBED_DIM for a new one) rather than
+    # the model, so opening the cache doesn't load torch; encode() resizes on mismatch.
+    dim = _stored_dim(EMBED_CACHE_DIR) or EMBED_DIM
+    cache = EmbeddingCache(EMBED_CACHE_DIR, dim=dim, capacity=EMBED_CACHE_CAPACITY)
+    atexit.register(cache.flush)
+    return cache
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache shared by ingest and retrieve."""
+    return registry.get("embedding_cache", _create_cache)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed many strings with a single encode call (cache misses only)."""
+    return get_embedding_cache().encode(get_embedder, embedder_cache_name(), texts).tolist()
+
+
+def embed_text(text: str) -> List[float]:
+    """Embed a single string into a normalized vector (through the local embedding cache)."""
+    return embed_texts([text])[0]
@@ -0,0 +1,275 @@
+# app/embed_onnx.py
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+# Varied lengths and registers; used to check the export against PyTorch and to pick a thread count.
+CHECK_SENTENCES = [
+    "What is the warranty period for the product?",
+    "Installation",
+    "The controller must be powered off before the cover is removed; failure to do so voids the warranty.",
+    "Revenue grew 12% year over year, driven mainly by subscription renewals in the EMEA region.",
+    "See section 4.2.1 (Configuration) and table B-7 for the default values of each parameter.",
+    "Patients with a history of hypertension should consult a physician before starting the programme.",
+    "def encode(self, sentences, batch_size=64): return np.vstack(out)",
+    "Die Bedienungsanleitung ist in mehreren Sprachen verfügbar.",
+    " ".join(["Long paragraphs are truncated to the model's maximum sequence length."] * 40),
+]
+
+MODEL_FILE = "model.onnx"
+META_FILE = "onnx_meta.json"
+
+
+class OnnxEmbedder:
+    """
+    Mean-pooled sentence embeddings from a BERT-style encoder exported to ONNX
+    (see export_onnx). Drop-in for the SentenceTransformer.encode() calls in this
+    app, without importing torch.
+
+    - Texts are sorted by length before batching so padding stays short.
+    - intra_op threads default to the count picked at export time; onnxruntime's
+      own default (every logical core) oversubscribes hyperthreads on small batches.
+    """
+
+    def __init__(self, model_dir: str, threads: int = 0, batch_size: int = 64):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.meta = read_meta(model_dir)
+        self.max_length = int(self.meta.get("max_length", 256))
+        self.max_seq_length = self.max_length  # SentenceTransformer's name for the same limit
+        self.batch_size = batch_size
+        self.threads = threads or int(self.meta.get("threads", 0))
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.inter_op_num_threads = 1
+        if self.threads > 0:
+            opts.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.session.get_outputs()[0].shape[-1])
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.no_padding()
+        # Untruncated copy, so counts report how far a text runs past max_length.
+        self._counter = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._counter.no_truncation()
+        self._counter.no_padding()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def count_tokens(self, text: str) -> int:
+        """Wordpiece tokens in text, excluding [CLS]/[SEP]."""
+        return len(self._counter.encode(text, add_special_tokens=False).ids)
+
+    def _run(self, texts: Sequence[str]) -> np.ndarray:
+        encs = self.tokenizer.encode_batch(list(texts))
+        width = max(len(e.ids) for e in encs)
+        ids = np.zeros((len(encs), width), dtype=np.int64)
+        mask = np.zeros((len(encs), width), dtype=np.int64)
+        for i, e in enumerate(encs):
+            ids[i, : len(e.ids)] = e.ids
+            mask[i, : len(e.ids)] = 1
+
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feed)[0]  # (batch, seq, dim)
+
+        m = mask[:, :, None].astype(np.float32)
+        return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Any,
+        batch_size: Optional[int] = None,
+        normalize_embeddings: bool = False,
+        **_: Any,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        bs = batch_size or self.batch_size
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), bs):
+            idx = order[start : start + bs]
+            out[idx] = self._run([texts[i] for i in idx])
+
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+def read_meta(model_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(model_dir, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(model_dir: str, meta: Dict[str, Any]) -> None:
+    with open(os.path.join(model_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def is_verified(model_dir: str) -> bool:
+    """An export that passed the cosine check and can be loaded."""
+    meta = read_meta(model_dir)
+    return (
+        "min_cosine" in meta
+        and not meta.get("rejected")
+        and os.path.exists(os.path.join(model_dir, MODEL_FILE))
+    )
+
+
+def min_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+
+def pick_threads(model_dir: str, texts: Sequence[str], batch_size: int = 32, repeats: int = 3) -> int:
+    """Fastest intra-op thread count for a typical ingest batch (powers of two up to the core count)."""
+    cores = os.cpu_count() or 1
+    candidates = sorted({1, cores} | {2**i for i in range(1, cores.bit_length()) if 2**i < cores})
+    batch = (list(texts) * (batch_size // max(len(texts), 1) + 1))[:batch_size]
+
+    best, best_s = cores, float("inf")
+    for n in candidates:
+        emb = OnnxEmbedder(model_dir, threads=n)
+        emb.encode(batch)  # warm-up
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            emb.encode(batch)
+        elapsed = (time.perf_counter() - t0) / repeats
+        logging.info("onnx embedder: %d threads -> %.1f ms/batch", n, elapsed * 1000)
+        if elapsed < best_s:
+            best, best_s = n, elapsed
+    return best
+
+
+def export_onnx(
+    model_name: str,
+    model_dir: str,
+    quantize: bool = False,
+    min_cos: float = 0.98,
+) -> Dict[str, Any]:
+    """
+    Export a SentenceTransformer's encoder to `model_dir`/model.onnx (dynamic batch
+    and sequence axes), optionally int8 dynamic-quantized.
+
+    Needs torch and sentence-transformers; runs once per model, later loads only
+    need onnxruntime and tokenizers. The export is checked against the PyTorch
+    model on CHECK_SENTENCES and rejected (RuntimeError) if any embedding's cosine
+    similarity falls below `min_cos`. A rejected export is recorded in its meta
+    file (see load_onnx_embedder) so it isn't retried on every start.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    class _Encoder(torch.nn.Module):
+        # Keyword call: the positional order of forward() differs across transformers versions.
+        def __init__(self, model: Any, names: Sequence[str]):
+            super().__init__()
+            self.model = model
+            self.names = list(names)
+
+        def forward(self, *inputs: Any) -> Any:
+            return self.model(**dict(zip(self.names, inputs)))[0]
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    tokenizer = st_model.tokenizer
+    max_length = int(st_model.max_seq_length or 256)
+    tokenizer.save_pretrained(model_dir)  # tokenizer.json for the fast tokenizer
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    encoder = _Encoder(st_model[0].auto_model, names).eval()
+
+    fp32_path = os.path.join(model_dir, "model_fp32.onnx" if quantize else MODEL_FILE)
+    extra: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # torch >= 2.9 defaults to the dynamo exporter (needs onnxscript, ignores dynamic_axes).
+        extra["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(sample[n] for n in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14,
+            **extra,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, os.path.join(model_dir, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+    meta: Dict[str, Any] = {"model": model_name, "quantized": quantize, "max_length": max_length}
+    _write_meta(model_dir, meta)
+
+    reference = st_model.encode(CHECK_SENTENCES, normalize_embeddings=True)
+    got = OnnxEmbedder(model_dir).encode(CHECK_SENTENCES, normalize_embeddings=True)
+    meta["min_cosine"] = min_cosine(reference, got)
+    if meta["min_cosine"] < min_cos:
+        meta.update(rejected=True, required_cosine=min_cos)
+        _write_meta(model_dir, meta)
+        raise RuntimeError(
+            f"ONNX export of {model_name} drifted from PyTorch: min cosine {meta['min_cosine']:.4f} < {min_cos}"
+        )
+
+    meta["threads"] = pick_threads(model_dir, CHECK_SENTENCES)
+    _write_meta(model_dir, meta)
+    logging.info("Exported %s to %s: %s", model_name, model_dir, meta)
+    return meta
+
+
+def onnx_model_dir(root: str, model_name: str, quantize: bool) -> str:
+    slug = model_name.replace("/", "__")
+    return os.path.join(root, slug + ("-int8" if quantize else ""))
+
+
+def load_onnx_embedder(
+    root: str, model_name: str, quantize: bool, threads: int = 0, min_cos: float = 0.98
+) -> OnnxEmbedder:
+    """
+    Load the exported model, exporting (and verifying) it first if it isn't there yet.
+
+    An export rejected by the cosine check raises RuntimeError right away (so the
+    caller falls back without importing torch) until `min_cos` or the model changes.
+    """
+    model_dir = onnx_model_dir(root, model_name, quantize)
+    meta = read_meta(model_dir)
+    if meta.get("rejected") and meta.get("model") == model_name and meta.get("required_cosine") == min_cos:
+        raise RuntimeError(
+            f"ONNX export of {model_name} in {model_dir} was rejected: "
+            f"min cosine {meta.get('min_cosine', 0.0):.4f} < {min_cos}"
+        )
+    if not is_verified(model_dir):
+        export_onnx(model_name, model_dir, quantize=quantize, min_cos=min_cos)
+    return OnnxEmbedder(model_dir, threads=threads)
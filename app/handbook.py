@@ -1,48 +1,40 @@
 # app/handbook.py
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, Optional
 import re
 
+from context_pack import PackedContext, budget_for, pack_hits, truncate_tokens
+from doc_builder import MarkdownBuilder, word_count
+from handbook_jobs import HandbookJobState, HandbookJobStore, job_id_for
 from llm_base import LLMClient
-from retrieve import retrieve_context
+from retrieval_base import DocFilter, doc_ids
+from retrieval_plan import plan_sections
+from retrieve import retrieve_context_batch
+from settings import HANDBOOK_CHUNK_REUSE
 
 
 def as_text(resp) -> str:
     return getattr(resp, "text", resp)
 
 
-def word_count(text: str) -> int:
-    return len(re.findall(r"\b\w+\b", text))
-
-
 def clean_heading(s: str) -> str:
     s = re.sub(r"[^\w\s\-:]", "", s).strip()
     return s[:120] if s else "Section"
 
 
-def get_pages_from_hit(hit: dict) -> List[int]:
-    pages = hit.get("pages")
-    if pages is None:
-        pages = (hit.get("metadata") or {}).get("pages")
-    if not pages:
-        return []
-    out: List[int] = []
-    for p in pages:
-        try:
-            out.append(int(p))
-        except Exception:
-            pass
-    return out
-
-
 @dataclass
 class HandbookResult:
     title: str
     outline: List[str]
     markdown: str
     words: int
+    job_id: Optional[str] = None
+    tokens: int = 0
+    prompt_tokens_saved: int = 0  # vs. fixed character slices of each section's own top-k
+    planner_tokens_saved: int = 0  # part of the above won by de-duplicating across sections
 
 
 def generate_outline(llm: LLMClient, topic: str) -> List[str]:
@@ -90,57 +82,25 @@ Example:
     return outline
 
 
-def generate_handbook_markdown(
-    llm: LLMClient,
-    topic: str,
-    document_id: Optional[str],
-    target_words: int = 20000,
-    top_k_context: int = 8,
-    progress_cb: Optional[Callable[[str, float], None]] = None,
-) -> HandbookResult:
-    outline = generate_outline(llm, topic)
-
-    title = f"{topic} — Handbook"
-    md_parts: List[str] = [f"# {title}\n"]
-
-    # Table of Contents
-    md_parts.append("## Table of Contents\n")
-    for i, h in enumerate(outline, start=1):
-        anchor = re.sub(r"[^a-z0-9\- ]", "", h.lower()).replace(" ", "-")
-        md_parts.append(f"{i}. [{h}](#{anchor})")
-    md_parts.append("\n---\n")
-
-    memory = ""
-    total_words = word_count("\n\n".join(md_parts))
-
-    for idx, heading in enumerate(outline, start=1):
-        if progress_cb:
-            progress_cb(
-                f"Retrieving context for: {heading}",
-                (idx - 1) / max(len(outline), 1),
-            )
-
-        context_hits = []
-        if document_id:
-            context_hits = retrieve_context(
-                f"{topic} — {heading}",
-                top_k=top_k_context,
-                document_id=document_id,
-            )
-
-        allowed_pages = sorted({p for h in context_hits for p in get_pages_from_hit(h)})
+def pack_section_context(llm: LLMClient, context_hits: List[dict]) -> PackedContext:
+    """Token-budgeted excerpts; the saving is measured against the old 12000-char slice."""
+    return pack_hits(
+        context_hits,
+        budget_for(getattr(llm, "model", None), "section"),
+        baseline=lambda text: text[:12000],
+    )
 
-        context_block = ""
-        if context_hits:
-            blocks: List[str] = []
-            for h in context_hits:
-                pages = get_pages_from_hit(h)
-                sim = float(h.get("similarity", 0.0) or 0.0)
-                content = h.get("content", "") or ""
-                blocks.append(f"[pages={pages} sim={sim:.3f}]\n{content}".strip())
-            context_block = "\n\n---\n\n".join(blocks)
 
-        prompt = f"""
+def build_section_prompt(
+    topic: str,
+    heading: str,
+    context: PackedContext,
+    continuity: str,
+    memory_tokens: int = 500,
+) -> str:
+    allowed_pages = context.pages
+
+    return f"""
 You are writing a structured handbook.
 
 Topic: {topic}
@@ -158,49 +118,327 @@ Citation rules:
 - If sources do not support a claim, say so clearly.
 
 Continuity notes from previous sections:
-{memory[:2000]}
+{truncate_tokens(continuity, memory_tokens)}
 
 Source excerpts:
-{context_block[:12000]}
+{context.text}
 
 Now write this section:
 - Start with "## {heading}"
 - Aim for 1200-1800 words (if possible)
 """
 
-        if progress_cb:
-            progress_cb(
-                f"Generating section: {heading}",
-                (idx - 0.5) / max(len(outline), 1),
-            )
 
+def outline_continuity(outline: List[str], idx: int) -> str:
+    """
+    Continuity notes derived from the outline alone (idx is 1-based), so a
+    section can be written without waiting for the previous one.
+    """
+    lines = [f"This is section {idx} of {len(outline)}. Full outline:"]
+    lines += [f"{i}. {h}" for i, h in enumerate(outline, start=1)]
+    if idx > 1:
+        lines.append(f"- Previous section: {outline[idx - 2]} (don't repeat its material)")
+    if idx < len(outline):
+        lines.append(f"- Next section: {outline[idx]} (leave its material for it)")
+    return "\n".join(lines)
+
+
+def write_section(
+    llm: LLMClient,
+    prompt: str,
+    heading: str,
+    stream_cb: Optional[Callable[[str], None]] = None,
+) -> str:
+    if stream_cb:
+        stream = llm.stream(prompt)
+        for delta in stream:
+            stream_cb(delta)
+        section_md = stream.text.strip()
+    else:
         section_md = as_text(llm.generate(prompt)).strip()
-        if not section_md.startswith("## "):
-            section_md = f"## {heading}\n\n" + section_md
+    if not section_md.startswith("## "):
+        section_md = f"## {heading}\n\n" + section_md
+    return section_md
 
-        md_parts.append(section_md)
-        total_words = word_count("\n\n".join(md_parts))
 
-        # Rolling memory summary
-        memory_prompt = f"""
+def summarize_section(llm: LLMClient, section_md: str) -> str:
+    memory_prompt = f"""
 Summarize the key points from the latest section in 6-10 bullet points, concise.
 
 Section text:
 {section_md[:12000]}
 """
-        memory = as_text(llm.generate(memory_prompt)).strip()
+    return as_text(llm.generate(memory_prompt)).strip()
 
+
+async def awrite_section(llm: LLMClient, prompt: str, heading: str) -> str:
+    section_md = as_text(await llm.agenerate(prompt)).strip()
+    if not section_md.startswith("## "):
+        section_md = f"## {heading}\n\n" + section_md
+    return section_md
+
+
+async def _agenerate_sections(
+    llm: LLMClient,
+    topic: str,
+    outline: List[str],
+    section_ctx: List[PackedContext],
+    words_so_far: int,
+    target_words: int,
+    concurrency: int,
+    progress_cb: Optional[Callable[[str, float], None]],
+    done: Optional[Dict[int, str]] = None,
+    on_section: Optional[Callable[[int, str], None]] = None,
+) -> List[str]:
+    n = len(outline)
+    sections: Dict[int, str] = dict(done or {})
+    total_words = words_so_far
+    in_flight: Dict["asyncio.Task[str]", int] = {}
+    next_idx = 1
+    # A checkpoint from a concurrent run can have gaps; those are always filled.
+    last_saved = max(sections, default=0)
+
+    def submit_more() -> None:
+        nonlocal next_idx
+        while next_idx in sections:
+            next_idx += 1
+        while len(in_flight) < concurrency and next_idx <= n and (
+            total_words < target_words or next_idx < last_saved
+        ):
+            heading = outline[next_idx - 1]
+            prompt = build_section_prompt(
+                topic, heading, section_ctx[next_idx - 1], outline_continuity(outline, next_idx)
+            )
+            in_flight[asyncio.ensure_future(awrite_section(llm, prompt, heading))] = next_idx
+            next_idx += 1
+            while next_idx in sections:
+                next_idx += 1
+
+    try:
+        submit_more()
         if progress_cb:
-            progress_cb(f"Progress: {total_words} words", idx / max(len(outline), 1))
+            progress_cb(f"Generating {len(in_flight)} sections in parallel…", 0.0)
+
+        while in_flight:
+            finished, _ = await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                idx = in_flight.pop(task)
+                sections[idx] = task.result()
+                total_words += word_count(sections[idx])
+                if on_section:
+                    on_section(idx, sections[idx])
+                if progress_cb:
+                    progress_cb(
+                        f"Finished section: {outline[idx - 1]} ({len(sections)}/{n}) · {total_words} words",
+                        len(sections) / max(n, 1),
+                    )
+            submit_more()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await llm.aclose()
+
+    prefix = 0
+    while prefix + 1 in sections:
+        prefix += 1
+    return [sections[i] for i in range(1, prefix + 1)]
+
+
+def _generate_sections_concurrent(
+    llm: LLMClient,
+    topic: str,
+    outline: List[str],
+    section_ctx: List[PackedContext],
+    words_so_far: int,
+    target_words: int,
+    concurrency: int,
+    progress_cb: Optional[Callable[[str, float], None]],
+    done: Optional[Dict[int, str]] = None,
+    on_section: Optional[Callable[[int, str], None]] = None,
+) -> List[str]:
+    """
+    Up to `concurrency` sections in flight (via llm.agenerate, no thread per call);
+    new ones are submitted in outline order until the target is reached.
+    progress_cb runs on the caller's thread.
+    Sections in `done` (from a checkpoint) are reused; on_section sees each new one.
+    Sections a checkpoint skipped (finished out of order by an interrupted concurrent
+    run) are written even past the target, and the result is always the finished
+    outline prefix, sections 1..len(result).
+    """
+    return asyncio.run(
+        _agenerate_sections(
+            llm, topic, outline, section_ctx, words_so_far, target_words, concurrency, progress_cb,
+            done=done, on_section=on_section,
+        )
+    )
+
+
+def generate_handbook_markdown(
+    llm: LLMClient,
+    topic: str,
+    document_id: DocFilter,
+    target_words: int = 20000,
+    top_k_context: int = 8,
+    progress_cb: Optional[Callable[[str, float], None]] = None,
+    concurrency: int = 1,
+    stream_cb: Optional[Callable[[str], None]] = None,
+    job_store: Optional[HandbookJobStore] = None,
+    job_id: Optional[str] = None,
+    output_path: Optional[str] = None,
+    max_chunk_reuse: int = HANDBOOK_CHUNK_REUSE,
+) -> HandbookResult:
+    """
+    concurrency=1 writes sections one by one with a rolling LLM summary as memory.
+    concurrency>1 writes that many sections at once, using outline-based continuity
+    notes instead of the serial summary; output is still in outline order.
+
+    document_id may be one id, a list of ids, or None for the whole collection;
+    sections draw on a merged top-k across all of them.
+
+    stream_cb (serial mode only) receives each section's text deltas as they arrive.
+
+    With a job_store, the outline, each section, each rolling summary and the
+    conclusion are checkpointed as they finish; running again with the same
+    job_id (default: derived from topic/document/target) resumes from there.
+    A finished job's checkpoint is deleted, so the same request later writes
+    a new handbook instead of replaying the old one.
+
+    Section contexts come from one retrieval plan over the whole outline: each
+    chunk feeds at most `max_chunk_reuse` sections (those it scores best for),
+    so neighbouring headings don't all resend the same excerpts (0 disables it).
+
+    Word totals are kept per section as the document grows (MarkdownBuilder);
+    with output_path the markdown is also streamed to that file.
+    """
+    state: Optional[HandbookJobState] = None
+    if job_store is not None:
+        job_id = job_id or job_id_for(topic, document_id, target_words)
+        state = job_store.load(job_id)
+        if state.done:
+            # Left by an older version that kept finished jobs; start over.
+            job_store.delete(job_id)
+            state = HandbookJobState(job_id=job_id)
+        if not job_store.exists(job_id):
+            job_store.append(
+                job_id,
+                {
+                    "type": "job",
+                    "params": {"topic": topic, "document_id": doc_ids(document_id), "target_words": target_words},
+                },
+            )
+
+    def checkpoint(record: dict) -> None:
+        if job_store is not None and job_id:
+            job_store.append(job_id, record)
 
-        if total_words >= target_words:
-            break
+    if state and state.outline:
+        outline = state.outline
+        if progress_cb and state.sections:
+            progress_cb(f"Resuming job {job_id}: {len(state.sections)} sections already written", 0.0)
+    else:
+        outline = generate_outline(llm, topic)
+        checkpoint({"type": "outline", "outline": outline})
 
-    # Conclusion once
-    if progress_cb:
-        progress_cb("Generating final conclusion…", 1.0)
+    saved_sections: Dict[int, str] = dict(state.sections) if state else {}
+    saved_memory: Dict[int, str] = dict(state.memory) if state else {}
 
-    conclusion_prompt = f"""
+    title = f"{topic} — Handbook"
+    with MarkdownBuilder(path=output_path) as doc:
+        doc.append(f"# {title}\n")
+
+        # Table of Contents
+        doc.append("## Table of Contents\n")
+        for i, h in enumerate(outline, start=1):
+            anchor = re.sub(r"[^a-z0-9\- ]", "", h.lower()).replace(" ", "-")
+            doc.append(f"{i}. [{h}](#{anchor})")
+        doc.append("\n---\n")
+
+        memory = ""
+
+        # Fetch every section's context up front: one embedding pass, one lookup,
+        # then one plan that spreads the chunks over the sections.
+        section_hits: List[List[dict]] = [[] for _ in outline]
+        naive_hits: List[List[dict]] = [[] for _ in outline]
+        todo = [i for i in range(len(outline)) if (i + 1) not in saved_sections]
+        if todo and doc_ids(document_id) != []:
+            if progress_cb:
+                progress_cb(f"Retrieving context for {len(todo)} sections…", 0.0)
+            # Over-fetch so a section whose best chunks are capped has alternatives.
+            fetch = top_k_context * (2 if max_chunk_reuse > 0 else 1)
+            hits = retrieve_context_batch(
+                [f"{topic} — {outline[i]}" for i in todo],
+                top_k=fetch,
+                document_id=document_id,
+                path="handbook",
+            )
+            planned = hits
+            if max_chunk_reuse > 0:
+                planned = plan_sections(hits, top_k_context, max_reuse=max_chunk_reuse).section_hits
+            for i, h, p in zip(todo, hits, planned):
+                naive_hits[i] = h[:top_k_context]
+                section_hits[i] = p
+
+        section_ctx = [pack_section_context(llm, h) for h in section_hits]
+        naive_ctx = [pack_section_context(llm, h) for h in naive_hits] if max_chunk_reuse > 0 else section_ctx
+
+        written = 0  # outline sections in the document (always a prefix of the outline)
+        if concurrency > 1:
+            sections_md = _generate_sections_concurrent(
+                llm,
+                topic,
+                outline,
+                section_ctx,
+                doc.words + sum(word_count(md) for md in saved_sections.values()),
+                target_words,
+                concurrency,
+                progress_cb,
+                done=saved_sections,
+                on_section=lambda i, md: checkpoint({"type": "section", "idx": i, "markdown": md}),
+            )
+            doc.extend(sections_md)
+            written = len(sections_md)  # the contiguous outline prefix 1..written
+        else:
+            for idx, heading in enumerate(outline, start=1):
+                if idx in saved_sections:
+                    section_md = saved_sections[idx]
+                else:
+                    prompt = build_section_prompt(topic, heading, section_ctx[idx - 1], memory)
+
+                    if progress_cb:
+                        progress_cb(
+                            f"Generating section: {heading}",
+                            (idx - 0.5) / max(len(outline), 1),
+                        )
+
+                    section_md = write_section(llm, prompt, heading, stream_cb=stream_cb)
+                    checkpoint({"type": "section", "idx": idx, "markdown": section_md})
+
+                doc.append(section_md)
+                written = idx
+
+                # Rolling memory summary
+                if idx in saved_memory:
+                    memory = saved_memory[idx]
+                else:
+                    memory = summarize_section(llm, section_md)
+                    checkpoint({"type": "memory", "idx": idx, "memory": memory})
+
+                if progress_cb:
+                    progress_cb(f"Progress: {doc.words} words", idx / max(len(outline), 1))
+
+                if doc.words >= target_words:
+                    break
+
+        # Savings count only the sections actually written, not those cut off by target_words.
+        packed_tokens = sum(c.tokens for c in section_ctx[:written])
+        prompt_tokens_saved = max(sum(c.baseline_tokens for c in naive_ctx[:written]) - packed_tokens, 0)
+        planner_tokens_saved = max(sum(c.tokens for c in naive_ctx[:written]) - packed_tokens, 0)
+
+        # Conclusion once
+        if progress_cb:
+            progress_cb("Generating final conclusion…", 1.0)
+
+        conclusion_prompt = f"""
 Write a final conclusion section in Markdown.
 
 Topic: {topic}
@@ -212,15 +450,25 @@ Requirements:
 - Add a brief glossary of 8-12 terms
 - End with a complete final sentence (no cutoff)
 """
-    conclusion_md = as_text(llm.generate(conclusion_prompt)).strip()
-    if not conclusion_md.startswith("## "):
-        conclusion_md = "## Conclusion\n\n" + conclusion_md
-    md_parts.append(conclusion_md)
-
-    final_md = "\n\n".join(md_parts)
+        if state and state.conclusion:
+            conclusion_md = state.conclusion
+        else:
+            conclusion_md = as_text(llm.generate(conclusion_prompt)).strip()
+            if not conclusion_md.startswith("## "):
+                conclusion_md = "## Conclusion\n\n" + conclusion_md
+            checkpoint({"type": "conclusion", "markdown": conclusion_md})
+        doc.append(conclusion_md)
+
+    final_md = doc.markdown()
+    if job_store is not None and job_id:
+        job_store.delete(job_id)
     return HandbookResult(
         title=title,
         outline=outline,
         markdown=final_md,
-        words=word_count(final_md),
+        words=doc.words,
+        tokens=doc.tokens,
+        job_id=job_id,
+        prompt_tokens_saved=prompt_tokens_saved,
+        planner_tokens_saved=planner_tokens_saved,
     )
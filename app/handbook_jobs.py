@@ -0,0 +1,108 @@
+# app/handbook_jobs.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from retrieval_base import DocFilter, doc_ids
+
+
+def job_id_for(topic: str, document_id: DocFilter, target_words: int) -> str:
+    """Deterministic id, so re-running an unfinished request resumes the same job."""
+    ids = doc_ids(document_id)
+    # A one-document set keeps the id it had as a plain document_id.
+    docs = ids[0] if ids and len(ids) == 1 else ids
+    raw = json.dumps([topic.strip().lower(), docs, target_words])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class HandbookJobState:
+    job_id: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    outline: Optional[List[str]] = None
+    sections: Dict[int, str] = field(default_factory=dict)  # 1-based outline index -> markdown
+    memory: Dict[int, str] = field(default_factory=dict)  # rolling summary after section idx
+    conclusion: Optional[str] = None
+    done: bool = False
+
+
+class HandbookJobStore:
+    """
+    Append-only JSONL checkpoint per job (<directory>/<job_id>.jsonl), like
+    agentwrite's write_cache.jsonl: each finished step is one flushed line,
+    and loading replays the lines. A torn last line is ignored.
+    Checkpoints of abandoned jobs are removed by prune() once they go stale.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.jsonl")
+
+    def load(self, job_id: str) -> HandbookJobState:
+        state = HandbookJobState(job_id=job_id)
+        path = self._path(job_id)
+        if not os.path.exists(path):
+            return state
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                kind = rec.get("type")
+                if kind == "job":
+                    state.params = rec.get("params") or {}
+                elif kind == "outline":
+                    state.outline = rec["outline"]
+                elif kind == "section":
+                    state.sections[int(rec["idx"])] = rec["markdown"]
+                elif kind == "memory":
+                    state.memory[int(rec["idx"])] = rec["memory"]
+                elif kind == "conclusion":
+                    state.conclusion = rec["markdown"]
+                elif kind == "done":
+                    state.done = True
+        return state
+
+    def append(self, job_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            with open(self._path(job_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def exists(self, job_id: str) -> bool:
+        return os.path.exists(self._path(job_id))
+
+    def delete(self, job_id: str) -> None:
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, max_age_s: float) -> int:
+        """Delete checkpoints not written to for max_age_s; returns how many were removed."""
+        cutoff = time.time() - max_age_s
+        removed = 0
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".jsonl"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
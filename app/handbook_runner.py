@@ -0,0 +1,211 @@
+# app/handbook_runner.py
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+from handbook import generate_handbook_markdown
+from handbook_jobs import HandbookJobStore, job_id_for
+from llm_base import LLMClient
+from retrieval_base import DocFilter
+
+
+@dataclass
+class HandbookJobStatus:
+    job_id: str
+    topic: str
+    state: str = "queued"  # queued | running | done | failed
+    message: str = "Queued…"
+    fraction: float = 0.0
+    preview: str = ""  # tail of the section being written
+    words: int = 0
+    prompt_tokens_saved: int = 0
+    planner_tokens_saved: int = 0
+    markdown: str = ""
+    error: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+
+
+@dataclass
+class _HandbookRequest:
+    job_id: str
+    llm: LLMClient
+    topic: str
+    document_id: DocFilter
+    target_words: int
+    concurrency: int
+
+
+class HandbookRunner:
+    """
+    Runs handbook jobs on background worker threads, off the Streamlit script thread.
+    Callers submit() and then poll status(); a script rerun doesn't touch the work.
+    Jobs checkpoint to the job store, so a restarted process can resume them;
+    checkpoints older than job_ttl_s are pruned as new jobs are submitted.
+    Finished statuses (which hold the whole markdown) are dropped once the caller
+    calls forget(), or after finished_ttl_s, keeping at most max_finished of them.
+    """
+
+    def __init__(
+        self,
+        job_store: HandbookJobStore,
+        workers: int = 2,
+        preview_chars: int = 4000,
+        job_ttl_s: float = 7 * 24 * 3600,
+        finished_ttl_s: float = 3600,
+        max_finished: int = 16,
+    ):
+        self.job_store = job_store
+        self.preview_chars = preview_chars
+        self.job_ttl_s = job_ttl_s
+        self.finished_ttl_s = finished_ttl_s
+        self.max_finished = max_finished
+        self._queue: "queue.Queue[_HandbookRequest]" = queue.Queue()
+        self._status: Dict[str, HandbookJobStatus] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"handbook-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(
+        self,
+        llm: LLMClient,
+        topic: str,
+        document_id: DocFilter,
+        target_words: int = 20000,
+        concurrency: int = 1,
+    ) -> str:
+        """Queue a job; an identical job that is already queued or running is shared."""
+        job_id = job_id_for(topic, document_id, target_words)
+        try:
+            self.job_store.prune(self.job_ttl_s)
+        except OSError as e:
+            logging.warning("Could not prune handbook job checkpoints: %s", e)
+        with self._lock:
+            self._evict_finished_locked()
+            current = self._status.get(job_id)
+            if current is not None and not current.finished:
+                return job_id
+            self._status[job_id] = HandbookJobStatus(job_id=job_id, topic=topic)
+        self._queue.put(_HandbookRequest(job_id, llm, topic, document_id, target_words, concurrency))
+        return job_id
+
+    def status(self, job_id: str) -> Optional[HandbookJobStatus]:
+        """Snapshot of a job's status (safe to read from any thread)."""
+        with self._lock:
+            self._evict_finished_locked()
+            st = self._status.get(job_id)
+            return replace(st) if st else None
+
+    def forget(self, job_id: str) -> None:
+        """Drop a finished job's status once its result has been delivered."""
+        with self._lock:
+            st = self._status.get(job_id)
+            if st is not None and st.finished:
+                del self._status[job_id]
+
+    def _evict_finished_locked(self) -> None:
+        now = time.time()
+        finished = sorted(
+            (st.finished_at or 0.0, job_id) for job_id, st in self._status.items() if st.finished
+        )
+        expired = [job_id for t, job_id in finished if now - t > self.finished_ttl_s]
+        overflow = [job_id for _, job_id in finished[: max(len(finished) - self.max_finished, 0)]]
+        for job_id in set(expired) | set(overflow):
+            del self._status[job_id]
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            st = self._status[job_id]
+            for k, v in fields.items():
+                setattr(st, k, v)
+
+    def _worker(self) -> None:
+        while True:
+            req = self._queue.get()
+            try:
+                self._run(req)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, req: _HandbookRequest) -> None:
+        job_id = req.job_id
+        self._update(job_id, state="running", message="Starting…")
+
+        def progress_cb(msg: str, frac: float) -> None:
+            fields = {"message": msg, "fraction": min(max(frac, 0.0), 1.0)}
+            if msg.startswith("Generating section:"):
+                fields["preview"] = ""
+            self._update(job_id, **fields)
+
+        def stream_cb(delta: str) -> None:
+            with self._lock:
+                st = self._status[job_id]
+                st.preview = (st.preview + delta)[-self.preview_chars:]
+
+        try:
+            result = generate_handbook_markdown(
+                llm=req.llm,
+                topic=req.topic,
+                document_id=req.document_id,
+                target_words=req.target_words,
+                progress_cb=progress_cb,
+                concurrency=req.concurrency,
+                stream_cb=stream_cb,
+                job_store=self.job_store,
+                job_id=job_id,
+            )
+        except Exception as e:
+            logging.exception("Handbook job %s failed", job_id)
+            self._update(
+                job_id,
+                state="failed",
+                error=str(e),
+                message=f"Failed: {e}",
+                finished_at=time.time(),
+            )
+            return
+
+        self._update(
+            job_id,
+            state="done",
+            message=f"Done: {result.words} words",
+            fraction=1.0,
+            preview="",
+            words=result.words,
+            prompt_tokens_saved=result.prompt_tokens_saved,
+            planner_tokens_saved=result.planner_tokens_saved,
+            markdown=result.markdown,
+            finished_at=time.time(),
+        )
+
+
+def _create_runner() -> HandbookRunner:
+    from settings import HANDBOOK_JOBS_DIR, HANDBOOK_JOBS_TTL_S, HANDBOOK_WORKERS
+
+    return HandbookRunner(
+        HandbookJobStore(HANDBOOK_JOBS_DIR),
+        workers=HANDBOOK_WORKERS,
+        job_ttl_s=HANDBOOK_JOBS_TTL_S,
+    )
+
+
+def get_handbook_runner() -> HandbookRunner:
+    """Process-wide runner shared by every Streamlit session."""
+    from resources import registry
+
+    return registry.get("handbook_runner", _create_runner)
@@ -1,15 +1,41 @@
 # app/ingest.py
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Set, Tuple, Optional
 
 import pdfplumber
-import streamlit as st
-from sentence_transformers import SentenceTransformer
-from supabase import Client, create_client
 
-from settings import SUPABASE_URL, SUPABASE_SERVICE_KEY, require_env
+from bulk_upload import BulkUploader, ChunkSink, PostgresCopySink, SupabaseRestSink
+from context_pack import count_tokens
+from embed_cache import embed_texts
+from lexical import BM25Index, get_lexical_index
+from resources import embed_token_counter, get_supabase
+from retrieval_supabase import stored_chunk_rows
+from settings import (
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TOKENS,
+    CHUNKER,
+    DATABASE_URL,
+    UPLOAD_BACKEND,
+    require_env,
+)
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+    from retrieval_local import LocalVectorStore
 
 
 @dataclass
@@ -19,26 +45,111 @@ class Chunk:
     pages: List[int]  # always correct for this chunk
 
 
-def extract_text_from_pdf(pdf_path: str) -> List[Tuple[int, str]]:
-    """Returns list of (page_number_1_indexed, page_text)."""
-    pages: List[Tuple[int, str]] = []
+@dataclass
+class IngestStats:
+    """Per-stage busy time (seconds) plus end-to-end wall-clock for one ingest."""
+    pages: int = 0
+    chunks: int = 0
+    extract_s: float = 0.0  # extract + chunk
+    embed_s: float = 0.0
+    insert_s: float = 0.0
+    total_s: float = 0.0
+    reused: int = 0  # chunks already stored for this document (not re-embedded)
+    cached: bool = False  # identical file already indexed; nothing was done
+
+
+def iter_pdf_pages(pdf_path: str, workers: int = 1) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number_1_indexed, page_text) as pages are read."""
+    if workers > 1:
+        yield from _iter_pdf_pages_parallel(pdf_path, workers=workers)
+        return
+
     with pdfplumber.open(pdf_path) as pdf:
         for i, page in enumerate(pdf.pages, start=1):
             text = (page.extract_text() or "").strip()
             if text:
-                pages.append((i, text))
+                yield (i, text)
+
+
+def extract_text_from_pdf(pdf_path: str, workers: int = 1) -> List[Tuple[int, str]]:
+    """
+    Returns list of (page_number_1_indexed, page_text).
+    workers > 1 splits the page range across worker processes.
+    """
+    return list(iter_pdf_pages(pdf_path, workers=workers))
+
+
+def _extract_page_range(args: Tuple[str, int, int]) -> List[Tuple[int, str]]:
+    """Worker: open its own pdfplumber handle and extract pages [start, stop)."""
+    pdf_path, start, stop = args
+    pages: List[Tuple[int, str]] = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in range(start, stop):
+            text = (pdf.pages[i].extract_text() or "").strip()
+            if text:
+                pages.append((i + 1, text))
     return pages
 
 
-def chunk_pages(
-    pages: List[Tuple[int, str]],
+def _split_range(n: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, n) into at most `parts` contiguous, near-equal ranges."""
+    parts = max(1, min(parts, n))
+    step, extra = divmod(n, parts)
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    for k in range(parts):
+        stop = start + step + (1 if k < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _iter_pdf_pages_parallel(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    min_pages_per_worker: int = 8,
+) -> Iterator[Tuple[int, str]]:
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = len(pdf.pages)
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, max(1, n_pages // max(min_pages_per_worker, 1)))
+    if workers <= 1:
+        yield from iter_pdf_pages(pdf_path)
+        return
+
+    # Ranges are finer than the pool so early pages stream out before the tail is done.
+    tasks = [(pdf_path, start, stop) for start, stop in _split_range(n_pages, workers * 4)]
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for part in pool.map(_extract_page_range, tasks):
+            yield from part
+    finally:
+        # Closed early (ingest stopped): drop the ranges not yet started instead of extracting them.
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_text_from_pdf_parallel(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    min_pages_per_worker: int = 8,
+) -> List[Tuple[int, str]]:
+    """
+    Same output as extract_text_from_pdf, but pages are extracted by a process pool.
+    Contiguous page ranges are mapped in order, so results stay sorted by page.
+    """
+    return list(_iter_pdf_pages_parallel(pdf_path, workers, min_pages_per_worker))
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
     chunk_size: int = 900,
     overlap: int = 120,
-) -> List[Chunk]:
+) -> Iterator[Chunk]:
     """
     Chunk each page independently so each chunk has correct page metadata.
+    Consumes `pages` lazily, so chunks are yielded while extraction is still running.
     """
-    chunks: List[Chunk] = []
     idx = 0
 
     for page_num, page_text in pages:
@@ -51,33 +162,182 @@ def chunk_pages(
             end = min(start + chunk_size, len(text))
             chunk_text = text[start:end].strip()
             if chunk_text:
-                chunks.append(Chunk(idx=idx, text=chunk_text, pages=[page_num]))
+                yield Chunk(idx=idx, text=chunk_text, pages=[page_num])
                 idx += 1
 
             if end >= len(text):
                 break
             start = max(0, end - overlap)
 
-    return chunks
 
+def chunk_pages(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int = 900,
+    overlap: int = 120,
+) -> List[Chunk]:
+    """
+    Chunk each page independently so each chunk has correct page metadata.
+    """
+    return list(iter_chunks(pages, chunk_size=chunk_size, overlap=overlap))
+
+
+# Paragraph breaks, then sentence ends followed by whitespace.
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENT_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_NUMBERING_RE = re.compile(r"(\d+|[A-Za-z])(\.\d+)*\.")
+
+
+@dataclass
+class _Unit:
+    text: str
+    page: int
+    tokens: int
+    para_start: bool  # first sentence of a paragraph
+
+
+def _split_long(text: str, max_tokens: int, count: Callable[[str], int], n: int) -> Iterator[Tuple[str, int]]:
+    """
+    Split an n-token text on words into pieces of at most max_tokens. Pieces are
+    sized by the average token/word ratio, then halved while still too long
+    (wordpieces per word vary a lot). A single over-long word is yielded as is.
+    """
+    words = text.split(" ")
+    step = max(1, len(words) * max_tokens // n)
+    stack = [words[i : i + step] for i in range(0, len(words), step)][::-1]
+    while stack:
+        piece_words = stack.pop()
+        piece = " ".join(piece_words)
+        k = count(piece)
+        if k > max_tokens and len(piece_words) > 1:
+            mid = len(piece_words) // 2
+            stack += [piece_words[mid:], piece_words[:mid]]
+            continue
+        yield piece, k
+
+
+def _page_units(
+    page_num: int, text: str, max_tokens: int, count: Callable[[str], int] = count_tokens
+) -> List[_Unit]:
+    """
+    Split one page into sentence units with token counts. Runs once per page, so
+    chunking is linear in document size. Sentences longer than max_tokens are
+    split on words.
+    """
+    units: List[_Unit] = []
+    for para in _PARA_RE.split(text):
+        first = True
+        carry = ""
+        for sent in _SENT_RE.split(para):
+            sent = " ".join(sent.split())
+            if not sent:
+                continue
+            if _NUMBERING_RE.fullmatch(sent):
+                # "2." / "3.1." heading numbers belong to the sentence that follows.
+                carry += sent + " "
+                continue
+            sent, carry = carry + sent, ""
+            n = count(sent)
+            if n <= max_tokens:
+                units.append(_Unit(sent, page_num, n, first))
+            else:
+                for i, (piece, k) in enumerate(_split_long(sent, max_tokens, count, n)):
+                    units.append(_Unit(piece, page_num, k, first and i == 0))
+            first = False
+        if carry:
+            units.append(_Unit(carry.strip(), page_num, count(carry.strip()), first))
+    return units
+
+
+def iter_sentence_chunks(
+    pages: Iterable[Tuple[int, str]],
+    max_tokens: int = 200,
+    overlap_tokens: int = 30,
+    span_pages: bool = True,
+    min_fill: float = 0.6,
+    count: Callable[[str], int] = count_tokens,
+) -> Iterator[Chunk]:
+    """
+    Token-sized chunks that end on sentence boundaries, preferring paragraph breaks
+    once a chunk is min_fill full. With span_pages, short pages are merged and a
+    chunk's `pages` lists every page it draws text from. Overlap repeats whole
+    trailing sentences (up to overlap_tokens) instead of raw characters.
+    Tokens are measured with `count` (pass the embedder's tokenizer to keep
+    chunks inside its input limit).
+    """
+    idx = 0
+    cur: List[_Unit] = []
+    cur_tokens = 0
+
+    def emit() -> Iterator[Chunk]:
+        nonlocal idx
+        if cur:
+            pages_used = sorted({u.page for u in cur})
+            yield Chunk(idx=idx, text=" ".join(u.text for u in cur), pages=pages_used)
+            idx += 1
+
+    def carry_overlap() -> List[_Unit]:
+        tail: List[_Unit] = []
+        total = 0
+        for u in reversed(cur):
+            if total + u.tokens > overlap_tokens:
+                break
+            tail.insert(0, u)
+            total += u.tokens
+        return tail
 
-@st.cache_resource
-def get_supabase() -> Client:
-    require_env("SUPABASE_URL", SUPABASE_URL)
-    require_env("SUPABASE_SERVICE_KEY", SUPABASE_SERVICE_KEY)
-    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    for page_num, page_text in pages:
+        text = (page_text or "").strip()
+        if not text:
+            continue
+        if not span_pages and cur:
+            yield from emit()
+            cur, cur_tokens = [], 0
+
+        for u in _page_units(page_num, text, max_tokens, count):
+            full = cur_tokens + u.tokens > max_tokens
+            para_break = u.para_start and cur_tokens >= min_fill * max_tokens
+            if cur and (full or para_break):
+                yield from emit()
+                cur = carry_overlap()
+                cur_tokens = sum(x.tokens for x in cur)
+                if cur_tokens + u.tokens > max_tokens:
+                    cur, cur_tokens = [], 0
+            cur.append(u)
+            cur_tokens += u.tokens
+
+    yield from emit()
+
+
+def iter_document_chunks(pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+    """
+    Chunker selected by CHUNKER: "chars" (default, fixed slices) or "sentences".
+    Sentence chunks are counted in the embedder's own wordpieces and capped at
+    its input limit, so no chunk is silently truncated at embedding time.
+    """
+    if CHUNKER == "sentences":
+        count, limit = embed_token_counter()
+        if CHUNK_TOKENS > limit:
+            logging.warning("CHUNK_TOKENS=%d exceeds the embedder's input limit; using %d", CHUNK_TOKENS, limit)
+        return iter_sentence_chunks(
+            pages,
+            max_tokens=min(CHUNK_TOKENS, limit),
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            count=count,
+        )
+    return iter_chunks(pages)
 
 
-@st.cache_resource
-def get_embedder() -> SentenceTransformer:
-    # 384-dim output for all-MiniLM-L6-v2
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's bytes, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = get_embedder()
-    vectors = model.encode(texts, normalize_embeddings=True)
-    return vectors.tolist()
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 def _basename(path: str) -> str:
@@ -85,44 +345,433 @@ def _basename(path: str) -> str:
     return path.split("\\")[-1].split("/")[-1]
 
 
-def ingest_pdf_to_supabase(pdf_path: str, filename: Optional[str] = None) -> str:
-    sb = get_supabase()
+# ----------------------------
+# Streaming pipeline helpers
+# ----------------------------
+_DONE = object()
 
-    pages = extract_text_from_pdf(pdf_path)
-    if not pages:
-        raise ValueError("No extractable text found in PDF (scanned/image-only PDFs won't work yet).")
 
-    chunks = chunk_pages(pages)
-    if not chunks:
-        raise ValueError("PDF text extracted, but chunking produced no chunks.")
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-    embeddings = embed_texts([c.text for c in chunks])
 
-    doc_name = filename or _basename(pdf_path)
-    doc_insert = sb.table("documents").insert({"filename": doc_name}).execute()
-    if not doc_insert.data:
-        raise RuntimeError(f"Failed to insert document row into Supabase: {doc_insert}")
+def _close(q: "queue.Queue[Any]", stop: threading.Event) -> None:
+    """Signal completion downstream (skipped if the consumer already stopped)."""
+    _put(q, _DONE, stop)
 
-    document_id = doc_insert.data[0]["id"]
 
-    rows: List[Dict[str, Any]] = []
-    for c, emb in zip(chunks, embeddings):
-        rows.append(
-            {
-                "document_id": document_id,     
-                "chunk_index": c.idx,
-                "content": c.text,
-                "metadata": {"pages": c.pages},   
-                "embedding": emb,
-            }
+def _drain(q: "queue.Queue[Any]", errors: List[BaseException], stop: threading.Event) -> Iterator[Any]:
+    """Yield items from q until the upstream stage signals completion or the pipeline stops."""
+    while True:
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            if errors:
+                raise errors[0]
+            return
+        yield item
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _extract_stage(
+    pdf_path: str,
+    workers: int,
+    out_q: "queue.Queue[Any]",
+    stats: IngestStats,
+    stop: threading.Event,
+    errors: List[BaseException],
+) -> None:
+    def counted_pages() -> Iterator[Tuple[int, str]]:
+        with closing(iter_pdf_pages(pdf_path, workers=workers)) as it:
+            for page in it:
+                stats.pages += 1
+                yield page
+
+    pages = counted_pages()
+    chunks = iter_document_chunks(pages)
+    try:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            stats.extract_s += time.perf_counter() - t0
+            if chunk is None or not _put(out_q, chunk, stop):
+                break
+            stats.chunks += 1
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        # Releases the PDF handle and any extraction process pool when stopped early.
+        chunks.close()
+        pages.close()
+        _close(out_q, stop)
+
+
+def _embed_stage(
+    in_q: "queue.Queue[Any]",
+    out_q: "queue.Queue[Any]",
+    batch_size: int,
+    stats: IngestStats,
+    stop: threading.Event,
+    errors: List[BaseException],
+    skip: Optional[Callable[[Chunk], bool]] = None,
+) -> None:
+    try:
+        pending = (c for c in _drain(in_q, errors, stop) if not (skip and skip(c)))
+        for batch in _batched(pending, batch_size):
+            if stop.is_set():
+                break
+            t0 = time.perf_counter()
+            embeddings = embed_texts([c.text for c in batch])
+            stats.embed_s += time.perf_counter() - t0
+            if not _put(out_q, list(zip(batch, embeddings)), stop):
+                break
+    except BaseException as e:
+        if not errors:
+            errors.append(e)
+    finally:
+        _close(out_q, stop)
+
+
+def _find_document(sb: Client, column: str, value: str) -> Optional[Dict[str, Any]]:
+    res = (
+        sb.table("documents")
+        .select("id")
+        .eq(column, value)
+        .order("created_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0] if res.data else None
+
+
+ChunkKey = Tuple[int, str]  # (chunk_index, content_hash), the unique key within a document
+
+
+def _stored_chunks(sb: Client, document_id: str, page_size: int = 1000) -> Dict[ChunkKey, Dict[str, Any]]:
+    """(chunk_index, content_hash) -> {id, chunk_index, pages} for chunks already stored for a document."""
+    out: Dict[ChunkKey, Dict[str, Any]] = {}
+    start = 0
+    while True:
+        res = (
+            sb.table("chunks")
+            .select("id, chunk_index, pages, content_hash")
+            .eq("doc_id", document_id)
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        data = res.data or []
+        for row in data:
+            # Rows indexed before hashing existed never match, so they get replaced.
+            out[(int(row["chunk_index"]), row.get("content_hash") or f"legacy:{row['id']}")] = row
+        if len(data) < page_size:
+            return out
+        start += page_size
+
+
+def get_chunk_sink(sb: Optional["Client"] = None) -> ChunkSink:
+    """UPLOAD_BACKEND: "rest" (Supabase upsert) or "copy" (COPY over DATABASE_URL)."""
+    if UPLOAD_BACKEND == "copy":
+        require_env("DATABASE_URL", DATABASE_URL)
+        return PostgresCopySink(DATABASE_URL)
+    return SupabaseRestSink(sb or get_supabase())
+
+
+def ingest_pdf_streaming(
+    pdf_path: str,
+    filename: Optional[str] = None,
+    embed_batch_size: int = 32,
+    insert_batch_size: int = 100,
+    queue_size: int = 4,
+    workers: int = 1,
+    dedup: bool = True,
+    replace_document_id: Optional[str] = None,
+) -> Tuple[str, IngestStats]:
+    """
+    Extract → chunk → embed → insert as overlapping stages connected by bounded queues.
+    Peak memory is bounded by queue_size batches instead of the whole document.
+
+    With dedup=True a file whose SHA-256 is already indexed returns the existing
+    document_id at once (rebuilding its BM25 rows if this host has none). Anything else becomes a new document, unless
+    replace_document_id names the document this file is a new version of: that
+    document is then updated in place. Chunks with the same (chunk_index,
+    content_hash) are kept, new ones are inserted and vanished ones deleted.
+    If the update fails before the old chunks are deleted, the inserted ones are
+    removed again so the previous version stays intact.
+
+    Every chunk's text also goes into the local BM25 index (for hybrid search),
+    which is updated only once the upload has succeeded.
+
+    Returns (document_id, stats).
+    """
+    sb = get_supabase()
+    stats = IngestStats()
+    t_start = time.perf_counter()
+
+    doc_name = filename or _basename(pdf_path)
+    content_sha256 = file_sha256(pdf_path)
+
+    if dedup:
+        existing = _find_document(sb, "content_sha256", content_sha256)
+        if existing:
+            lexical = get_lexical_index()
+            if not lexical.has_document(existing["id"]):
+                # Indexed before hybrid search or on another host: rebuild its BM25 rows.
+                _index_lexical(lexical, existing["id"], stored_chunk_rows(existing["id"]))
+            stats.cached = True
+            stats.total_s = time.perf_counter() - t_start
+            return existing["id"], stats
+
+    previous: Optional[Dict[str, Any]] = None
+    if replace_document_id:
+        previous = _find_document(sb, "id", replace_document_id)
+        if previous is None:
+            raise ValueError(f"Document to replace not found: {replace_document_id}")
+
+    stored: Dict[ChunkKey, Dict[str, Any]] = {}
+    if previous:
+        document_id = previous["id"]
+        stored = _stored_chunks(sb, document_id)
+    else:
+        doc_insert = (
+            sb.table("documents")
+            .insert({"filename": doc_name, "content_sha256": content_sha256})
+            .execute()
+        )
+        if not doc_insert.data:
+            raise RuntimeError(f"Failed to insert document row into Supabase: {doc_insert}")
+        document_id = doc_insert.data[0]["id"]
+
+    seen: Set[ChunkKey] = set()
+    moved: List[Tuple[str, Dict[str, Any]]] = []
+    # BM25 rows are spilled to a temp file, so the index is only touched once the
+    # upload succeeded without holding the document's text in memory until then.
+    lexical_spill = tempfile.TemporaryFile("w+", encoding="utf-8")
+
+    def already_stored(c: Chunk) -> bool:
+        # Sees every chunk, embedded or not.
+        lexical_spill.write(
+            json.dumps({"document_id": document_id, "chunk_index": c.idx, "content": c.text, "pages": c.pages})
+            + "\n"
         )
+        key = (c.idx, text_sha256(c.text))
+        seen.add(key)
+        row = stored.get(key)
+        if row is None:
+            return False
+        stats.reused += 1
+        if row.get("pages") != c.pages:
+            moved.append((row["id"], {"pages": c.pages}))
+        return True
+
+    chunk_q: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size * embed_batch_size)
+    embed_q: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    committed = False  # replacement reached the point where the old version is gone
+
+    threads = [
+        threading.Thread(
+            target=_extract_stage,
+            args=(pdf_path, workers, chunk_q, stats, stop, errors),
+            name="ingest-extract",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_embed_stage,
+            args=(chunk_q, embed_q, embed_batch_size, stats, stop, errors, already_stored),
+            name="ingest-embed",
+            daemon=True,
+        ),
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        uploader = BulkUploader(get_chunk_sink(sb), batch_size=insert_batch_size)
+        try:
+            for embedded in _drain(embed_q, errors, stop):
+                for c, emb in embedded:
+                    uploader.add(
+                        {
+                            "doc_id": document_id,
+                            "chunk_index": c.idx,
+                            "content": c.text,
+                            "content_hash": text_sha256(c.text),
+                            "pages": c.pages,
+                            "embedding": emb,
+                        }
+                    )
+        except BaseException as e:
+            # close() re-raises the first failed batch; don't let it replace the error in flight.
+            try:
+                uploader.close()
+            except Exception as close_err:
+                if close_err is not e:
+                    logging.warning("Chunk upload cleanup failed after ingest error: %s", close_err)
+            raise
+        uploader.close()
+        stats.insert_s += uploader.busy_s
+
+        if stats.pages == 0:
+            raise ValueError("No extractable text found in PDF (scanned/image-only PDFs won't work yet).")
+        if stats.chunks == 0:
+            raise ValueError("PDF text extracted, but chunking produced no chunks.")
+
+        if previous:
+            t0 = time.perf_counter()
+            for row_id, patch in moved:
+                sb.table("chunks").update(patch).eq("id", row_id).execute()
+            # From here on the new version is complete; a failure leaves stale rows
+            # that re-running the same replacement deletes (the hash isn't updated yet).
+            committed = True
+            stale = [row["id"] for key, row in stored.items() if key not in seen]
+            for i in range(0, len(stale), insert_batch_size):
+                sb.table("chunks").delete().in_("id", stale[i : i + insert_batch_size]).execute()
+            sb.table("documents").update(
+                {"filename": doc_name, "content_sha256": content_sha256}
+            ).eq("id", document_id).execute()
+            stats.insert_s += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        lexical_spill.seek(0)
+        _index_lexical(get_lexical_index(), document_id, (json.loads(line) for line in lexical_spill))
+        stats.insert_s += time.perf_counter() - t0
+
+    except BaseException:
+        stop.set()
+        try:
+            if not previous:
+                # Don't leave a half-ingested new document behind (chunks cascade).
+                sb.table("documents").delete().eq("id", document_id).execute()
+            elif not committed:
+                _rollback_new_chunks(sb, document_id, {row["id"] for row in stored.values()}, insert_batch_size)
+        except Exception:
+            logging.exception("Failed to clean up document %s after ingest error", document_id)
+        raise
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5)
+        lexical_spill.close()
+
+    stats.total_s = time.perf_counter() - t_start
+    return document_id, stats
+
+
+def _rollback_new_chunks(sb: Client, document_id: str, keep_ids: Set[str], batch_size: int) -> None:
+    """Delete a document's chunks that aren't in keep_ids (the rows an interrupted update added)."""
+    added = [row["id"] for row in _stored_chunks(sb, document_id).values() if row["id"] not in keep_ids]
+    for i in range(0, len(added), batch_size):
+        sb.table("chunks").delete().in_("id", added[i : i + batch_size]).execute()
+
+
+def _index_lexical(index: BM25Index, document_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+    """(Re)build one document's BM25 postings and persist the index."""
+    index.remove_document(document_id)
+    index.add(rows)
+    index.save()
+
+
+def ingest_pdf_local(
+    pdf_path: str,
+    filename: Optional[str] = None,
+    store: Optional["LocalVectorStore"] = None,
+    embed_batch_size: int = 32,
+    workers: int = 1,
+    lexical: Optional[BM25Index] = None,
+) -> Tuple[str, IngestStats]:
+    """
+    Offline ingest into the in-process LocalVectorStore (no Supabase needed),
+    plus the BM25 index saved next to it. The document_id is the file's SHA-256,
+    so re-indexing the same file is a no-op.
+    """
+    if store is None:
+        from retrieval_local import get_local_store
+
+        store = get_local_store()
+    if lexical is None:
+        lexical = get_lexical_index()
+
+    stats = IngestStats()
+    t_start = time.perf_counter()
+    document_id = file_sha256(pdf_path)
+    if store.has_document(document_id):
+        stats.cached = True
+        stats.total_s = time.perf_counter() - t_start
+        return document_id, stats
+
+    def counted_pages() -> Iterator[Tuple[int, str]]:
+        for page in iter_pdf_pages(pdf_path, workers=workers):
+            stats.pages += 1
+            yield page
 
+    rows: List[Dict[str, Any]] = []
+    for batch in _batched(iter_document_chunks(counted_pages()), embed_batch_size):
+        t0 = time.perf_counter()
+        embeddings = embed_texts([c.text for c in batch])
+        stats.embed_s += time.perf_counter() - t0
+        for c, emb in zip(batch, embeddings):
+            rows.append(
+                {
+                    "document_id": document_id,
+                    "chunk_index": c.idx,
+                    "content": c.text,
+                    "metadata": {"pages": c.pages},
+                    "embedding": emb,
+                }
+            )
+        stats.chunks += len(batch)
+
+    if stats.pages == 0:
+        raise ValueError("No extractable text found in PDF (scanned/image-only PDFs won't work yet).")
+    if not rows:
+        raise ValueError("PDF text extracted, but chunking produced no chunks.")
 
-    batch_size = 50
-    for i in range(0, len(rows), batch_size):
-        res = sb.table("chunks").insert(rows[i : i + batch_size]).execute()
-        # optional: sanity check insert success
-        if res.data is None:
-            raise RuntimeError(f"Chunk insert failed at batch {i // batch_size}: {res}")
+    t0 = time.perf_counter()
+    store.add(rows)
+    store.save()
+    _index_lexical(lexical, document_id, rows)
+    stats.insert_s = time.perf_counter() - t0
+    stats.total_s = time.perf_counter() - t_start
+    stats.extract_s = stats.total_s - stats.embed_s - stats.insert_s
+    return document_id, stats
 
+
+def ingest_pdf_to_supabase(pdf_path: str, filename: Optional[str] = None) -> str:
+    document_id, stats = ingest_pdf_streaming(pdf_path, filename=filename)
+    if stats.cached:
+        logging.info("Already indexed %s as %s", filename or _basename(pdf_path), document_id)
+        return document_id
+    logging.info(
+        "Ingested %s: pages=%d chunks=%d reused=%d extract=%.2fs embed=%.2fs insert=%.2fs total=%.2fs",
+        filename or _basename(pdf_path),
+        stats.pages,
+        stats.chunks,
+        stats.reused,
+        stats.extract_s,
+        stats.embed_s,
+        stats.insert_s,
+        stats.total_s,
+    )
     return document_id
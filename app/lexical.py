@@ -0,0 +1,296 @@
+# app/lexical.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from retrieval_base import DocFilter, chunk_key, doc_ids
+
+# Words plus codes/numbers joined by . - _ / (e.g. "e-1042", "4.2.1", "iso/iec").
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/\-][a-z0-9]+)*")
+_PART_RE = re.compile(r"[._/\-]")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have if in into is it its of on or "
+    "that the their then there these this to was were which will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms for BM25. Compound codes are kept whole and also split into
+    their parts, so "E-1042" matches both "E-1042" and "error 1042".
+    """
+    out: List[str] = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        out.append(tok)
+        if len(tok) > 2 and _PART_RE.search(tok):
+            out.extend(p for p in _PART_RE.split(tok) if len(p) > 1 and p not in _STOPWORDS)
+    return out
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over chunk text, scored with numpy.
+
+    Postings are kept as flat (term, row, tf) arrays and compiled on demand into a
+    term-sorted layout with precomputed per-posting weights; a query gathers its
+    terms' postings and sums them with one np.bincount, so scoring cost is the
+    query terms' posting lists, not the corpus size.
+
+    Rows are chunks keyed by (doc_id, chunk_index) and carry content/pages, so a
+    lexical-only hit can be used as context directly.
+
+    Persisted under `directory` as lexical.npz + lexical_rows.jsonl.
+    """
+
+    def __init__(self, directory: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._vocab: Dict[str, int] = {}
+        self._rows: List[Dict[str, Any]] = []
+        self._row_doc: List[str] = []
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._p_term = np.zeros(0, dtype=np.int32)
+        self._p_row = np.zeros(0, dtype=np.int32)
+        self._p_tf = np.zeros(0, dtype=np.float32)
+
+        # Compiled (term-sorted) postings; rebuilt after add/remove.
+        self._dirty = True
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows_sorted = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._doc_codes: Dict[str, int] = {}
+        self._row_code = np.zeros(0, dtype=np.int32)
+
+        if directory:
+            self.load()
+
+    # ---- contents ----
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def has_document(self, document_id: str) -> bool:
+        return document_id in set(self._row_doc)
+
+    def document_ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._row_doc)
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Add chunk rows (document_id/doc_id, chunk_index, content, pages or metadata.pages)."""
+        terms: List[int] = []
+        post_rows: List[int] = []
+        tfs: List[int] = []
+        lens: List[int] = []
+        with self._lock:
+            for r in rows:
+                doc_id = str(r.get("document_id") or r.get("doc_id") or "")
+                pages = r.get("pages")
+                if pages is None:
+                    pages = (r.get("metadata") or {}).get("pages") or []
+                content = r.get("content", "") or ""
+                row = len(self._rows)
+                self._rows.append(
+                    {
+                        "id": r.get("id") or f"{doc_id}:{r.get('chunk_index', row)}",
+                        "doc_id": doc_id,
+                        "chunk_index": int(r.get("chunk_index", row)),
+                        "content": content,
+                        "pages": [int(p) for p in pages],
+                    }
+                )
+                self._row_doc.append(doc_id)
+
+                toks = tokenize(content)
+                lens.append(len(toks))
+                counts = Counter(toks)
+                terms.extend(self._vocab.setdefault(t, len(self._vocab)) for t in counts)
+                tfs.extend(counts.values())
+                post_rows.extend([row] * len(counts))
+
+            if not lens:
+                return
+            self._doc_len = np.concatenate([self._doc_len, np.asarray(lens, dtype=np.float32)])
+            self._p_term = np.concatenate([self._p_term, np.asarray(terms, dtype=np.int32)])
+            self._p_row = np.concatenate([self._p_row, np.asarray(post_rows, dtype=np.int32)])
+            self._p_tf = np.concatenate([self._p_tf, np.asarray(tfs, dtype=np.float32)])
+            self._dirty = True
+
+    def remove_document(self, document_id: str) -> None:
+        with self._lock:
+            drop = np.asarray([d == document_id for d in self._row_doc], dtype=bool)
+            if not drop.any():
+                return
+            keep_rows = ~drop
+            new_index = np.cumsum(keep_rows) - 1  # old row -> new row
+            keep_post = keep_rows[self._p_row]
+            self._p_term = self._p_term[keep_post]
+            self._p_tf = self._p_tf[keep_post]
+            self._p_row = new_index[self._p_row[keep_post]].astype(np.int32)
+            self._doc_len = self._doc_len[keep_rows]
+            self._rows = [r for r, k in zip(self._rows, keep_rows) if k]
+            self._row_doc = [r["doc_id"] for r in self._rows]
+            self._dirty = True
+
+    def _compile(self) -> None:
+        n = len(self._rows)
+        n_terms = len(self._vocab)
+        order = np.argsort(self._p_term, kind="stable")
+        terms = self._p_term[order]
+        rows = self._p_row[order]
+        tf = self._p_tf[order]
+
+        df = np.bincount(terms, minlength=n_terms).astype(np.float32)
+        self._offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self._idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        avgdl = float(self._doc_len.mean()) if n else 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[rows] / max(avgdl, 1e-9))
+        self._weights = (self._idf[terms] * tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+        self._rows_sorted = rows
+
+        self._doc_codes = {}
+        self._row_code = np.asarray(
+            [self._doc_codes.setdefault(d, len(self._doc_codes)) for d in self._row_doc], dtype=np.int32
+        )
+        self._dirty = False
+
+    # ---- search ----
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for `query` (zeros where no term matches)."""
+        with self._lock:
+            if self._dirty:
+                self._compile()
+            n = len(self._rows)
+            tids = sorted({self._vocab[t] for t in tokenize(query) if t in self._vocab})
+            if not tids or n == 0:
+                return np.zeros(n, dtype=np.float32)
+            spans = [(self._offsets[t], self._offsets[t + 1]) for t in tids]
+            rows = np.concatenate([self._rows_sorted[a:b] for a, b in spans])
+            weights = np.concatenate([self._weights[a:b] for a, b in spans])
+            return np.bincount(rows, weights=weights, minlength=n).astype(np.float32)
+
+    def search(self, query: str, top_k: int = 6, document_id: DocFilter = None) -> List[Dict[str, Any]]:
+        """Top-k rows by BM25 (only rows matching at least one term), as retrieval hits."""
+        with self._lock:
+            scores = self.scores(query)
+            if top_k <= 0 or not scores.size:
+                return []
+            ids = doc_ids(document_id)
+            if ids is not None:
+                codes = [self._doc_codes[d] for d in ids if d in self._doc_codes]
+                scores = np.where(np.isin(self._row_code, codes), scores, 0.0)
+
+            cand = np.flatnonzero(scores > 0)
+            if not len(cand):
+                return []
+            k = min(top_k, len(cand))
+            top = cand[np.argpartition(-scores[cand], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+
+            hits: List[Dict[str, Any]] = []
+            for t in top:
+                row = dict(self._rows[int(t)])
+                row["metadata"] = {"pages": row["pages"]}
+                row["bm25"] = float(scores[t])
+                hits.append(row)
+            return hits
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int = 6, document_id: DocFilter = None
+    ) -> List[List[Dict[str, Any]]]:
+        return [self.search(q, top_k=top_k, document_id=document_id) for q in queries]
+
+    # ---- persistence ----
+    def save(self) -> None:
+        if not self.directory:
+            return
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            npz_path = os.path.join(self.directory, "lexical.npz")
+            rows_path = os.path.join(self.directory, "lexical_rows.jsonl")
+            vocab = [""] * len(self._vocab)
+            for t, i in self._vocab.items():
+                vocab[i] = t
+            np.savez(
+                npz_path + ".tmp.npz",
+                vocab=np.asarray(vocab, dtype=object),
+                doc_len=self._doc_len,
+                p_term=self._p_term,
+                p_row=self._p_row,
+                p_tf=self._p_tf,
+            )
+            with open(rows_path + ".tmp", "w", encoding="utf-8") as f:
+                for r in self._rows:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            os.replace(npz_path + ".tmp.npz", npz_path)
+            os.replace(rows_path + ".tmp", rows_path)
+
+    def load(self) -> None:
+        npz_path = os.path.join(self.directory or "", "lexical.npz")
+        rows_path = os.path.join(self.directory or "", "lexical_rows.jsonl")
+        if not (os.path.exists(npz_path) and os.path.exists(rows_path)):
+            return
+        with self._lock:
+            data = np.load(npz_path, allow_pickle=True)
+            self._vocab = {str(t): i for i, t in enumerate(data["vocab"])}
+            self._doc_len = data["doc_len"].astype(np.float32)
+            self._p_term = data["p_term"].astype(np.int32)
+            self._p_row = data["p_row"].astype(np.int32)
+            self._p_tf = data["p_tf"].astype(np.float32)
+            with open(rows_path, encoding="utf-8") as f:
+                self._rows = [json.loads(line) for line in f if line.strip()]
+            self._row_doc = [r["doc_id"] for r in self._rows]
+            self._dirty = True
+
+
+def rrf_fuse(result_lists: Sequence[List[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank).
+    Hits are matched on (doc_id, chunk_index); the first list's copy of a hit wins
+    (so vector hits keep their similarity). Each fused hit gets an `rrf_score`.
+    """
+    fused: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    scores: Dict[Tuple[str, int], float] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = chunk_key(hit)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in fused:
+                fused[key] = dict(hit)
+            elif "bm25" in hit:
+                fused[key]["bm25"] = hit["bm25"]
+
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+    out: List[Dict[str, Any]] = []
+    for key in ranked:
+        hit = fused[key]
+        hit["rrf_score"] = scores[key]
+        out.append(hit)
+    return out
+
+
+def _create_lexical_index() -> BM25Index:
+    from settings import LEXICAL_INDEX_DIR, LOCAL_STORE_DIR, RETRIEVAL_BACKEND
+
+    # With the local backend the index lives next to vectors.npy.
+    return BM25Index(LOCAL_STORE_DIR if RETRIEVAL_BACKEND == "local" else LEXICAL_INDEX_DIR)
+
+
+def get_lexical_index() -> BM25Index:
+    """Process-wide BM25 index, loaded on first use."""
+    from resources import registry
+
+    return registry.get("lexical_index", _create_lexical_index)
@@ -1,6 +1,86 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+
+@dataclass
+class StreamStats:
+    ttft_s: Optional[float] = None  # time to first token
+    total_s: float = 0.0
+    tokens: int = 0  # streamed deltas (~1 token each for OpenAI-style streams)
+
+    @property
+    def tokens_per_s(self) -> float:
+        # Decode rate after the first token arrived.
+        gen_s = self.total_s - (self.ttft_s or 0.0)
+        return self.tokens / gen_s if gen_s > 0 else 0.0
+
+
+class TokenStream:
+    """Iterable of text deltas that records timing and keeps the full text."""
+
+    def __init__(self, deltas: Iterator[str]):
+        self._deltas = deltas
+        self._parts: List[str] = []
+        self.stats = StreamStats()
+
+    def __iter__(self) -> Iterator[str]:
+        t0 = time.perf_counter()
+        for delta in self._deltas:
+            if not delta:
+                continue
+            if self.stats.ttft_s is None:
+                self.stats.ttft_s = time.perf_counter() - t0
+            self.stats.tokens += 1
+            self._parts.append(delta)
+            yield delta
+        self.stats.total_s = time.perf_counter() - t0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
 
 class LLMClient(ABC):
     @abstractmethod
     def generate(self, prompt: str) -> str:
         raise NotImplementedError
+
+    def stream(self, prompt: str) -> TokenStream:
+        """Stream text deltas; iterate the result, then read .text and .stats."""
+        return TokenStream(self._stream(prompt))
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        # Clients without native streaming emit the whole completion at once.
+        yield self.generate(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        """Async generate. Default runs the blocking call in a worker thread; clients override."""
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def agenerate_many(self, prompts: List[str], concurrency: int = 4) -> List[str]:
+        """Results in prompt order, at most `concurrency` requests in flight."""
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(prompt: str) -> str:
+            async with sem:
+                return await self.agenerate(prompt)
+
+        return list(await asyncio.gather(*(one(p) for p in prompts)))
+
+    async def aclose(self) -> None:
+        """Release async resources bound to the running event loop (e.g. HTTP pools)."""
+        return None
+
+    def generate_many(self, prompts: List[str], concurrency: int = 4) -> List[str]:
+        """Blocking wrapper around agenerate_many (call from sync code, not inside an event loop)."""
+
+        async def run() -> List[str]:
+            try:
+                return await self.agenerate_many(prompts, concurrency=concurrency)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
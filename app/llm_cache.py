@@ -0,0 +1,178 @@
+# app/llm_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from llm_base import LLMClient, TokenStream
+
+
+class CachedLLM(LLMClient):
+    """
+    Response cache around any LLMClient, backed by a local SQLite file.
+
+    Key: sha256(prompt) + model + temperature + max_tokens of the wrapped client.
+    Responses are stored (and returned) stripped; empty responses are never cached.
+    Entries expire after `ttl_s`; least-recently-used entries are evicted once
+    stored responses exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        inner: LLMClient,
+        path: str,
+        ttl_s: float = 7 * 24 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.inner = inner
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.model = getattr(inner, "model", type(inner).__name__)
+        self.temperature = getattr(inner, "temperature", None)
+        self.max_tokens = getattr(inner, "max_tokens", None)
+
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            create table if not exists responses (
+              key text primary key,
+              response text not null,
+              size int not null,
+              created_at real not null,
+              accessed_at real not null
+            )
+            """
+        )
+        self._db.execute("create index if not exists responses_accessed_idx on responses(accessed_at)")
+        self._db.execute("create index if not exists responses_created_idx on responses(created_at)")
+        self._db.commit()
+        # Running total of stored bytes, so puts don't re-sum the table.
+        self._bytes = self._db.execute("select coalesce(sum(size), 0) from responses").fetchone()[0]
+
+    def key(self, prompt: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{prompt_hash}:{self.model}:{self.temperature}:{self.max_tokens}"
+
+    # ---- store ----
+    def get(self, prompt: str) -> Optional[str]:
+        key = self.key(prompt)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "select response, created_at, size from responses where key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_s:
+                self._db.execute("delete from responses where key = ?", (key,))
+                self._db.commit()
+                self._bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("update responses set accessed_at = ? where key = ?", (now, key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, prompt: str, response: str) -> None:
+        response = response.strip()
+        if not response:
+            # Empty output is almost always a failed or cut-off call; don't pin it for ttl_s.
+            return
+        now = time.time()
+        key = self.key(prompt)
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("select size from responses where key = ?", (key,)).fetchone()
+            self._db.execute(
+                "insert or replace into responses (key, response, size, created_at, accessed_at) "
+                "values (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._evict_locked(now)
+            self._db.commit()
+
+    def _evict_locked(self, now: float) -> None:
+        cutoff = now - self.ttl_s
+        expired = self._db.execute(
+            "select coalesce(sum(size), 0) from responses where created_at < ?", (cutoff,)
+        ).fetchone()[0]
+        if expired:
+            self._db.execute("delete from responses where created_at < ?", (cutoff,))
+            self._bytes -= expired
+        if self._bytes <= self.max_bytes:
+            return
+        excess = self._bytes - self.max_bytes
+        victims: List[str] = []
+        for key, size in self._db.execute("select key, size from responses order by accessed_at"):
+            victims.append(key)
+            self._bytes -= size
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("delete from responses where key = ?", [(k,) for k in victims])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("delete from responses")
+            self._db.commit()
+            self._bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("select count(*) from responses").fetchone()[0]
+            size = self._bytes
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    # ---- LLMClient ----
+    def generate(self, prompt: str) -> str:
+        cached = self.get(prompt)
+        if cached is not None:
+            return cached
+        response = self.inner.generate(prompt).strip()
+        self.put(prompt, response)
+        return response
+
+    async def agenerate(self, prompt: str) -> str:
+        cached = self.get(prompt)
+        if cached is not None:
+            return cached
+        response = (await self.inner.agenerate(prompt)).strip()
+        self.put(prompt, response)
+        return response
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        cached = self.get(prompt)
+        if cached is not None:
+            yield cached
+            return
+        stream: TokenStream = self.inner.stream(prompt)
+        yield from stream
+        # Only complete streams are cached.
+        self.put(prompt, stream.text)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
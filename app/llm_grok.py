@@ -1,9 +1,13 @@
 # app/llm_grok.py
 from __future__ import annotations
 
+import asyncio
 import os
+import weakref
+from typing import Iterator
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from openai import PermissionDeniedError, APIError, RateLimitError
 
 from llm_base import LLMClient
@@ -15,47 +19,112 @@ try:
 except Exception:
     pass
 
+SYSTEM_PROMPT = "Answer using the provided sources. Cite pages like (PDF p. 3)."
+XAI_BASE_URL = "https://api.x.ai/v1"
+
+
+def _grok_error(e: Exception) -> RuntimeError:
+    if isinstance(e, PermissionDeniedError):
+        return RuntimeError(
+            "Grok API call failed (403 PermissionDenied). "
+            "Check that your xAI account/team has API access and billing/credits enabled."
+        )
+    if isinstance(e, RateLimitError):
+        return RuntimeError(
+            "Grok API rate-limited. Slow down requests or raise your limits/plan."
+        )
+    return RuntimeError(
+        f"Grok API error: {e}"
+    )
+
 
 class GrokLLM(LLMClient):
     """
     xAI Grok via OpenAI-compatible client.
     Requires: XAI_API_KEY (or GROK_API_KEY)
-    Optional: GROK_MODEL, GROK_MAX_TOKENS
+    Optional: GROK_MODEL, GROK_MAX_TOKENS, GROK_MAX_CONNECTIONS
     """
     def __init__(self):
         api_key = os.getenv("XAI_API_KEY") or os.getenv("GROK_API_KEY")
         if not api_key:
             raise RuntimeError("Missing XAI_API_KEY (or GROK_API_KEY) in environment")
 
-        self.client = OpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
+        self.api_key = api_key
+        self.client = OpenAI(api_key=api_key, base_url=XAI_BASE_URL)
         self.model = os.getenv("GROK_MODEL", "grok-4-1-fast-reasoning")
         self.max_tokens = int(os.getenv("GROK_MAX_TOKENS", "4000"))
+        self.temperature = 0.2
+        self.max_connections = int(os.getenv("GROK_MAX_CONNECTIONS", "16"))
+        # httpx async clients are bound to the loop they were first used on.
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _messages(self, prompt: str) -> list:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+
+    def _async_client(self) -> AsyncOpenAI:
+        """One pooled AsyncOpenAI client per running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+            )
+            client = AsyncOpenAI(api_key=self.api_key, base_url=XAI_BASE_URL, http_client=http_client)
+            self._async_clients[loop] = client
+        return client
 
     def generate(self, prompt: str) -> str:
         try:
             resp = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "Answer using the provided sources. Cite pages like (PDF p. 3)."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.2,
+                messages=self._messages(prompt),
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+            return (resp.choices[0].message.content or "").strip()
+
+        except (PermissionDeniedError, RateLimitError, APIError) as e:
+            raise _grok_error(e) from e
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+
+        except (PermissionDeniedError, RateLimitError, APIError) as e:
+            raise _grok_error(e) from e
+
+    async def agenerate(self, prompt: str) -> str:
+        try:
+            resp = await self._async_client().chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                temperature=self.temperature,
                 max_tokens=self.max_tokens,
             )
             return (resp.choices[0].message.content or "").strip()
 
-        except PermissionDeniedError as e:
-            raise RuntimeError(
-                "Grok API call failed (403 PermissionDenied). "
-                "Check that your xAI account/team has API access and billing/credits enabled."
-            ) from e
-
-        except RateLimitError as e:
-            raise RuntimeError(
-                "Grok API rate-limited. Slow down requests or raise your limits/plan."
-            ) from e
-
-        except APIError as e:
-            raise RuntimeError(
-                f"Grok API error: {e}"
-            ) from e
+        except (PermissionDeniedError, RateLimitError, APIError) as e:
+            raise _grok_error(e) from e
+
+    async def aclose(self) -> None:
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
@@ -4,7 +4,9 @@ from __future__ import annotations
 import random
 import re
 import textwrap
+from typing import Iterator
 
+from doc_builder import word_count
 from llm_base import LLMClient
 
 
@@ -16,9 +18,6 @@ class MockLLM(LLMClient):
     def __init__(self, seed: int = 42):
         self._rng = random.Random(seed)
 
-    def _words(self, s: str) -> int:
-        return len(re.findall(r"\b\w+\b", s))
-
     def generate(self, prompt: str) -> str:
         teaser = prompt.strip().replace("\n", " ")[:260]
 
@@ -54,8 +53,10 @@ class MockLLM(LLMClient):
         section_heading = heading_match.group(1).strip() if heading_match else None
 
         paras = []
+        words = 0  # running count: each paragraph is counted once
         if section_heading:
             paras.append(f"## {section_heading}\n")
+            words += word_count(section_heading)
 
         while True:
             cite_page = self._rng.randint(1, 5)
@@ -65,12 +66,23 @@ class MockLLM(LLMClient):
                 f"It is intentionally verbose to test long-form orchestration. (PDF p. {cite_page})"
             )
             paras.append(textwrap.fill(p, width=100))
+            words += word_count(paras[-1])
 
             if len(paras) % 5 == 0:
                 paras.append("### Practical checklist (mock)\n- Step A\n- Step B\n- Step C\n")
+                words += word_count(paras[-1])
             if len(paras) % 7 == 0:
                 paras.append("### Common pitfalls (mock)\n- Pitfall 1\n- Pitfall 2\n- Pitfall 3\n")
+                words += word_count(paras[-1])
+
+            if words >= 1600:
+                return "\n\n".join(paras).strip()
+
+    async def agenerate(self, prompt: str) -> str:
+        # CPU-only and fast: no need for a worker thread.
+        return self.generate(prompt)
 
-            text = "\n\n".join(paras).strip()
-            if self._words(text) >= 1600:
-                return text
+    def _stream(self, prompt: str) -> Iterator[str]:
+        # Word-sized deltas, like a real token stream.
+        for piece in re.findall(r"\S+\s*", self.generate(prompt)):
+            yield piece
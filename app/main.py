@@ -7,10 +7,18 @@ import tempfile
 import streamlit as st
 from dotenv import load_dotenv
 
-from ingest import ingest_pdf_to_supabase
-from retrieve import retrieve_context
-from handbook import generate_handbook_markdown
-
+from context_pack import budget_for, pack_hits
+from resources import load_metrics, registry
+from settings import (
+    HANDBOOK_CONCURRENCY,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_MB,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_S,
+    RETRIEVAL_BACKEND,
+)
+
+from llm_cache import CachedLLM
 from llm_mock import MockLLM  # fallback only
 
 load_dotenv()
@@ -27,52 +35,80 @@ def as_text(resp) -> str:
     return getattr(resp, "text", resp)
 
 
-@st.cache_resource
-def get_llm():
+def active_doc_filter():
+    """
+    The session's active document set as a retrieval filter: a list of ids
+    (one merged top-k across them), or None to search the whole collection.
+    """
+    if st.session_state.search_all_docs:
+        return None
+    return list(st.session_state.active_doc_ids)
+
+
+def has_active_docs() -> bool:
+    return st.session_state.search_all_docs or bool(st.session_state.active_doc_ids)
+
+
+# ----------------------------
+# Facades over heavy modules
+# ----------------------------
+# ingest pulls in pdfplumber, retrieve the embedder (sentence-transformers/torch)
+# and Supabase, llm_grok the OpenAI client. Each loads on first use, so the
+# first page renders without them (see bench_startup.py).
+def index_pdf(path: str, filename: str, replace_document_id=None):
+    from ingest import ingest_pdf_local, ingest_pdf_streaming
+
+    if RETRIEVAL_BACKEND == "local":
+        return ingest_pdf_local(path, filename=filename)
+    return ingest_pdf_streaming(path, filename=filename, replace_document_id=replace_document_id)
+
+
+def search(query: str, top_k: int, document_id, path: str):
+    from retrieve import retrieve_context
+
+    return retrieve_context(query, top_k=top_k, document_id=document_id, path=path)
+
+
+def handbook_runner():
+    from handbook_runner import get_handbook_runner
+
+    return get_handbook_runner()
+
+
+def _build_llm():
     """Prefer Grok if configured; fall back to MockLLM (keeps demo usable)."""
     try:
         from llm_grok import GrokLLM
-        return GrokLLM()
+        llm = GrokLLM()
     except Exception as e:
         print("Falling back to MockLLM:", e)
-        return MockLLM()
-
-
-def get_pages_from_hit(hit: dict) -> list[int]:
-    """Support either {pages: [...]} or {metadata: {pages: [...]}}."""
-    pages = hit.get("pages")
-    if pages is None:
-        pages = (hit.get("metadata") or {}).get("pages")
-    if not pages:
-        return []
-    # normalize to ints
-    out = []
-    for p in pages:
-        try:
-            out.append(int(p))
-        except Exception:
-            pass
-    return out
+        llm = MockLLM()
+
+    if LLM_CACHE_ENABLED:
+        llm = CachedLLM(
+            llm,
+            LLM_CACHE_PATH,
+            ttl_s=LLM_CACHE_TTL_S,
+            max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+        )
+    return llm
 
 
-def format_context(hits: list[dict]) -> str:
-    """Human-readable retrieved passages (kept short; used for LLM prompt only)."""
-    blocks: list[str] = []
-    for h in hits:
-        pages = get_pages_from_hit(h)
-        sim = float(h.get("similarity", 0.0) or 0.0)
-        content = h.get("content", "") or ""
-        blocks.append(f"[pages={pages} sim={sim:.3f}]\n{content}".strip())
-    return "\n\n---\n\n".join(blocks).strip()
+def get_llm():
+    return registry.get("llm", _build_llm)
 
 
 # ----------------------------
 # Session state
 # ----------------------------
-if "doc_id" not in st.session_state:
-    st.session_state.doc_id = None
-if "doc_name" not in st.session_state:
-    st.session_state.doc_name = None
+# Documents indexed in this session (document_id -> filename) and the active set
+# that chat and /handbook retrieve from.
+if "documents" not in st.session_state:
+    st.session_state.documents = {}
+if "active_doc_ids" not in st.session_state:
+    st.session_state.active_doc_ids = []
+if "search_all_docs" not in st.session_state:
+    st.session_state.search_all_docs = False
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
@@ -84,6 +120,10 @@ if "latest_handbook_topic" not in st.session_state:
 if "latest_handbook_words" not in st.session_state:
     st.session_state.latest_handbook_words = 0
 
+# Background handbook job owned by this session (at most one; polled by handbook_job_panel)
+if "handbook_job_id" not in st.session_state:
+    st.session_state.handbook_job_id = None
+
 
 # ----------------------------
 # Sidebar: Upload + Index + Controls
@@ -99,17 +139,36 @@ with st.sidebar:
     if uploaded is not None:
         st.caption(f"Selected: **{uploaded.name}**")
 
+    # Updating a document in place is explicit: a file is never matched to another by its name.
+    replace_doc_id = None
+    if RETRIEVAL_BACKEND != "local" and st.session_state.documents:
+        replace_doc_id = st.selectbox(
+            "New version of",
+            options=[None] + list(st.session_state.documents),
+            format_func=lambda d: "— (new document)" if d is None else st.session_state.documents.get(d, d),
+        )
+
     if st.button("Index PDF", disabled=(uploaded is None)):
-        with st.spinner("Extracting → chunking → embedding → uploading to Supabase..."):
+        target = "local vector store" if RETRIEVAL_BACKEND == "local" else "Supabase"
+        with st.spinner(f"Extracting → chunking → embedding → uploading to {target}..."):
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
                 tmp.write(uploaded.getbuffer())
                 tmp_path = tmp.name
 
             try:
-                doc_id = ingest_pdf_to_supabase(tmp_path, filename=uploaded.name)
-                st.session_state.doc_id = doc_id
-                st.session_state.doc_name = uploaded.name
-                st.success(f"Indexed ✅ document_id={doc_id}")
+                doc_id, stats = index_pdf(tmp_path, uploaded.name, replace_document_id=replace_doc_id)
+                st.session_state.documents[doc_id] = uploaded.name
+                if doc_id not in st.session_state.active_doc_ids:
+                    st.session_state.active_doc_ids = st.session_state.active_doc_ids + [doc_id]
+                if stats.cached:
+                    st.success(f"Already indexed ✅ document_id={doc_id}")
+                else:
+                    st.success(f"Indexed ✅ document_id={doc_id}")
+                    st.caption(
+                        f"{stats.pages} pages, {stats.chunks} chunks ({stats.reused} unchanged) — "
+                        f"extract {stats.extract_s:.1f}s · embed {stats.embed_s:.1f}s · "
+                        f"insert {stats.insert_s:.1f}s · total {stats.total_s:.1f}s"
+                    )
             except Exception as e:
                 st.error(f"Indexing failed: {e}")
             finally:
@@ -120,12 +179,39 @@ with st.sidebar:
 
     st.divider()
     st.subheader("Status")
-    if st.session_state.doc_id:
-        st.write("**Active doc:**", st.session_state.doc_name)
-        st.write("**doc_id:**", st.session_state.doc_id)
-    else:
+    st.checkbox("Search all indexed documents", key="search_all_docs")
+    if st.session_state.documents:
+        st.multiselect(
+            "Active documents",
+            options=list(st.session_state.documents),
+            format_func=lambda d: st.session_state.documents.get(d, d),
+            key="active_doc_ids",
+            disabled=st.session_state.search_all_docs,
+        )
+    elif not st.session_state.search_all_docs:
         st.write("No PDF indexed yet.")
 
+    loaded = load_metrics()
+    if loaded:
+        st.caption("Loaded: " + ", ".join(f"{k} {v:.1f}s" for k, v in loaded.items()))
+
+    llm_for_stats = get_llm() if registry.loaded("llm") else None
+    if isinstance(llm_for_stats, CachedLLM) and (llm_for_stats.hits or llm_for_stats.misses):
+        st.caption(
+            f"LLM cache: {llm_for_stats.hit_rate:.0%} hit rate "
+            f"({llm_for_stats.hits} hits / {llm_for_stats.misses} misses)"
+        )
+
+    if registry.loaded("reranker"):
+        from rerank import get_reranker
+
+        reranker = get_reranker()
+        st.caption(
+            "Re-rank: "
+            + ", ".join(f"{p} +{t.avg_ms:.0f}ms/call ({t.calls})" for p, t in reranker.timings().items())
+            + f" · {reranker.hit_rate:.0%} cached"
+        )
+
     st.divider()
     st.subheader("Downloads")
     if st.session_state.latest_handbook_md:
@@ -169,6 +255,54 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+# Active handbook job: runs in the background runner. Only this fragment reruns
+# (once a second) to poll it, so the page and chat input stay responsive.
+@st.fragment(run_every=1.0 if st.session_state.handbook_job_id else None)
+def handbook_job_panel() -> None:
+    job_id = st.session_state.handbook_job_id
+    if not job_id:
+        return
+    job = handbook_runner().status(job_id)
+    if job is None:
+        # Process restarted (the checkpoint lets `/handbook` resume it), or the status expired.
+        st.session_state.handbook_job_id = None
+        st.rerun()
+    elif job.state == "done":
+        st.session_state.latest_handbook_md = job.markdown
+        st.session_state.latest_handbook_topic = job.topic
+        st.session_state.latest_handbook_words = job.words
+        st.session_state.handbook_job_id = None
+        handbook_runner().forget(job.job_id)
+
+        done_msg = (
+            f"✅ Generated **{job.words} words** for **{job.topic}** "
+            f"({job.prompt_tokens_saved} prompt tokens saved by context packing, "
+            f"{job.planner_tokens_saved} of them by de-duplicating excerpts across sections).\n\n"
+            "Download the full handbook from the **Downloads** section in the sidebar.\n\n"
+        )
+        st.session_state.messages.append({"role": "assistant", "content": done_msg})
+        st.session_state.show_handbook_preview = True
+        st.rerun()  # whole page: chat history and the sidebar download
+    elif job.state == "failed":
+        st.session_state.handbook_job_id = None
+        handbook_runner().forget(job.job_id)
+        fail_msg = f"Handbook generation failed: {job.error}\n\nRun the same `/handbook` command to resume."
+        st.session_state.messages.append({"role": "assistant", "content": fail_msg})
+        st.rerun()
+    else:
+        with st.chat_message("assistant"):
+            st.progress(job.fraction)
+            st.write(job.message)
+            if job.preview:
+                st.markdown(job.preview)
+
+
+if st.session_state.pop("show_handbook_preview", False):
+    with st.expander("Handbook preview (first 6000 chars)"):
+        st.markdown(st.session_state.latest_handbook_md[:6000])
+
+handbook_job_panel()
+
 prompt = st.chat_input("Ask a question… or use `/handbook <topic>` to generate a handbook")
 
 if prompt:
@@ -177,9 +311,12 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Guard: must have indexed PDF
-    if not st.session_state.doc_id:
-        answer = "This chat answers using **uploaded PDFs** (RAG). Please upload and index a PDF in the sidebar first."
+    # Guard: must have at least one active document
+    if not has_active_docs():
+        answer = (
+            "This chat answers using **uploaded PDFs** (RAG). Please upload and index a PDF in the sidebar "
+            "first, or select the documents to search."
+        )
         st.session_state.messages.append({"role": "assistant", "content": answer})
         with st.chat_message("assistant"):
             st.markdown(answer)
@@ -193,46 +330,35 @@ if prompt:
     if prompt.strip().lower().startswith("/handbook"):
         topic = prompt.replace("/handbook", "", 1).strip() or "Handbook Topic"
 
-        with st.chat_message("assistant"):
-            prog = st.progress(0)
-            status = st.empty()
-
-            def progress_cb(msg: str, frac: float) -> None:
-                status.write(msg)
-                prog.progress(min(max(frac, 0.0), 1.0))
-
-            try:
-                result = generate_handbook_markdown(
-                    llm=llm,
-                    topic=topic,
-                    document_id=st.session_state.doc_id,
-                    target_words=20000,
-                    progress_cb=progress_cb,
-                )
-            except Exception as e:
-                st.error(f"Handbook generation failed: {e}")
-                st.stop()
-
-            st.session_state.latest_handbook_md = result.markdown
-            st.session_state.latest_handbook_topic = topic
-            st.session_state.latest_handbook_words = result.words
-
-            done_msg = (
-                f"✅ Generated **{result.words} words** for **{topic}**.\n\n"
-                "Download the full handbook from the **Downloads** section in the sidebar.\n\n"
-            )
-            st.session_state.messages.append({"role": "assistant", "content": done_msg})
-            st.markdown(done_msg)
-
-        with st.expander("Handbook preview (first 6000 chars)"):
-            st.markdown(st.session_state.latest_handbook_md[:6000])
-
+        if st.session_state.handbook_job_id:
+            # One job per session: a second one would orphan the first one's progress.
+            answer = "A handbook is still being generated; wait for it to finish before starting another."
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+            with st.chat_message("assistant"):
+                st.markdown(answer)
+            st.stop()
+
+        job_id = handbook_runner().submit(
+            llm=llm,
+            topic=topic,
+            document_id=active_doc_filter(),
+            target_words=20000,
+            concurrency=HANDBOOK_CONCURRENCY,
+        )
+        st.session_state.handbook_job_id = job_id
+        st.session_state.messages.append(
+            {
+                "role": "assistant",
+                "content": f"⏳ Started handbook job `{job_id}` for **{topic}**. Progress is shown below.",
+            }
+        )
         st.rerun()
 
     # ----------------------------
     # Normal Q&A (RAG)
     # ----------------------------
-    hits = retrieve_context(prompt, top_k=6, document_id=st.session_state.doc_id)
+    # One lookup across the whole active set (merged top-k), not one per document
+    hits = search(prompt, top_k=6, document_id=active_doc_filter(), path="chat")
 
     if not hits:
         answer = "The uploaded PDFs don't mention this."
@@ -241,8 +367,9 @@ if prompt:
             st.markdown(answer)
         st.stop()
 
-    allowed_pages = sorted({p for h in hits for p in get_pages_from_hit(h)})
-    ctx = format_context(hits)
+    packed = pack_hits(hits, budget_for(getattr(llm, "model", None), "chat"))
+    allowed_pages = packed.pages
+    ctx = packed.text
 
     rag_prompt = f"""
 Answer the question using ONLY the source excerpts.
@@ -260,14 +387,23 @@ Rules:
 - If you cannot cite from allowed pages, say: "The uploaded PDFs don't mention this."
 """
 
-    try:
-        answer = as_text(llm.generate(rag_prompt))
-    except Exception as e:
-        answer = (
-            f"⚠️ LLM error: {e}\n\nFalling back to MockLLM for this answer.\n\n"
-            + MockLLM().generate(rag_prompt)
-        )
+    with st.chat_message("assistant"):
+        stream = llm.stream(rag_prompt)
+        try:
+            st.write_stream(stream)
+            answer = stream.text
+            stats = stream.stats
+            if stats.ttft_s is not None:
+                st.caption(
+                    f"first token {stats.ttft_s:.2f}s · {stats.tokens_per_s:.0f} tok/s · "
+                    f"{stats.total_s:.1f}s total · context {packed.tokens} tokens ({packed.saved_tokens} saved)"
+                )
+        except Exception as e:
+            fallback = (
+                f"⚠️ LLM error: {e}\n\nFalling back to MockLLM for this answer.\n\n"
+                + MockLLM().generate(rag_prompt)
+            )
+            st.markdown(fallback)
+            answer = f"{stream.text}\n\n{fallback}".strip()
 
     st.session_state.messages.append({"role": "assistant", "content": answer})
-    with st.chat_message("assistant"):
-        st.markdown(answer)
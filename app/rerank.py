@@ -0,0 +1,163 @@
+# app/rerank.py
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from resources import registry
+from settings import RERANK_BATCH_SIZE, RERANK_CACHE_SIZE, RERANK_MODEL, RERANK_THREADS
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+
+def pair_key(model_name: str, query: str, content: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{query}\0{content}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class RerankTiming:
+    calls: int = 0
+    pairs: int = 0
+    scored: int = 0  # pairs that actually went through the model (cache misses)
+    seconds: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return 1000.0 * self.seconds / self.calls if self.calls else 0.0
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders retrieved hits by a cross-encoder's (query, chunk) relevance score.
+
+    - Scores only pairs missing from an in-memory LRU cache, all in one batched
+      predict() call (several queries at once for rerank_batch).
+    - Records added latency per path ("chat", "handbook", ...) so each path's
+      cost can be weighed before enabling it there (see RERANK_PATHS).
+    """
+
+    def __init__(self, model: "CrossEncoder", model_name: str, batch_size: int = 32, cache_size: int = 50_000):
+        self.model = model
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._timings: Dict[str, RerankTiming] = {}
+
+    def _cached(self, keys: Sequence[str]) -> List[Optional[float]]:
+        with self._lock:
+            out: List[Optional[float]] = []
+            for k in keys:
+                v = self._cache.get(k)
+                if v is not None:
+                    self._cache.move_to_end(k)
+                out.append(v)
+            return out
+
+    def _store(self, items: Sequence[Tuple[str, float]]) -> None:
+        with self._lock:
+            for k, v in items:
+                self._cache[k] = v
+                self._cache.move_to_end(k)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        """Cross-encoder scores for (query, content) pairs, from cache where possible."""
+        keys = [pair_key(self.model_name, q, c) for q, c in pairs]
+        scores = self._cached(keys)
+
+        todo: Dict[str, Tuple[str, str]] = {}
+        for k, p, s in zip(keys, pairs, scores):
+            if s is None:
+                todo.setdefault(k, p)
+        with self._lock:
+            self.hits += len(pairs) - sum(s is None for s in scores)
+            self.misses += len(todo)
+
+        if todo:
+            # One model, many threads (chat + handbook workers): predict serially.
+            with self._predict_lock:
+                predicted = self.model.predict(
+                    list(todo.values()), batch_size=self.batch_size, show_progress_bar=False
+                )
+            fresh = dict(zip(todo, (float(x) for x in predicted)))
+            self._store(list(fresh.items()))
+            scores = [fresh[k] if s is None else s for k, s in zip(keys, scores)]
+        return [float(s) for s in scores]
+
+    def rerank_batch(
+        self,
+        queries: Sequence[str],
+        hit_lists: Sequence[List[Dict[str, Any]]],
+        top_k: int,
+        path: str = "default",
+    ) -> List[List[Dict[str, Any]]]:
+        """Best `top_k` of each hit list for its query; hits gain a `rerank_score`."""
+        t0 = time.perf_counter()
+        pairs = [(q, h.get("content", "") or "") for q, hits in zip(queries, hit_lists) for h in hits]
+        misses_before = self.misses
+        scores = self.score(pairs) if pairs else []
+
+        out: List[List[Dict[str, Any]]] = []
+        pos = 0
+        for hits in hit_lists:
+            scored = []
+            for h in hits:
+                scored.append(dict(h, rerank_score=scores[pos]))
+                pos += 1
+            scored.sort(key=lambda h: h["rerank_score"], reverse=True)
+            out.append(scored[:top_k])
+
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            t = self._timings.setdefault(path, RerankTiming())
+            t.calls += 1
+            t.pairs += len(pairs)
+            t.scored += self.misses - misses_before
+            t.seconds += elapsed
+        return out
+
+    def rerank(
+        self, query: str, hits: List[Dict[str, Any]], top_k: int, path: str = "default"
+    ) -> List[Dict[str, Any]]:
+        return self.rerank_batch([query], [hits], top_k, path=path)[0]
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def timings(self) -> Dict[str, RerankTiming]:
+        """Added latency per path so far."""
+        with self._lock:
+            return {k: RerankTiming(**vars(v)) for k, v in self._timings.items()}
+
+
+def _load_reranker() -> CrossEncoderReranker:
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    if RERANK_THREADS > 0:
+        torch.set_num_threads(RERANK_THREADS)
+    model = CrossEncoder(RERANK_MODEL, device="cpu")
+    return CrossEncoderReranker(model, RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, cache_size=RERANK_CACHE_SIZE)
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Shared cross-encoder, loaded on first re-rank."""
+    return registry.get("reranker", _load_reranker)
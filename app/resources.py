@@ -0,0 +1,145 @@
+# app/resources.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from settings import (
+    EMBED_BACKEND,
+    EMBED_MODEL,
+    EMBED_ONNX_DIR,
+    EMBED_ONNX_MIN_COSINE,
+    EMBED_THREADS,
+    SUPABASE_SERVICE_KEY,
+    SUPABASE_URL,
+    require_env,
+)
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from supabase import Client
+
+
+class ResourceRegistry:
+    """
+    Lazily builds named process-wide resources exactly once.
+    Framework-independent (works in Streamlit, scripts and worker threads).
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.load_seconds: Dict[str, float] = {}
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        item = self._items.get(name)
+        if item is not None:
+            return item
+
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+
+        # Per-resource lock: a slow model load doesn't block creating the DB client.
+        with lock:
+            if name not in self._items:
+                t0 = time.perf_counter()
+                self._items[name] = factory()
+                self.load_seconds[name] = time.perf_counter() - t0
+            return self._items[name]
+
+    def loaded(self, name: str) -> bool:
+        return name in self._items
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """Drop one (or every) resource so the next get() rebuilds it."""
+        with self._lock:
+            names = [name] if name else list(self._items)
+            for n in names:
+                self._items.pop(n, None)
+                self.load_seconds.pop(n, None)
+
+    def metrics(self) -> Dict[str, float]:
+        """Seconds spent building each loaded resource."""
+        return dict(self.load_seconds)
+
+
+registry = ResourceRegistry()
+
+
+def _create_supabase() -> "Client":
+    from supabase import create_client
+
+    require_env("SUPABASE_URL", SUPABASE_URL)
+    require_env("SUPABASE_SERVICE_KEY", SUPABASE_SERVICE_KEY)
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+
+def _load_embedder() -> "SentenceTransformer":
+    if EMBED_BACKEND in ("onnx", "onnx-int8"):
+        try:
+            from embed_onnx import load_onnx_embedder
+
+            return load_onnx_embedder(
+                EMBED_ONNX_DIR,
+                EMBED_MODEL,
+                quantize=EMBED_BACKEND == "onnx-int8",
+                threads=EMBED_THREADS,
+                min_cos=EMBED_ONNX_MIN_COSINE,
+            )
+        except Exception as e:
+            logging.warning("ONNX embedder unavailable (%s); falling back to SentenceTransformer", e)
+
+    from sentence_transformers import SentenceTransformer
+
+    # 384-dim output for all-MiniLM-L6-v2
+    return SentenceTransformer(EMBED_MODEL)
+
+
+def get_supabase() -> "Client":
+    """Shared Supabase client (service key must stay server-side)."""
+    return registry.get("supabase", _create_supabase)
+
+
+def get_embedder() -> "SentenceTransformer":
+    """Shared embedding model, loaded once per process."""
+    return registry.get("embedder", _load_embedder)
+
+
+def embedder_cache_name() -> str:
+    """
+    Embedding cache namespace for the active embedder. int8 vectors differ
+    slightly from the float model's, so they are cached under their own name.
+    Only the onnx-int8 backend can produce them, so other backends answer
+    without loading the model.
+    """
+    if EMBED_BACKEND != "onnx-int8":
+        return EMBED_MODEL
+    embedder = get_embedder()
+    if getattr(embedder, "meta", {}).get("quantized"):
+        return f"{EMBED_MODEL}#int8"
+    return EMBED_MODEL
+
+
+def embed_token_counter() -> Tuple[Callable[[str], int], int]:
+    """
+    (count, limit) for the active embedder: count(text) is its wordpiece token count
+    and limit the most tokens a text can have before the model truncates it.
+    """
+    embedder = get_embedder()
+    if hasattr(embedder, "count_tokens"):
+        count = embedder.count_tokens
+    else:
+        tokenizer = embedder.tokenizer
+
+        def count(text: str) -> int:
+            return len(tokenizer.tokenize(text))
+
+    # max_seq_length includes [CLS] and [SEP].
+    return count, int(embedder.max_seq_length) - 2
+
+
+def load_metrics() -> Dict[str, float]:
+    return registry.metrics()
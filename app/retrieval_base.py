@@ -0,0 +1,45 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# A single document id, a set of ids, or None for the whole collection.
+DocFilter = Union[str, Sequence[str], None]
+
+
+def doc_ids(document_id: DocFilter) -> Optional[List[str]]:
+    """Normalize a DocFilter to a sorted, de-duplicated id list (None = every document)."""
+    if document_id is None:
+        return None
+    if isinstance(document_id, str):
+        return [document_id]
+    return sorted({str(d) for d in document_id})
+
+
+def chunk_key(hit: Dict[str, Any]) -> Tuple[str, int]:
+    """Identity of a hit across backends: (doc_id, chunk_index)."""
+    return (str(hit.get("doc_id") or hit.get("document_id") or ""), int(hit.get("chunk_index", -1)))
+
+
+class RetrievalBackend(ABC):
+    """
+    Top-k chunk search over stored embeddings.
+    Hits are dicts with at least: content, pages, similarity.
+    `document_id` is a DocFilter; results over several documents are one merged top-k.
+    """
+
+    @abstractmethod
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """One hit list per query. Backends override this to avoid per-query round trips."""
+        return [self.search(q, top_k=top_k, document_id=document_id) for q in query_embeddings]
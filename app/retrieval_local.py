@@ -0,0 +1,437 @@
+# app/retrieval_local.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from retrieval_base import DocFilter, RetrievalBackend, doc_ids
+
+# Row v holds the ±1 signs encoded by byte value v (most significant bit first).
+_BYTE_SIGNS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32) * 2.0 - 1.0
+
+
+def quantize_int8(vecs: np.ndarray) -> tuple:
+    """Per-row symmetric int8 codes: vec ≈ codes * scale / 127 (scale = max |x| of the row)."""
+    scale = np.abs(vecs).max(axis=1).astype(np.float32)
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(vecs / scale[:, None] * 127.0), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def quantize_binary(vecs: np.ndarray) -> np.ndarray:
+    """Sign bits, packed 8 per byte (384 dims -> 48 bytes)."""
+    return np.packbits(vecs > 0, axis=-1)
+
+
+def binary_lut(q: np.ndarray) -> np.ndarray:
+    """
+    Flat lookup table for asymmetric scoring of a float query against sign bits:
+    entry (j * 256 + v) = dot(q[8j : 8j + 8], signs of byte value v).
+    Scoring a row is then one gather per code byte; it ranks far better than
+    Hamming distance at the same rescoring budget.
+    """
+    pad = (-len(q)) % 8
+    qp = np.concatenate([q, np.zeros(pad, dtype=np.float32)]) if pad else q
+    return (qp.reshape(-1, 8) @ _BYTE_SIGNS.T).ravel().astype(np.float32)
+
+
+class LocalVectorStore(RetrievalBackend):
+    """
+    In-process vector store over normalized float32 embeddings.
+
+    mode="flat": exact search (one matmul over the candidate rows).
+    mode="ivf":  k-means partitions; each query scans only the `nprobe` closest lists.
+                 Falls back to flat below `ivf_min_size` rows.
+
+    quantize="int8" | "binary" (flat mode) keeps compact codes next to the float
+    vectors (384 or 48 bytes per row instead of 1536): the coarse pass scores the
+    codes, then the best `rescore_factor * top_k` candidates are rescored exactly.
+    keep_float=False drops the float vectors; rescoring then uses int8 codes
+    (binary mode keeps int8 codes for that, 432 bytes per row).
+
+    Persisted under `directory` as vectors.npy (+ codes_int8.npy, codes_scale.npy,
+    codes_bits.npy when quantized) + rows.jsonl when `directory` is set.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        dim: int = 384,
+        mode: str = "flat",
+        nprobe: int = 8,
+        ivf_min_size: int = 10_000,
+        quantize: str = "none",
+        keep_float: bool = True,
+        rescore_factor: int = 16,
+    ):
+        if mode not in ("flat", "ivf"):
+            raise ValueError(f"Unknown index mode: {mode!r} (expected 'flat' or 'ivf')")
+        if quantize not in ("none", "int8", "binary"):
+            raise ValueError(f"Unknown quantization: {quantize!r} (expected 'none', 'int8' or 'binary')")
+        if quantize != "none" and mode != "flat":
+            raise ValueError("Quantized storage is only supported with mode='flat'")
+        if quantize == "none" and not keep_float:
+            raise ValueError("keep_float=False needs quantize='int8' or 'binary'")
+        self.directory = directory
+        self.dim = dim
+        self.mode = mode
+        self.nprobe = nprobe
+        self.ivf_min_size = ivf_min_size
+        self.quantize = quantize
+        self.keep_float = keep_float
+        self.rescore_factor = rescore_factor
+
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._rows: List[Dict[str, Any]] = []
+        self._by_doc: Dict[str, List[int]] = {}
+        self._doc_idx: Dict[str, np.ndarray] = {}
+
+        # Quantized codes (empty unless needed by `quantize` / `keep_float`)
+        self._int8 = np.zeros((0, dim), dtype=np.int8)
+        self._scale = np.zeros(0, dtype=np.float32)
+        self._bits = np.zeros((0, (dim + 7) // 8), dtype=np.uint8)
+
+        # IVF state
+        self._centroids: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+
+        if directory:
+            self.load()
+
+    # ---- contents ----
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def has_document(self, document_id: str) -> bool:
+        return document_id in self._by_doc
+
+    @property
+    def _uses_int8(self) -> bool:
+        return self.quantize == "int8" or (self.quantize == "binary" and not self.keep_float)
+
+    def memory_bytes(self) -> int:
+        """Bytes held for vectors and codes (excludes row metadata)."""
+        return int(self._vectors.nbytes + self._int8.nbytes + self._scale.nbytes + self._bits.nbytes)
+
+    def _add_vectors(self, vecs: np.ndarray) -> None:
+        if self.keep_float:
+            self._vectors = np.vstack([self._vectors, vecs])
+        if self._uses_int8:
+            codes, scale = quantize_int8(vecs)
+            self._int8 = np.vstack([self._int8, codes])
+            self._scale = np.concatenate([self._scale, scale])
+        if self.quantize == "binary":
+            self._bits = np.vstack([self._bits, quantize_binary(vecs)])
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Add chunk rows shaped like the `chunks` table inserts:
+          document_id, chunk_index, content, metadata.pages, embedding
+        """
+        if not rows:
+            return
+        vecs = np.asarray([r["embedding"] for r in rows], dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            start = len(self._rows)
+            for i, r in enumerate(rows):
+                doc_id = str(r.get("document_id") or r.get("doc_id") or "")
+                pages = r.get("pages")
+                if pages is None:
+                    pages = (r.get("metadata") or {}).get("pages") or []
+                self._rows.append(
+                    {
+                        "id": r.get("id") or f"{doc_id}:{r.get('chunk_index', start + i)}",
+                        "doc_id": doc_id,
+                        "chunk_index": int(r.get("chunk_index", start + i)),
+                        "content": r.get("content", ""),
+                        "pages": [int(p) for p in pages],
+                    }
+                )
+                self._by_doc.setdefault(doc_id, []).append(start + i)
+                self._doc_idx.pop(doc_id, None)
+            self._add_vectors(vecs)
+            if self._centroids is not None:
+                # Route new rows to existing partitions; call build_ivf() to rebalance.
+                new_assign = np.argmax(vecs @ self._centroids.T, axis=1)
+                self._assign = np.concatenate([self._assign, new_assign])
+
+    def remove_document(self, document_id: str) -> None:
+        with self._lock:
+            if document_id not in self._by_doc:
+                return
+            keep = np.array([r["doc_id"] != document_id for r in self._rows], dtype=bool)
+            if self.keep_float:
+                self._vectors = self._vectors[keep]
+            if self._uses_int8:
+                self._int8 = self._int8[keep]
+                self._scale = self._scale[keep]
+            if self.quantize == "binary":
+                self._bits = self._bits[keep]
+            self._rows = [r for r, k in zip(self._rows, keep) if k]
+            if self._assign is not None:
+                self._assign = self._assign[keep]
+            self._reindex_docs()
+
+    def _reindex_docs(self) -> None:
+        self._by_doc = {}
+        self._doc_idx = {}
+        for i, r in enumerate(self._rows):
+            self._by_doc.setdefault(r["doc_id"], []).append(i)
+
+    def _doc_rows(self, document_id: str) -> np.ndarray:
+        idx = self._doc_idx.get(document_id)
+        if idx is None:
+            idx = np.asarray(self._by_doc.get(document_id, []), dtype=np.int64)
+            self._doc_idx[document_id] = idx
+        return idx
+
+    def _filter_rows(self, ids: List[str]) -> np.ndarray:
+        """Sorted row indices of every listed document (one merged candidate set)."""
+        if len(ids) == 1:
+            return self._doc_rows(ids[0])
+        parts = [self._doc_rows(d) for d in ids]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    # ---- IVF ----
+    def build_ivf(self, nlist: Optional[int] = None, iters: int = 10, seed: int = 0) -> None:
+        """Spherical k-means over the stored vectors (nlist defaults to ~sqrt(N))."""
+        with self._lock:
+            n = len(self._rows)
+            if n == 0:
+                self._centroids = self._assign = None
+                return
+            nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+            rng = np.random.default_rng(seed)
+            centroids = self._vectors[rng.choice(n, size=nlist, replace=False)].copy()
+            for _ in range(iters):
+                assign = np.argmax(self._vectors @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, self._vectors)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                empty = norms[:, 0] == 0
+                sums[empty] = centroids[empty]
+                norms[empty] = 1.0
+                centroids = sums / norms
+            self._centroids = centroids.astype(np.float32)
+            self._assign = np.argmax(self._vectors @ self._centroids.T, axis=1)
+
+    def _ivf_candidates(self, q: np.ndarray) -> np.ndarray:
+        if self._centroids is None or self._assign is None or len(self._assign) != len(self._rows):
+            self.build_ivf()
+        nprobe = min(self.nprobe, len(self._centroids))
+        lists = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self._assign, lists))
+
+    # ---- search ----
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[Dict[str, Any]]:
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not self._rows or top_k <= 0:
+                return []
+
+            cand: Optional[np.ndarray] = None
+            if self.mode == "ivf" and len(self._rows) >= self.ivf_min_size:
+                cand = self._ivf_candidates(q)
+            ids = doc_ids(document_id)
+            if ids is not None:
+                doc_rows = self._filter_rows(ids)
+                cand = doc_rows if cand is None else np.intersect1d(cand, doc_rows, assume_unique=True)
+                if len(cand) < top_k and self.mode == "ivf":
+                    # Partitions missed these documents' rows: scan them exactly.
+                    cand = doc_rows
+
+            if self.quantize != "none":
+                return self._search_quantized(q, cand, top_k)
+
+            if cand is None:
+                sims = self._vectors @ q
+                idx = np.arange(len(sims))
+            else:
+                if len(cand) == 0:
+                    return []
+                sims = self._vectors[cand] @ q
+                idx = cand
+
+            return self._top_hits(sims, idx, top_k)
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Flat mode scores every query in one (queries x rows) matmul."""
+        Q = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if (self.mode == "ivf" and len(self._rows) >= self.ivf_min_size) or self.quantize != "none":
+            # IVF candidate sets / rescoring candidates differ per query.
+            return [self.search(q, top_k=top_k, document_id=document_id) for q in Q]
+
+        with self._lock:
+            if not self._rows or top_k <= 0 or len(Q) == 0:
+                return [[] for _ in range(len(Q))]
+            ids = doc_ids(document_id)
+            if ids is None:
+                idx = np.arange(len(self._rows))
+                sims = Q @ self._vectors.T
+            else:
+                idx = self._filter_rows(ids)
+                if len(idx) == 0:
+                    return [[] for _ in range(len(Q))]
+                sims = Q @ self._vectors[idx].T
+            return [self._top_hits(row_sims, idx, top_k) for row_sims in sims]
+
+    # ---- quantized search ----
+    def _int8_scores(self, q: np.ndarray, rows: Any) -> np.ndarray:
+        return (self._int8[rows].astype(np.float32) @ q) * (self._scale[rows] / 127.0)
+
+    def _coarse_scores(self, q: np.ndarray, cand: Optional[np.ndarray], block: int = 2048) -> np.ndarray:
+        """
+        Approximate similarities from the codes. Small blocks keep the upcast
+        codes in cache, which keeps the int8 pass about as fast as a float matmul.
+        """
+        n = len(self._rows) if cand is None else len(cand)
+        out = np.empty(n, dtype=np.float32)
+        if self.quantize == "binary":
+            lut = binary_lut(q)
+            offsets = np.arange(self._bits.shape[1], dtype=np.intp) * 256
+        for start in range(0, n, block):
+            rows = slice(start, start + block) if cand is None else cand[start : start + block]
+            if self.quantize == "binary":
+                out[start : start + block] = np.take(lut, self._bits[rows] + offsets).sum(axis=1)
+            else:
+                out[start : start + block] = self._int8_scores(q, rows)
+        return out
+
+    def _search_quantized(self, q: np.ndarray, cand: Optional[np.ndarray], top_k: int) -> List[Dict[str, Any]]:
+        if cand is not None and len(cand) == 0:
+            return []
+        coarse = self._coarse_scores(q, cand)
+        idx = np.arange(len(coarse)) if cand is None else cand
+        if self.quantize == "int8" and not self.keep_float:
+            # int8 codes are both the coarse and the final scores.
+            return self._top_hits(coarse, idx, top_k)
+
+        m = min(len(coarse), max(top_k, top_k * self.rescore_factor))
+        rows = idx[np.argpartition(-coarse, m - 1)[:m]]
+        exact = self._vectors[rows] @ q if self.keep_float else self._int8_scores(q, rows)
+        return self._top_hits(exact.astype(np.float32), rows, top_k)
+
+    def _top_hits(self, sims: np.ndarray, idx: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        k = min(top_k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+
+        hits: List[Dict[str, Any]] = []
+        for t in top:
+            row = dict(self._rows[int(idx[t])])
+            row["metadata"] = {"pages": row["pages"]}
+            row["similarity"] = float(sims[t])
+            hits.append(row)
+        return hits
+
+    # ---- persistence ----
+    def save(self) -> None:
+        if not self.directory:
+            return
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            rows_path = os.path.join(self.directory, "rows.jsonl")
+            # Float vectors, or (keep_float=False) the codes. Binary codes are recomputed
+            # from floats on load, but not from int8 codes: rounding to 0 loses the sign.
+            if self.keep_float:
+                arrays = {"vectors.npy": self._vectors}
+            else:
+                arrays = {"codes_int8.npy": self._int8, "codes_scale.npy": self._scale}
+                if self.quantize == "binary":
+                    arrays["codes_bits.npy"] = self._bits
+            for name, arr in arrays.items():
+                np.save(os.path.join(self.directory, name + ".tmp.npy"), arr)
+            with open(rows_path + ".tmp", "w", encoding="utf-8") as f:
+                for r in self._rows:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            for name in arrays:
+                path = os.path.join(self.directory, name)
+                os.replace(path + ".tmp.npy", path)
+            os.replace(rows_path + ".tmp", rows_path)
+            # Don't leave the other layout behind: load() would prefer stale vectors.
+            if self.keep_float:
+                stale: tuple = ("codes_int8.npy", "codes_scale.npy", "codes_bits.npy")
+            else:
+                stale = ("vectors.npy",) if self.quantize == "binary" else ("vectors.npy", "codes_bits.npy")
+            for name in stale:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def load(self) -> None:
+        vec_path = os.path.join(self.directory or "", "vectors.npy")
+        int8_path = os.path.join(self.directory or "", "codes_int8.npy")
+        scale_path = os.path.join(self.directory or "", "codes_scale.npy")
+        bits_path = os.path.join(self.directory or "", "codes_bits.npy")
+        rows_path = os.path.join(self.directory or "", "rows.jsonl")
+        has_float = os.path.exists(vec_path)
+        if not (os.path.exists(rows_path) and (has_float or os.path.exists(int8_path))):
+            return
+        with self._lock:
+            if has_float:
+                vectors = np.load(vec_path).astype(np.float32, copy=False)
+                self._vectors = vectors if self.keep_float else np.zeros((0, self.dim), dtype=np.float32)
+                if self._uses_int8:
+                    self._int8, self._scale = quantize_int8(vectors)
+            else:
+                if self.keep_float or self.quantize == "none":
+                    logging.warning("%s holds int8 codes only; searching without float vectors", self.directory)
+                    self.keep_float = False
+                    self.quantize = "int8" if self.quantize == "none" else self.quantize
+                self._int8 = np.load(int8_path)
+                self._scale = np.load(scale_path).astype(np.float32, copy=False)
+            if self.quantize == "binary":
+                if has_float:
+                    self._bits = quantize_binary(vectors)
+                elif os.path.exists(bits_path):
+                    self._bits = np.load(bits_path)
+                else:
+                    self._bits = quantize_binary(self._int8.astype(np.float32))
+            with open(rows_path, encoding="utf-8") as f:
+                self._rows = [json.loads(line) for line in f if line.strip()]
+            self._centroids = self._assign = None
+            self._reindex_docs()
+
+
+def _create_local_store() -> LocalVectorStore:
+    from settings import (
+        LOCAL_INDEX_MODE,
+        LOCAL_IVF_NPROBE,
+        LOCAL_KEEP_FLOAT,
+        LOCAL_QUANTIZE,
+        LOCAL_STORE_DIR,
+        QUANT_RESCORE_FACTOR,
+    )
+
+    return LocalVectorStore(
+        LOCAL_STORE_DIR,
+        mode=LOCAL_INDEX_MODE,
+        nprobe=LOCAL_IVF_NPROBE,
+        quantize=LOCAL_QUANTIZE,
+        keep_float=LOCAL_KEEP_FLOAT,
+        rescore_factor=QUANT_RESCORE_FACTOR,
+    )
+
+
+def get_local_store() -> LocalVectorStore:
+    """Process-wide local store, loaded from LOCAL_STORE_DIR on first use."""
+    from resources import registry
+
+    return registry.get("local_store", _create_local_store)
@@ -0,0 +1,72 @@
+# app/retrieval_plan.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from context_pack import rank_score
+from retrieval_base import chunk_key
+
+
+@dataclass
+class RetrievalPlan:
+    section_hits: List[List[dict]]
+    assigned: int = 0  # (section, chunk) assignments in the plan
+    candidates: int = 0  # distinct chunks retrieved across all sections
+    capped: int = 0  # assignments refused because the chunk hit its reuse cap
+    reuse: Dict[Tuple[str, int], int] = field(default_factory=dict)
+
+
+def plan_sections(candidates: List[List[dict]], top_k: int, max_reuse: int = 2, min_hits: int = 2) -> RetrievalPlan:
+    """
+    Assign retrieved chunks to outline sections for the whole handbook at once.
+
+    `candidates` holds each section's over-fetched hits. All (section, chunk)
+    pairs are taken best score first; a chunk goes to a section while the
+    section has fewer than `top_k` chunks and the chunk is used by fewer than
+    `max_reuse` sections, so a chunk lands in the sections it fits best instead
+    of every neighbouring heading that retrieved it.
+
+    A section left with fewer than `min_hits` chunks (its matches all went
+    elsewhere) tops up from its own best candidates, ignoring the cap.
+    Each section's hits keep their best-first order.
+    """
+    pairs: List[Tuple[float, int, int]] = []  # (score, section, position in its list)
+    for s, hits in enumerate(candidates):
+        for pos, hit in enumerate(hits):
+            pairs.append((rank_score(hit), s, pos))
+    # Ties go to the earlier section, then the better-ranked hit.
+    pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+
+    plan = RetrievalPlan(section_hits=[[] for _ in candidates])
+    chosen: List[set] = [set() for _ in candidates]
+    for _, s, pos in pairs:
+        hit = candidates[s][pos]
+        key = chunk_key(hit)
+        if len(chosen[s]) >= top_k or key in chosen[s]:
+            continue
+        if plan.reuse.get(key, 0) >= max_reuse:
+            plan.capped += 1
+            continue
+        chosen[s].add(key)
+        plan.reuse[key] = plan.reuse.get(key, 0) + 1
+
+    for s, hits in enumerate(candidates):
+        for hit in hits:
+            if len(chosen[s]) >= min(min_hits, top_k):
+                break
+            key = chunk_key(hit)
+            if key not in chosen[s]:
+                chosen[s].add(key)
+                plan.reuse[key] = plan.reuse.get(key, 0) + 1
+
+        seen = set()
+        for hit in hits:
+            key = chunk_key(hit)
+            if key in chosen[s] and key not in seen:
+                seen.add(key)
+                plan.section_hits[s].append(hit)
+
+    plan.assigned = sum(len(h) for h in plan.section_hits)
+    plan.candidates = len({chunk_key(h) for hits in candidates for h in hits})
+    return plan
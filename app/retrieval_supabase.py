@@ -0,0 +1,173 @@
+# app/retrieval_supabase.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from retrieval_base import DocFilter, RetrievalBackend, doc_ids
+from resources import get_supabase
+
+
+class SupabaseBackend(RetrievalBackend):
+    """
+    pgvector search through the Supabase RPCs:
+      match_chunks(query_embedding vector, match_count int, filter_doc_id uuid)
+      match_chunks_batch(query_embeddings vector[], match_count int, filter_doc_id uuid)
+      match_chunks_v2(..., ef_search int, probes int)  when ef_search > 0 (sql/005)
+      match_chunks_multi(query_embeddings vector[], match_count int, filter_doc_ids uuid[])
+        for several documents or the whole collection (sql/006)
+      match_chunks_binary(..., rescore_factor int)  for every search when quantize="binary" (sql/007)
+    """
+
+    def __init__(self, ef_search: int = 0, probes: int = 10, quantize: str = "none", rescore_factor: int = 16):
+        if quantize not in ("none", "binary"):
+            raise ValueError(f"Unknown quantization: {quantize!r} (expected 'none' or 'binary')")
+        self.ef_search = ef_search
+        self.probes = probes
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[Dict[str, Any]]:
+        ids = doc_ids(document_id)
+        if ids is None or len(ids) > 1 or self.quantize == "binary":
+            return self._search_multi([query_embedding], top_k, ids)[0]
+        if not ids:
+            return []
+
+        sb = get_supabase()
+        if self.ef_search > 0:
+            response = sb.rpc(
+                "match_chunks_v2",
+                {
+                    "query_embedding": query_embedding,
+                    "match_count": int(top_k),
+                    "filter_doc_id": ids[0],
+                    "ef_search": self.ef_search,
+                    "probes": self.probes,
+                },
+            ).execute()
+        else:
+            response = sb.rpc(
+                "match_chunks",
+                {
+                    "query_embedding": query_embedding,
+                    "match_count": int(top_k),
+                    "filter_doc_id": ids[0],
+                },
+            ).execute()
+
+        data = response.data or []
+        if not isinstance(data, list):
+            logging.warning("match_chunks returned non-list data: %r", type(data))
+            return []
+        return data
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 6,
+        document_id: DocFilter = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """All queries in one RPC; rows come back tagged with query_index."""
+        if not query_embeddings:
+            return []
+        ids = doc_ids(document_id)
+        if ids is None or len(ids) > 1 or self.quantize == "binary":
+            return self._search_multi(query_embeddings, top_k, ids)
+        if not ids:
+            return [[] for _ in query_embeddings]
+
+        sb = get_supabase()
+        response = sb.rpc(
+            "match_chunks_batch",
+            {
+                "query_embeddings": _vector_literals(query_embeddings),
+                "match_count": int(top_k),
+                "filter_doc_id": ids[0],
+            },
+        ).execute()
+        return _group_by_query(response.data, len(query_embeddings), "match_chunks_batch")
+
+    def _search_multi(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        ids: Optional[List[str]],
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Merged top-k over a document set (None = whole collection), one RPC for all
+        queries. Also serves every search on the binary-quantized index.
+        """
+        if ids == []:
+            return [[] for _ in query_embeddings]
+        rpc = "match_chunks_binary" if self.quantize == "binary" else "match_chunks_multi"
+        params: Dict[str, Any] = {
+            "query_embeddings": _vector_literals(query_embeddings),
+            "match_count": int(top_k),
+            "filter_doc_ids": ids,
+        }
+        if self.ef_search > 0:
+            params["ef_search"] = self.ef_search
+        if self.quantize == "binary":
+            params["rescore_factor"] = self.rescore_factor
+        response = get_supabase().rpc(rpc, params).execute()
+        return _group_by_query(response.data, len(query_embeddings), rpc)
+
+
+def stored_document_ids(page_size: int = 1000) -> List[str]:
+    """Ids of every document in the collection."""
+    sb = get_supabase()
+    out: List[str] = []
+    start = 0
+    while True:
+        data = sb.table("documents").select("id").range(start, start + page_size - 1).execute().data or []
+        out.extend(str(row["id"]) for row in data)
+        if len(data) < page_size:
+            return out
+        start += page_size
+
+
+def stored_chunk_rows(document_id: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """One document's chunk text (doc_id, chunk_index, content, pages), e.g. to rebuild its BM25 rows."""
+    sb = get_supabase()
+    out: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        data = (
+            sb.table("chunks")
+            .select("doc_id, chunk_index, content, pages")
+            .eq("doc_id", document_id)
+            .order("chunk_index")
+            .range(start, start + page_size - 1)
+            .execute()
+            .data
+            or []
+        )
+        out.extend(data)
+        if len(data) < page_size:
+            return out
+        start += page_size
+
+
+def _vector_literals(query_embeddings: List[List[float]]) -> List[str]:
+    # pgvector text literals, so PostgREST can cast the array to vector[]
+    return ["[" + ",".join(map(str, q)) + "]" for q in query_embeddings]
+
+
+def _group_by_query(data: Any, n: int, rpc: str) -> List[List[Dict[str, Any]]]:
+    data = data or []
+    if not isinstance(data, list):
+        logging.warning("%s returned non-list data: %r", rpc, type(data))
+        data = []
+
+    out: List[List[Dict[str, Any]]] = [[] for _ in range(n)]
+    for row in data:
+        qi = int(row.get("query_index", -1))
+        if 0 <= qi < len(out):
+            out[qi].append(row)
+    return out
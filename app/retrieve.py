@@ -2,46 +2,135 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Optional
-
-import streamlit as st
-from sentence_transformers import SentenceTransformer
-from supabase import Client, create_client
-
-from settings import SUPABASE_SERVICE_KEY, SUPABASE_URL, require_env
-
-
-@st.cache_resource
-def get_supabase() -> Client:
-    """Create and cache a Supabase client (service key must stay server-side)."""
-    require_env("SUPABASE_URL", SUPABASE_URL)
-    require_env("SUPABASE_SERVICE_KEY", SUPABASE_SERVICE_KEY)
-    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
-
-@st.cache_resource
-def get_embedder() -> SentenceTransformer:
-    """Load and cache embedding model (384-dim)."""
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from embed_cache import embed_text, embed_texts
+from lexical import BM25Index, get_lexical_index, rrf_fuse
+from resources import registry
+from retrieval_base import DocFilter, RetrievalBackend, doc_ids
+from retrieval_supabase import SupabaseBackend, stored_chunk_rows, stored_document_ids
+from settings import (
+    HYBRID_RRF_K,
+    HYBRID_SEARCH,
+    PG_EF_SEARCH,
+    PG_IVF_PROBES,
+    PG_QUANTIZE,
+    QUANT_RESCORE_FACTOR,
+    RERANK_FETCH_FACTOR,
+    RERANK_PATHS,
+    RETRIEVAL_BACKEND,
+)
+
+
+def get_retrieval_backend() -> RetrievalBackend:
+    """Backend selected by RETRIEVAL_BACKEND ("supabase" or "local")."""
+    if RETRIEVAL_BACKEND == "local":
+        from retrieval_local import get_local_store
+
+        return get_local_store()
+    return registry.get(
+        "supabase_backend",
+        lambda: SupabaseBackend(
+            PG_EF_SEARCH, PG_IVF_PROBES, quantize=PG_QUANTIZE, rescore_factor=QUANT_RESCORE_FACTOR
+        ),
+    )
+
+
+_backfill_lock = threading.Lock()
+_backfilled: Set[str] = set()  # documents already checked against this host's BM25 index
+
+
+def _backfill_lexical(index: BM25Index, document_id: DocFilter) -> None:
+    """
+    Add BM25 rows for Supabase documents this host's index doesn't have yet
+    (indexed before hybrid search, or on another app host), from their stored chunks.
+    """
+    with _backfill_lock:
+        ids = doc_ids(document_id)
+        ids = stored_document_ids() if ids is None else ids
+        present = index.document_ids()
+        missing = [d for d in ids if d not in present and d not in _backfilled]
+        added = False
+        for d in missing:
+            rows = stored_chunk_rows(d)
+            if rows:
+                index.add(rows)
+                added = True
+            _backfilled.add(d)
+        if added:
+            index.save()
+
+
+def _hybrid_index(
+    hybrid: Optional[bool],
+    lexical: Optional[BM25Index],
+    backend: RetrievalBackend,
+    document_id: DocFilter,
+) -> Optional[BM25Index]:
+    """The BM25 index to fuse with, or None for vector-only search."""
+    if not (HYBRID_SEARCH if hybrid is None else hybrid):
+        return None
+    if lexical is None:
+        lexical = get_lexical_index()
+        if isinstance(backend, SupabaseBackend):
+            try:
+                _backfill_lexical(lexical, document_id)
+            except Exception:
+                logging.exception("BM25 backfill failed; missing documents get vector-only hits")
+    return lexical if len(lexical) else None
+
+
+def rerank_enabled(path: Optional[str]) -> bool:
+    """Whether retrieval on this path ("chat", "handbook") goes through the cross-encoder."""
+    return path is not None and path in RERANK_PATHS
+
+
+def _candidate_k(top_k: int, rerank: bool) -> int:
+    """First-stage hits to fetch: over-fetch when the cross-encoder picks the final top_k."""
+    return int(top_k) * (max(RERANK_FETCH_FACTOR, 1) if rerank else 1)
+
+
+def _rerank(
+    queries: List[str], hit_lists: List[List[Dict[str, Any]]], top_k: int, path: Optional[str]
+) -> List[List[Dict[str, Any]]]:
+    """
+    Cross-encoder stage. It is optional, so if it fails (model download, OOM)
+    the first-stage hits are kept, cut to top_k, instead of failing retrieval.
+    """
+    try:
+        from rerank import get_reranker
 
-def embed_text(text: str) -> List[float]:
-    """Embed a single string into a normalized vector."""
-    model = get_embedder()
-    vec = model.encode([text], normalize_embeddings=True)[0]
-    return vec.tolist()
+        return get_reranker().rerank_batch(queries, hit_lists, top_k=top_k, path=path)
+    except Exception:
+        logging.exception("Re-ranking failed on path %r; using first-stage order", path)
+        return [hits[:top_k] for hits in hit_lists]
 
 
 def retrieve_context(
     query: str,
     top_k: int = 6,
-    document_id: Optional[str] = None,
+    document_id: DocFilter = None,
+    backend: Optional[RetrievalBackend] = None,
+    hybrid: Optional[bool] = None,
+    lexical: Optional[BM25Index] = None,
+    path: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Retrieve top-k relevant chunks for a query using a pgvector RPC (match_chunks).
+    Retrieve top-k relevant chunks for a query.
 
-    Expects an RPC defined in Supabase:
-      match_chunks(query_embedding vector, match_count int, filter_doc_id uuid)
+    Uses the configured RetrievalBackend (Supabase match_chunks RPC by default,
+    or the in-process LocalVectorStore) unless `backend` is given.
+
+    `document_id` may be one id, a list of ids (one merged top-k across them,
+    still a single lookup), or None to search the whole collection.
+
+    With hybrid search (HYBRID_SEARCH, or `hybrid`), 2*top_k vector hits and
+    2*top_k BM25 hits are merged by reciprocal rank fusion, so exact terms
+    (error codes, section numbers, acronyms) the embedding misses still surface.
+
+    If `path` is listed in RERANK_PATHS, RERANK_FETCH_FACTOR*top_k candidates are
+    fetched and re-ordered by the cross-encoder (timed under that path).
 
     Returns:
       List of rows (dicts). Each row should include at least:
@@ -52,27 +141,69 @@ def retrieve_context(
     if not query or not query.strip():
         return []
 
-    sb = get_supabase()
-
     try:
         query_embedding = embed_text(query)
+        backend = backend or get_retrieval_backend()
+        rerank = rerank_enabled(path)
+        k = _candidate_k(top_k, rerank)
+
+        lexical = _hybrid_index(hybrid, lexical, backend, document_id)
+        if lexical is None:
+            hits = backend.search(query_embedding, top_k=k, document_id=document_id)
+        else:
+            vector_hits = backend.search(query_embedding, top_k=2 * k, document_id=document_id)
+            lexical_hits = lexical.search(query, top_k=2 * k, document_id=document_id)
+            hits = rrf_fuse([vector_hits, lexical_hits], top_k=k, k=HYBRID_RRF_K)
+
+        if rerank:
+            hits = _rerank([query], [hits], int(top_k), path)[0]
+        return hits
 
-        response = sb.rpc(
-            "match_chunks",
-            {
-                "query_embedding": query_embedding,
-                "match_count": int(top_k),
-                "filter_doc": document_id,
-            },
-        ).execute()
+    except Exception:
+        logging.exception("Error during retrieval")
+        return []
 
-        data = response.data or []
-        if not isinstance(data, list):
-            logging.warning("match_chunks returned non-list data: %r", type(data))
-            return []
 
-        return data
+def retrieve_context_batch(
+    queries: List[str],
+    top_k: int = 6,
+    document_id: DocFilter = None,
+    backend: Optional[RetrievalBackend] = None,
+    hybrid: Optional[bool] = None,
+    lexical: Optional[BM25Index] = None,
+    path: Optional[str] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Like retrieve_context, for many queries at once: one encode call, one
+    backend lookup (single RPC / single matmul) and one cross-encoder batch.
+    Returns one hit list per query.
+    """
+    out: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    live = [i for i, q in enumerate(queries) if q and q.strip()]
+    if not live:
+        return out
 
+    try:
+        texts = [queries[i] for i in live]
+        embeddings = embed_texts(texts)
+        backend = backend or get_retrieval_backend()
+        rerank = rerank_enabled(path)
+        k = _candidate_k(top_k, rerank)
+
+        lexical = _hybrid_index(hybrid, lexical, backend, document_id)
+        if lexical is None:
+            results = backend.search_batch(embeddings, top_k=k, document_id=document_id)
+        else:
+            vector_results = backend.search_batch(embeddings, top_k=2 * k, document_id=document_id)
+            lexical_results = lexical.search_batch(texts, top_k=2 * k, document_id=document_id)
+            results = [
+                rrf_fuse([v, l], top_k=k, k=HYBRID_RRF_K) for v, l in zip(vector_results, lexical_results)
+            ]
+
+        if rerank:
+            results = _rerank(texts, results, int(top_k), path)
+        for i, hits in zip(live, results):
+            out[i] = hits
     except Exception:
-        logging.exception("Error during retrieval")
-        return []
+        logging.exception("Error during batch retrieval")
+    return out
@@ -1,8 +1,12 @@
 from pathlib import Path
 import sys
 
-from app.ingest import ingest_pdf_to_supabase
-from app.retrieve import retrieve_context
+# Modules under app/ import each other by flat name (as under `streamlit run app/main.py`).
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ingest import ingest_pdf_to_supabase  # noqa: E402
+from resources import load_metrics  # noqa: E402
+from retrieve import retrieve_context  # noqa: E402
 
 
 def main() -> None:
@@ -25,6 +29,9 @@ def main() -> None:
         content = (h.get("content") or "")[:120].replace("\n", " ")
         print(h.get("similarity"), meta, content)
 
+    for name, seconds in load_metrics().items():
+        print(f"loaded {name} in {seconds:.2f}s")
+
 
 if __name__ == "__main__":
     main()
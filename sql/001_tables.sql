@@ -3,6 +3,7 @@ create extension if not exists vector;
 create table if not exists documents (
   id uuid primary key default gen_random_uuid(),
   filename text not null,
+  content_sha256 text,
   created_at timestamptz default now()
 );
 
@@ -11,10 +12,22 @@ create table if not exists chunks (
   doc_id uuid references documents(id) on delete cascade,
   chunk_index int not null,
   content text not null,
+  content_hash text,
   pages int[] not null,
   embedding vector(384) not null,
   created_at timestamptz default now()
 );
 
+-- Content-addressed dedup (safe to re-run on existing tables)
+alter table documents add column if not exists content_sha256 text;
+alter table chunks add column if not exists content_hash text;
+
+-- Lookup only, not unique: dedup=False and replacements may store bytes another document has
+drop index if exists documents_content_sha256_idx;
+drop index if exists documents_filename_idx;
+create index if not exists documents_sha256_idx on documents(content_sha256);
 create index if not exists chunks_doc_id_idx on chunks(doc_id);
+create index if not exists chunks_doc_id_content_hash_idx on chunks(doc_id, content_hash);
+-- Conflict target for idempotent (retryable) bulk chunk uploads
+create unique index if not exists chunks_doc_chunk_hash_uidx on chunks(doc_id, chunk_index, content_hash);
 create index if not exists chunks_embedding_idx on chunks using ivfflat (embedding vector_cosine_ops);
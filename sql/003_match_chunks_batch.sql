@@ -0,0 +1,42 @@
+-- Top-k matches for many query embeddings in one call.
+-- Rows are tagged with the 0-based position of their query in query_embeddings.
+create or replace function match_chunks_batch(
+  query_embeddings vector(384)[],
+  match_count int,
+  filter_doc_id uuid
+)
+returns table (
+  query_index int,
+  id uuid,
+  doc_id uuid,
+  chunk_index int,
+  content text,
+  pages int[],
+  similarity float
+)
+language sql stable
+as $$
+  select
+    (q.ord - 1)::int as query_index,
+    m.id,
+    m.doc_id,
+    m.chunk_index,
+    m.content,
+    m.pages,
+    m.similarity
+  from unnest(query_embeddings) with ordinality as q(embedding, ord)
+  cross join lateral (
+    select
+      c.id,
+      c.doc_id,
+      c.chunk_index,
+      c.content,
+      c.pages,
+      1 - (c.embedding <=> q.embedding) as similarity
+    from chunks c
+    where c.doc_id = filter_doc_id
+    order by c.embedding <=> q.embedding
+    limit match_count
+  ) m
+  order by query_index, m.similarity desc;
+$$;
@@ -0,0 +1,26 @@
+-- Replace the default-parameter ivfflat index with HNSW.
+-- HNSW needs no training data (ivfflat built on an empty/small table gets poor lists)
+-- and keeps good recall as documents are added.
+--
+-- m:               graph degree (16 is a good default; 24-32 for higher recall, more memory)
+-- ef_construction: build-time candidate list (>= 2*m; higher = better graph, slower build)
+
+set maintenance_work_mem = '512MB';
+
+drop index if exists chunks_embedding_idx;
+
+create index if not exists chunks_embedding_hnsw_idx
+  on chunks using hnsw (embedding vector_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+-- Planner statistics for doc_id selectivity (index vs. exact per-document scan)
+analyze chunks;
+
+
+-- Staying on ivfflat instead? Build it after loading data, with lists ~ rows/1000
+-- (sqrt(rows) above ~1M rows), then analyze:
+--
+--   drop index if exists chunks_embedding_hnsw_idx;
+--   create index chunks_embedding_idx on chunks
+--     using ivfflat (embedding vector_cosine_ops) with (lists = 100);
+--   analyze chunks;
@@ -0,0 +1,86 @@
+-- Tuned top-k search with per-query recall knobs and per-document filtering.
+--
+-- ef_search: HNSW candidate list per query (>= match_count; higher = better recall)
+-- probes:    ivfflat lists scanned per query (if the ivfflat index is used)
+-- exact_below: documents with at most this many chunks are scanned exactly
+--   (a few thousand distance computations beat a filtered ANN walk and give
+--   perfect recall); larger documents use the ANN index with iterative scans
+--   (pgvector >= 0.8) so the doc_id filter doesn't starve the result set.
+create or replace function match_chunks_v2(
+  query_embedding vector(384),
+  match_count int,
+  filter_doc_id uuid default null,
+  ef_search int default 64,
+  probes int default 10,
+  exact_below int default 5000
+)
+returns table (
+  id uuid,
+  doc_id uuid,
+  chunk_index int,
+  content text,
+  pages int[],
+  similarity float
+)
+language plpgsql stable
+as $$
+declare
+  doc_rows bigint;
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  perform set_config('ivfflat.probes', probes::text, true);
+
+  if filter_doc_id is not null then
+    select count(*) into doc_rows from chunks c where c.doc_id = filter_doc_id;
+
+    if doc_rows <= exact_below then
+      return query
+        with doc as materialized (
+          select c.id, c.doc_id, c.chunk_index, c.content, c.pages,
+                 c.embedding <=> query_embedding as dist
+          from chunks c
+          where c.doc_id = filter_doc_id
+        )
+        select d.id, d.doc_id, d.chunk_index, d.content, d.pages, 1 - d.dist
+        from doc d
+        order by d.dist
+        limit match_count;
+      return;
+    end if;
+
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+    perform set_config('ivfflat.iterative_scan', 'relaxed_order', true);
+  end if;
+
+  return query
+    with ann as materialized (
+      select c.id, c.doc_id, c.chunk_index, c.content, c.pages,
+             c.embedding <=> query_embedding as dist
+      from chunks c
+      where filter_doc_id is null or c.doc_id = filter_doc_id
+      order by c.embedding <=> query_embedding
+      limit match_count
+    )
+    -- relaxed_order can return slightly out-of-order rows; re-sort the final k.
+    select a.id, a.doc_id, a.chunk_index, a.content, a.pages, 1 - a.dist
+    from ann a
+    order by a.dist;
+end;
+$$;
+
+
+-- Optional: a partial HNSW index for one very large, frequently queried document.
+-- The planner uses it for `where doc_id = <that id>`, giving unfiltered-ANN recall.
+create or replace function create_doc_hnsw_index(target_doc uuid)
+returns void
+language plpgsql
+as $$
+begin
+  execute format(
+    'create index if not exists %I on chunks using hnsw (embedding vector_cosine_ops) '
+    'with (m = 16, ef_construction = 64) where doc_id = %L',
+    'chunks_hnsw_doc_' || replace(target_doc::text, '-', '_'),
+    target_doc
+  );
+end;
+$$;
@@ -0,0 +1,71 @@
+-- Top-k over a set of documents (or the whole collection) for many queries in one call.
+--
+-- filter_doc_ids: documents to search; null searches every document.
+-- Results are one merged top-k per query across all listed documents, tagged
+-- with the 0-based query position like match_chunks_batch.
+-- Sets up to exact_below chunks are scanned exactly; larger sets use the ANN
+-- index with iterative scans (pgvector >= 0.8) so the filter can't starve k.
+create or replace function match_chunks_multi(
+  query_embeddings vector(384)[],
+  match_count int,
+  filter_doc_ids uuid[] default null,
+  ef_search int default 64,
+  exact_below int default 20000
+)
+returns table (
+  query_index int,
+  id uuid,
+  doc_id uuid,
+  chunk_index int,
+  content text,
+  pages int[],
+  similarity float
+)
+language plpgsql stable
+as $$
+declare
+  set_rows bigint;
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
+  if filter_doc_ids is not null then
+    select count(*) into set_rows from chunks c where c.doc_id = any(filter_doc_ids);
+
+    if set_rows <= exact_below then
+      return query
+        with docs as materialized (
+          select c.id, c.doc_id, c.chunk_index, c.content, c.pages, c.embedding
+          from chunks c
+          where c.doc_id = any(filter_doc_ids)
+        )
+        select (q.ord - 1)::int, m.id, m.doc_id, m.chunk_index, m.content, m.pages, m.similarity
+        from unnest(query_embeddings) with ordinality as q(embedding, ord)
+        cross join lateral (
+          select d.id, d.doc_id, d.chunk_index, d.content, d.pages,
+                 1 - (d.embedding <=> q.embedding) as similarity
+          from docs d
+          order by d.embedding <=> q.embedding
+          limit match_count
+        ) m
+        order by 1, m.similarity desc;
+      return;
+    end if;
+
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  end if;
+
+  return query
+    select (q.ord - 1)::int, m.id, m.doc_id, m.chunk_index, m.content, m.pages, m.similarity
+    from unnest(query_embeddings) with ordinality as q(embedding, ord)
+    cross join lateral (
+      select c.id, c.doc_id, c.chunk_index, c.content, c.pages,
+             1 - (c.embedding <=> q.embedding) as similarity
+      from chunks c
+      where filter_doc_ids is null or c.doc_id = any(filter_doc_ids)
+      order by c.embedding <=> q.embedding
+      limit match_count
+    ) m
+    -- relaxed_order can return slightly out-of-order rows; re-sort each query's k.
+    order by 1, m.similarity desc;
+end;
+$$;
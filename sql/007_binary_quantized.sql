@@ -0,0 +1,62 @@
+-- Binary-quantized ANN search with exact rescoring (pgvector >= 0.8: binary
+-- quantization needs 0.7, and filtered searches set hnsw.iterative_scan, like 005/006).
+--
+-- The HNSW index is built over binary_quantize(embedding): 48 bytes per chunk
+-- instead of 1536, so a large collection's index fits in memory. Each query
+-- walks that index by Hamming distance for match_count * rescore_factor
+-- candidates, then re-orders them by exact cosine distance on the stored
+-- float embedding, which is read only for those candidates.
+--
+-- Once this is in place the float HNSW index from 004 can be dropped to
+-- reclaim its memory:  drop index if exists chunks_embedding_hnsw_idx;
+create index if not exists chunks_embedding_bin_idx
+  on chunks using hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops);
+
+analyze chunks;
+
+create or replace function match_chunks_binary(
+  query_embeddings vector(384)[],
+  match_count int,
+  filter_doc_ids uuid[] default null,
+  rescore_factor int default 16,
+  ef_search int default 64
+)
+returns table (
+  query_index int,
+  id uuid,
+  doc_id uuid,
+  chunk_index int,
+  content text,
+  pages int[],
+  similarity float
+)
+language plpgsql stable
+as $$
+begin
+  -- The index walk must surface every candidate we want to rescore (hnsw caps ef_search at 1000).
+  perform set_config(
+    'hnsw.ef_search', least(greatest(ef_search, match_count * rescore_factor), 1000)::text, true
+  );
+  if filter_doc_ids is not null then
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  end if;
+
+  return query
+    select (q.ord - 1)::int, m.id, m.doc_id, m.chunk_index, m.content, m.pages, m.similarity
+    from unnest(query_embeddings) with ordinality as q(embedding, ord)
+    cross join lateral (
+      select r.id, r.doc_id, r.chunk_index, r.content, r.pages,
+             1 - (r.embedding <=> q.embedding) as similarity
+      from (
+        select c.id, c.doc_id, c.chunk_index, c.content, c.pages, c.embedding
+        from chunks c
+        where filter_doc_ids is null or c.doc_id = any(filter_doc_ids)
+        order by binary_quantize(c.embedding)::bit(384) <~> binary_quantize(q.embedding)
+        limit match_count * rescore_factor
+      ) r
+      order by r.embedding <=> q.embedding
+      limit match_count
+    ) m
+    order by 1, m.similarity desc;
+end;
+$$;
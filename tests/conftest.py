@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Modules under app/ import each other by flat name (as under `streamlit run app/main.py`).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
@@ -0,0 +1,178 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from bulk_upload import (
+    CHUNK_COLUMNS,
+    BulkUploader,
+    ChunkSink,
+    PostgresCopySink,
+    SupabaseRestSink,
+    is_transient,
+)
+
+SCHEMA = (Path(__file__).resolve().parents[1] / "sql" / "001_tables.sql").read_text(encoding="utf-8")
+
+ROW = {
+    "doc_id": "11111111-1111-1111-1111-111111111111",
+    "chunk_index": 3,
+    "content": "hello",
+    "content_hash": "abc",
+    "pages": [2, 3],
+    "embedding": [0.5, -0.25],
+}
+
+
+class FakeAPIError(Exception):
+    """Shaped like postgrest.exceptions.APIError: `code` is a SQLSTATE string."""
+
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("code", ["23503", "23505", "42501", "22P02"])
+def test_permanent_sqlstates_are_not_retried(code):
+    assert not is_transient(FakeAPIError(code))
+
+
+@pytest.mark.parametrize("code", ["08006", "40001", "40P01", "53300", "57P01"])
+def test_transient_sqlstates_are_retried(code):
+    assert is_transient(FakeAPIError(code))
+
+
+@pytest.mark.parametrize("status, expected", [(429, True), (503, True), (500, True), (400, False), (409, False)])
+def test_http_status(status, expected):
+    assert is_transient(FakeHTTPError(status)) is expected
+
+
+def unique_index_columns():
+    m = re.search(r"create unique index if not exists chunks_\w+ on chunks\(([^)]*)\)", SCHEMA)
+    assert m, "sql/001_tables.sql must define the chunk upsert's unique index"
+    return tuple(c.strip() for c in m.group(1).split(","))
+
+
+class FakeTable:
+    def __init__(self):
+        self.calls = []
+
+    def upsert(self, payload, on_conflict, ignore_duplicates):
+        self.calls.append((payload, on_conflict, ignore_duplicates))
+        return self
+
+    def execute(self):
+        return type("Res", (), {"data": []})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name):
+        return self.tables.setdefault(name, FakeTable())
+
+
+def test_rest_sink_writes_schema_columns_and_conflict_target():
+    client = FakeClient()
+    legacy = dict(ROW)
+    legacy["document_id"] = legacy.pop("doc_id")
+    legacy["metadata"] = {"pages": legacy.pop("pages")}
+
+    SupabaseRestSink(client).write([ROW, legacy])
+
+    [(payload, on_conflict, ignore)] = client.tables["chunks"].calls
+    assert ignore
+    assert tuple(on_conflict.split(",")) == unique_index_columns()
+    for rec in payload:
+        assert tuple(rec) == CHUNK_COLUMNS
+        assert rec["doc_id"] == ROW["doc_id"]
+        assert rec["pages"] == [2, 3]
+        assert rec["embedding"] == "[0.5,-0.25]"
+    for col in CHUNK_COLUMNS:
+        assert re.search(rf"^\s+{col} ", SCHEMA, re.M), col
+
+
+class FakeCopy:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write_row(self, row):
+        self.rows.append(row)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.conn.sql.append(sql)
+
+    def copy(self, sql):
+        self.conn.sql.append(sql)
+        return FakeCopy(self.conn.rows)
+
+
+class FakeConn:
+    closed = False
+
+    def __init__(self):
+        self.sql = []
+        self.rows = []
+
+    def transaction(self):
+        return FakeCursor(self)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_copy_sink_writes_schema_columns_and_conflict_target():
+    sink = PostgresCopySink("postgresql://unused")
+    conn = FakeConn()
+    sink._local.conn = conn
+
+    sink.write([ROW])
+
+    copy_sql = next(s for s in conn.sql if s.startswith("copy "))
+    assert copy_sql == f"copy _chunks_stage ({', '.join(CHUNK_COLUMNS)}) from stdin"
+    insert_sql = next(s for s in conn.sql if s.startswith("insert "))
+    assert f"on conflict ({', '.join(unique_index_columns())}) do nothing" in insert_sql
+    assert conn.rows == [(ROW["doc_id"], 3, "hello", "abc", "{2,3}", "[0.5,-0.25]")]
+
+
+class FailingSink(ChunkSink):
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def write(self, rows):
+        self.calls += 1
+        raise self.error
+
+
+def test_uploader_does_not_retry_permanent_errors():
+    sink = FailingSink(FakeAPIError("23505"))
+    uploader = BulkUploader(sink, batch_size=1, backoff_s=0)
+    uploader.add(ROW)
+    with pytest.raises(FakeAPIError):
+        uploader.close()
+    assert sink.calls == 1
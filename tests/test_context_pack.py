@@ -0,0 +1,59 @@
+import logging
+import sys
+
+import context_pack
+from context_pack import count_tokens, format_hit, pack_hits
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho sigma".split()
+
+
+def text(seed, n=60):
+    return " ".join(WORDS[(seed * 7 + i * (seed + 1)) % len(WORDS)] + str(i % (seed + 3)) for i in range(n))
+
+
+def hit(idx, content, score, pages=(1,)):
+    return {"doc_id": "d", "chunk_index": idx, "content": content, "similarity": score, "pages": list(pages)}
+
+
+def test_hits_that_do_not_fit_are_skipped_whole():
+    big, small = hit(0, text(1, 200), 0.9), hit(1, text(2, 20), 0.5)
+    budget = count_tokens(format_hit(small, small["content"])) + 5
+
+    packed = pack_hits([big, small], budget)
+
+    assert packed.hits == [small]
+    assert packed.text == format_hit(small, small["content"])
+    assert packed.tokens <= budget
+
+
+def test_best_ranked_first_and_near_duplicates_dropped():
+    a = " ".join(f"word{i}" for i in range(60))
+    near_copy = a + " extra"  # Jaccard of 5-word shingles ~0.98
+    other = " ".join(f"term{i}" for i in range(60))
+    packed = pack_hits([hit(0, other, 0.5), hit(1, near_copy, 0.8), hit(2, a, 0.9)], 10_000)
+
+    assert [h["chunk_index"] for h in packed.hits] == [2, 0]
+    assert packed.dropped_duplicates == 1
+
+
+def test_chunker_overlap_is_trimmed():
+    shared = " ".join(f"overlap{i}" for i in range(12))  # > 40 chars repeated across chunks
+    first = text(5, 30) + " " + shared
+    second = shared + " " + text(6, 30)
+    packed = pack_hits([hit(0, first, 0.9, pages=(1,)), hit(1, second, 0.8, pages=(2,))], 10_000)
+
+    assert packed.text.count(shared) == 1
+    assert packed.pages == [1, 2]
+    assert packed.saved_tokens == packed.baseline_tokens - packed.tokens > 0
+
+
+def test_missing_tiktoken_falls_back_and_warns_once(monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    context_pack._encoding.cache_clear()
+    try:
+        with caplog.at_level(logging.WARNING):
+            assert count_tokens("x" * 40, encoding="fallback_test") == 10
+            assert count_tokens("x" * 8, encoding="fallback_test") == 2
+        assert sum("estimates" in r.message for r in caplog.records) == 1
+    finally:
+        context_pack._encoding.cache_clear()
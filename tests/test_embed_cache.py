@@ -0,0 +1,67 @@
+import numpy as np
+
+from embed_cache import EmbeddingCache
+
+
+def test_stale_index_after_crash_never_serves_another_texts_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dim=4, capacity=2, flush_every=1000)
+    a, b, c = np.eye(4, dtype=np.float32)[:3]
+    cache.put_many("m", ["a", "b"], [a, b])
+    cache.flush()
+
+    # Evicts "a" and reuses its slot for "c"; the index on disk still maps "a" there.
+    cache.put_many("m", ["c"], [c])
+    del cache  # crash: no flush
+
+    reopened = EmbeddingCache(str(tmp_path), dim=4, capacity=2, flush_every=1000)
+    got_a, got_b = reopened.get_many("m", ["a", "b"])
+    assert got_a is None
+    np.testing.assert_array_equal(got_b, b)
+
+
+class _FakeModel:
+    def __init__(self, dim):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.calls += 1
+        return np.ones((len(texts), self.dim), dtype=np.float32)
+
+
+def _no_model():
+    raise AssertionError("model loaded")
+
+
+def test_all_hit_batch_never_loads_the_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dim=4, capacity=4)
+    model = _FakeModel(4)
+    cache.encode(lambda: model, "m", ["a", "b"])
+
+    got = cache.encode(_no_model, "m", ["b", "a"])
+    assert got.shape == (2, 4)
+    assert model.calls == 1
+
+
+def test_create_cache_takes_dim_from_metadata_without_the_model(tmp_path, monkeypatch):
+    import embed_cache
+
+    EmbeddingCache(str(tmp_path), dim=8, capacity=4).flush()
+    monkeypatch.setattr(embed_cache, "EMBED_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(embed_cache, "EMBED_CACHE_CAPACITY", 4)
+    monkeypatch.setattr(embed_cache, "get_embedder", _no_model)
+    assert embed_cache._create_cache().dim == 8
+
+    monkeypatch.setattr(embed_cache, "EMBED_CACHE_DIR", str(tmp_path / "new"))
+    assert embed_cache._create_cache().dim == embed_cache.EMBED_DIM
+
+
+def test_model_of_another_width_resets_the_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dim=4, capacity=4)
+    cache.put_many("m", ["a"], [np.ones(4, dtype=np.float32)])
+
+    got = cache.encode(lambda: _FakeModel(6), "m2", ["a", "b"])
+    assert got.shape == (2, 6)
+    assert cache.dim == 6 and cache.stats()["size"] == 2
+    cache.flush()
+    assert EmbeddingCache(str(tmp_path), dim=6, capacity=4).stats()["size"] == 2
@@ -0,0 +1,89 @@
+import re
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("sentence_transformers")
+
+import embed_onnx  # noqa: E402
+from embed_onnx import CHECK_SENTENCES, OnnxEmbedder, export_onnx, load_onnx_embedder, onnx_model_dir  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """A 2-layer, 32-dim BERT with a vocabulary covering CHECK_SENTENCES, saved like a hub model."""
+    root = tmp_path_factory.mktemp("tiny_bert")
+    words = sorted({w.lower() for s in CHECK_SENTENCES for w in re.findall(r"\w+|[^\w\s]", s)})
+    vocab = root / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words), encoding="utf-8")
+
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=len(words) + 5,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=128,
+    )
+    model_dir = root / "model"
+    transformers.BertModel(config).save_pretrained(model_dir)
+    transformers.BertTokenizerFast(vocab_file=str(vocab), model_max_length=128).save_pretrained(model_dir)
+    return str(model_dir)
+
+
+def reference(model_name, texts):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, device="cpu").encode(texts, normalize_embeddings=True)
+
+
+def test_fp32_export_matches_pytorch(tiny_model, tmp_path):
+    meta = export_onnx(tiny_model, str(tmp_path / "fp32"), quantize=False, min_cos=0.999)
+    assert meta["min_cosine"] > 0.9999
+    assert meta["threads"] >= 1
+
+    texts = ["short", CHECK_SENTENCES[2], CHECK_SENTENCES[-1], "installation"]
+    got = OnnxEmbedder(str(tmp_path / "fp32"), batch_size=2).encode(texts, normalize_embeddings=True)
+    assert got.shape == (4, 32)
+    np.testing.assert_allclose((got * reference(tiny_model, texts)).sum(axis=1), 1.0, atol=1e-4)
+
+
+def test_int8_export_stays_within_tolerance(tiny_model, tmp_path):
+    meta = export_onnx(tiny_model, str(tmp_path / "int8"), quantize=True, min_cos=0.9)
+    assert meta["quantized"]
+    assert meta["min_cosine"] >= 0.9
+
+
+def test_rejected_export_is_not_retried_until_tolerance_changes(tiny_model, tmp_path, monkeypatch):
+    calls = []
+    real_export = embed_onnx.export_onnx
+
+    def counting_export(*args, **kwargs):
+        calls.append(kwargs["min_cos"])
+        return real_export(*args, **kwargs)
+
+    monkeypatch.setattr(embed_onnx, "export_onnx", counting_export)
+    root = str(tmp_path)
+
+    with pytest.raises(RuntimeError, match="drifted"):
+        load_onnx_embedder(root, tiny_model, quantize=False, min_cos=1.01)
+    with pytest.raises(RuntimeError, match="rejected"):
+        load_onnx_embedder(root, tiny_model, quantize=False, min_cos=1.01)
+    assert calls == [1.01]
+    assert embed_onnx.read_meta(onnx_model_dir(root, tiny_model, False))["rejected"]
+
+    embedder = load_onnx_embedder(root, tiny_model, quantize=False, min_cos=0.99)
+    assert calls == [1.01, 0.99]
+    assert embedder.encode("installation").shape == (32,)
+
+
+def test_count_tokens_is_not_truncated(tiny_model, tmp_path):
+    export_onnx(tiny_model, str(tmp_path / "fp32"), quantize=False, min_cos=0.999)
+    embedder = OnnxEmbedder(str(tmp_path / "fp32"))
+    text = " ".join(["installation"] * (embedder.max_seq_length + 10))
+    assert embedder.count_tokens(text) == embedder.max_seq_length + 10
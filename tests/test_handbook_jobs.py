@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+
+from handbook import generate_handbook_markdown
+from handbook_jobs import HandbookJobStore, job_id_for
+from llm_mock import MockLLM
+
+
+class CountingLLM(MockLLM):
+    def __init__(self):
+        super().__init__()
+        self.outlines = 0
+
+    def generate(self, prompt):
+        if "Return ONLY a numbered outline" in prompt:
+            self.outlines += 1
+        return super().generate(prompt)
+
+
+def test_finished_job_is_removed_and_not_replayed(tmp_path):
+    store = HandbookJobStore(str(tmp_path))
+    llm = CountingLLM()
+    job_id = job_id_for("Topic", [], 300)
+
+    first = generate_handbook_markdown(llm, "Topic", [], target_words=300, job_store=store)
+    assert first.job_id == job_id
+    assert not store.exists(job_id)
+
+    generate_handbook_markdown(llm, "Topic", [], target_words=300, job_store=store)
+    assert llm.outlines == 2
+
+
+def test_legacy_done_checkpoint_starts_a_new_job(tmp_path):
+    store = HandbookJobStore(str(tmp_path))
+    job_id = job_id_for("Topic", [], 300)
+    store.append(job_id, {"type": "outline", "outline": ["Old"]})
+    store.append(job_id, {"type": "done"})
+
+    result = generate_handbook_markdown(MockLLM(), "Topic", [], target_words=300, job_store=store)
+    assert result.outline != ["Old"]
+
+
+def test_prune_removes_only_stale_checkpoints(tmp_path):
+    store = HandbookJobStore(str(tmp_path))
+    store.append("old", {"type": "outline", "outline": ["A"]})
+    store.append("new", {"type": "outline", "outline": ["B"]})
+    stale = time.time() - 3600
+    os.utime(tmp_path / "old.jsonl", (stale, stale))
+
+    assert store.prune(60) == 1
+    assert not store.exists("old")
+    assert store.exists("new")
+
+
+class FailingConclusionLLM(MockLLM):
+    def generate(self, prompt):
+        if "final conclusion" in prompt:
+            raise RuntimeError("LLM unavailable")
+        return super().generate(prompt)
+
+
+def test_failed_handbook_leaves_no_temp_file(tmp_path):
+    out = tmp_path / "out" / "handbook.md"
+    with pytest.raises(RuntimeError, match="unavailable"):
+        generate_handbook_markdown(FailingConclusionLLM(), "Topic", [], target_words=300, output_path=str(out))
+    assert list((tmp_path / "out").iterdir()) == []
+
+
+def test_concurrent_resume_fills_checkpoint_gaps_in_outline_order(tmp_path):
+    store = HandbookJobStore(str(tmp_path))
+    job_id = job_id_for("Topic", [], 5)
+    outline = ["One", "Two", "Three", "Four"]
+    store.append(job_id, {"type": "outline", "outline": outline})
+    store.append(job_id, {"type": "section", "idx": 1, "markdown": "## One\n\nfirst"})
+    store.append(job_id, {"type": "section", "idx": 3, "markdown": "## Three\n\nthird"})
+
+    result = generate_handbook_markdown(MockLLM(), "Topic", [], target_words=5, concurrency=2, job_store=store)
+
+    md = result.markdown
+    assert md.index("## One\n\nfirst") < md.index("## Two") < md.index("## Three\n\nthird")
+    assert "## Four" not in md.split("---", 1)[1]  # target already met: no new sections past the gap
@@ -0,0 +1,43 @@
+import time
+
+import handbook_runner
+from handbook_jobs import HandbookJobStore
+from handbook_runner import HandbookRunner
+
+
+class FakeResult:
+    words = 3
+    tokens = 4
+    prompt_tokens_saved = 0
+    planner_tokens_saved = 0
+    markdown = "# Handbook"
+
+
+def wait_finished(runner, job_id):
+    for _ in range(200):
+        st = runner.status(job_id)
+        if st is not None and st.finished:
+            return st
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_finished_statuses_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(handbook_runner, "generate_handbook_markdown", lambda **kw: FakeResult())
+    runner = HandbookRunner(HandbookJobStore(str(tmp_path)), workers=1, max_finished=2)
+
+    first = runner.submit(None, "one", [])
+    assert wait_finished(runner, first).markdown == "# Handbook"
+    runner.forget(first)
+    assert runner.status(first) is None
+
+    ids = [runner.submit(None, topic, []) for topic in ("a", "b", "c")]
+    for job_id in ids:
+        wait_finished(runner, job_id)
+    runner.submit(None, "d", [])  # eviction runs on submit/status
+    assert runner.status(ids[0]) is None
+    assert runner.status(ids[2]) is not None
+
+    runner.finished_ttl_s = 0
+    time.sleep(0.01)
+    assert runner.status(ids[2]) is None
@@ -0,0 +1,19 @@
+from ingest import iter_sentence_chunks
+
+
+def uneven_count(text):
+    """Stand-in wordpiece counter: long words cost several tokens, like rare terms and codes do."""
+    return sum(1 + len(w) // 4 for w in text.split())
+
+
+def test_chunks_stay_within_the_counters_limit():
+    # One run-on sentence mixing short words and long identifiers, so the
+    # average tokens-per-word estimate undershoots for some stretches.
+    words = [("ISO/IEC-27001:2022-annex-A.5.23" if i % 7 == 0 else "to") for i in range(600)]
+    pages = [(1, " ".join(words) + "."), (2, "Short sentence. Another one here.")]
+
+    chunks = list(iter_sentence_chunks(pages, max_tokens=64, overlap_tokens=8, count=uneven_count))
+
+    assert len(chunks) > 1
+    assert all(uneven_count(c.text) <= 64 for c in chunks)
+    assert " ".join(c.text for c in chunks).count("annex") >= words.count(words[0])
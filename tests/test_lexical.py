@@ -0,0 +1,75 @@
+import pytest
+
+from lexical import BM25Index, rrf_fuse, tokenize
+
+ROWS = [
+    {"document_id": "d1", "chunk_index": 0, "content": "Error E-1042 means the pump lost pressure.", "pages": [1]},
+    {"document_id": "d1", "chunk_index": 1, "content": "Section 4.2.1 covers pump maintenance.", "pages": [2]},
+    {"document_id": "d2", "chunk_index": 0, "content": "Pump pump pump: an overview of pumps.", "pages": [1]},
+    {"doc_id": "d2", "chunk_index": 1, "content": "Valves and fittings.", "metadata": {"pages": [3]}},
+]
+
+
+@pytest.fixture
+def index():
+    idx = BM25Index()
+    idx.add(ROWS)
+    return idx
+
+
+def test_compound_codes_are_kept_whole_and_split():
+    assert tokenize("Error E-1042 in section 4.2.1") == ["error", "e-1042", "1042", "section", "4.2.1"]
+    assert tokenize("ISO/IEC the a") == ["iso/iec", "iso", "iec"]
+
+
+@pytest.mark.parametrize("query, expected", [("E-1042", ("d1", 0)), ("error 1042", ("d1", 0)), ("4.2.1", ("d1", 1))])
+def test_code_terms_find_their_chunk(index, query, expected):
+    [hit] = index.search(query, top_k=5)
+    assert (hit["doc_id"], hit["chunk_index"]) == expected
+    assert hit["bm25"] > 0
+
+
+def test_ranking_prefers_higher_term_frequency(index):
+    hits = index.search("pump", top_k=5)
+    assert [(h["doc_id"], h["chunk_index"]) for h in hits][0] == ("d2", 0)
+    assert len(hits) == 3
+    assert [h["bm25"] for h in hits] == sorted((h["bm25"] for h in hits), reverse=True)
+
+
+def test_document_filter_and_removal(index):
+    assert {h["doc_id"] for h in index.search("pump", top_k=5, document_id="d1")} == {"d1"}
+    assert index.search("pump", top_k=5, document_id=[]) == []
+    index.remove_document("d2")
+    assert index.document_ids() == {"d1"}
+    assert [h["doc_id"] for h in index.search("pump", top_k=5)] == ["d1", "d1"]
+
+
+def test_save_load_round_trip(tmp_path, index):
+    index.directory = str(tmp_path)
+    index.save()
+    loaded = BM25Index(str(tmp_path))
+    assert len(loaded) == len(ROWS)
+    assert loaded.search("valves", top_k=1)[0]["pages"] == [3]
+    for q in ("pump", "E-1042", "4.2.1"):
+        assert loaded.search(q, top_k=5) == index.search(q, top_k=5)
+
+
+def hit(doc, idx, **extra):
+    return {"doc_id": doc, "chunk_index": idx, **extra}
+
+
+def test_rrf_fuse_disjoint_lists_interleave_by_rank():
+    fused = rrf_fuse([[hit("a", 0), hit("a", 1)], [hit("b", 0), hit("b", 1)]], top_k=4, k=60)
+    ranks = {(h["doc_id"], h["chunk_index"]): h["rrf_score"] for h in fused}
+    assert ranks == pytest.approx({("a", 0): 1 / 61, ("b", 0): 1 / 61, ("a", 1): 1 / 62, ("b", 1): 1 / 62})
+    assert {(h["doc_id"], h["chunk_index"]) for h in fused[:2]} == {("a", 0), ("b", 0)}
+
+
+def test_rrf_fuse_overlap_wins_and_keeps_first_lists_copy():
+    vector = [hit("a", 0, similarity=0.9), hit("a", 1, similarity=0.8)]
+    lexical = [hit("a", 1, bm25=3.0), {"document_id": "a", "chunk_index": 2, "bm25": 1.0}]
+    fused = rrf_fuse([vector, lexical], top_k=2, k=60)
+    assert (fused[0]["doc_id"], fused[0]["chunk_index"]) == ("a", 1)
+    assert fused[0]["similarity"] == 0.8 and fused[0]["bm25"] == 3.0
+    assert fused[0]["rrf_score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert len(fused) == 2
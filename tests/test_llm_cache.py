@@ -0,0 +1,47 @@
+from llm_base import LLMClient
+from llm_cache import CachedLLM
+
+
+class ScriptedLLM(LLMClient):
+    model = "scripted"
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return self.replies.pop(0)
+
+
+def test_empty_responses_are_not_cached(tmp_path):
+    inner = ScriptedLLM(["", "  \n", "answer"])
+    llm = CachedLLM(inner, str(tmp_path / "c.sqlite3"))
+    assert llm.generate("p") == ""
+    assert "".join(llm.stream("p")) == "  \n"
+    assert llm.generate("p") == "answer"
+    assert llm.generate("p") == "answer"
+    assert inner.calls == 3
+
+
+def test_generate_and_stream_share_one_stored_form(tmp_path):
+    inner = ScriptedLLM(["  answer\n"])
+    llm = CachedLLM(inner, str(tmp_path / "c.sqlite3"))
+    assert "".join(llm.stream("p")).strip() == "answer"
+    assert llm.generate("p") == "answer"
+    assert inner.calls == 1
+    assert llm.stats()["bytes"] == len("answer")
+
+
+def test_running_byte_total_tracks_replacement_and_eviction(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    llm = CachedLLM(ScriptedLLM([]), path, max_bytes=10)
+    llm.put("a", "12345")
+    llm.put("a", "123")
+    llm.put("b", "4567")
+    assert llm.stats()["bytes"] == 7
+    llm.put("c", "89abc")  # 12 bytes > 10: evicts the least recently used ("a")
+    assert llm.get("a") is None
+    stats = llm.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 9)
+    assert CachedLLM(ScriptedLLM([]), path).stats()["bytes"] == 9
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from retrieval_local import LocalVectorStore
+
+DIM = 384
+TOP_K = 10
+
+
+def make_data(n=3000, n_docs=5, n_clusters=40, seed=0):
+    """Clustered unit vectors (like chunk embeddings) spread over a few documents."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, DIM))
+    vecs = centers[rng.integers(n_clusters, size=n)] + 0.6 * rng.normal(size=(n, DIM))
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    queries = vecs[rng.choice(n, size=30, replace=False)] + 0.3 * rng.normal(size=(30, DIM))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    rows = [
+        {"doc_id": f"doc{i % n_docs}", "chunk_index": i, "content": f"chunk {i}", "pages": [i % 7 + 1], "embedding": v}
+        for i, v in enumerate(vecs.astype(np.float32))
+    ]
+    return rows, vecs.astype(np.float32), queries.astype(np.float32)
+
+
+ROWS, VECS, QUERIES = make_data()
+DOC_OF = np.array([r["doc_id"] for r in ROWS])
+
+
+def exact_top(q, mask=None):
+    sims = VECS @ q
+    if mask is not None:
+        sims = np.where(mask, sims, -np.inf)
+    return set(np.argsort(-sims)[:TOP_K].tolist())
+
+
+def recall(store, document_id=None, mask=None):
+    found = 0
+    for q in QUERIES:
+        got = {h["chunk_index"] for h in store.search(q, top_k=TOP_K, document_id=document_id)}
+        found += len(got & exact_top(q, mask))
+    return found / (TOP_K * len(QUERIES))
+
+
+def build(**kw):
+    store = LocalVectorStore(dim=DIM, **kw)
+    store.add(ROWS)
+    return store
+
+
+MODES = {
+    "flat": (dict(), 1.0),
+    "ivf": (dict(mode="ivf", nprobe=8, ivf_min_size=0), 0.95),
+    "int8": (dict(quantize="int8"), 1.0),
+    "int8-codes-only": (dict(quantize="int8", keep_float=False), 0.95),
+    "binary": (dict(quantize="binary"), 0.85),
+    "binary-codes-only": (dict(quantize="binary", keep_float=False), 0.85),
+}
+
+
+@pytest.mark.parametrize("name", list(MODES))
+def test_top_k_matches_exact_float_search(name):
+    kw, min_recall = MODES[name]
+    assert recall(build(**kw)) >= min_recall
+
+
+@pytest.mark.parametrize("name", list(MODES))
+def test_document_filter(name):
+    kw, min_recall = MODES[name]
+    store = build(**kw)
+    ids = ["doc1", "doc3"]
+    for q in QUERIES[:5]:
+        assert {h["doc_id"] for h in store.search(q, top_k=TOP_K, document_id=ids)} <= set(ids)
+    assert recall(store, document_id=ids, mask=np.isin(DOC_OF, ids)) >= min_recall
+    assert store.search(QUERIES[0], top_k=TOP_K, document_id=[]) == []
+
+
+def test_flat_scores_are_exact_and_batch_matches_single():
+    store = build()
+    q = QUERIES[0]
+    hits = store.search(q, top_k=TOP_K)
+    np.testing.assert_allclose([h["similarity"] for h in hits], np.sort(VECS @ q)[::-1][:TOP_K], rtol=1e-5)
+    for q, batch_hits in zip(QUERIES[:3], store.search_batch(QUERIES[:3], top_k=TOP_K, document_id="doc2")):
+        single = store.search(q, top_k=TOP_K, document_id="doc2")
+        assert [h["id"] for h in batch_hits] == [h["id"] for h in single]
+        np.testing.assert_allclose([h["similarity"] for h in batch_hits], [h["similarity"] for h in single], rtol=1e-5)
+
+
+@pytest.mark.parametrize("name", ["flat", "int8-codes-only", "binary", "binary-codes-only"])
+def test_save_load_round_trip(tmp_path, name):
+    kw, _ = MODES[name]
+    store = LocalVectorStore(str(tmp_path), dim=DIM, **kw)
+    store.add(ROWS)
+    store.remove_document("doc4")
+    store.save()
+
+    loaded = LocalVectorStore(str(tmp_path), dim=DIM, **kw)
+    assert len(loaded) == len(store)
+    assert not loaded.has_document("doc4")
+    for q in QUERIES[:5]:
+        assert loaded.search(q, top_k=TOP_K) == store.search(q, top_k=TOP_K)
@@ -0,0 +1,71 @@
+import handbook
+from handbook import generate_handbook_markdown
+from llm_mock import MockLLM
+from retrieval_plan import plan_sections
+
+
+def hit(idx, score, doc="d"):
+    return {"doc_id": doc, "chunk_index": idx, "similarity": score, "content": f"chunk {idx}", "pages": [1]}
+
+
+def indexes(hits):
+    return [h["chunk_index"] for h in hits]
+
+
+def test_reuse_cap_sends_a_chunk_to_the_sections_it_fits_best():
+    # Chunk 0 is retrieved by all three sections, best by the last two.
+    candidates = [
+        [hit(0, 0.70), hit(1, 0.60)],
+        [hit(0, 0.90), hit(2, 0.50)],
+        [hit(0, 0.80), hit(3, 0.40)],
+    ]
+    plan = plan_sections(candidates, top_k=2, max_reuse=2, min_hits=1)
+    assert [indexes(h) for h in plan.section_hits] == [[1], [0, 2], [0, 3]]
+    assert plan.reuse[("d", 0)] == 2
+    assert plan.capped == 1
+    assert plan.candidates == 4 and plan.assigned == 5
+
+
+def test_section_capacity_is_top_k_and_order_is_kept():
+    candidates = [[hit(i, 1.0 - i / 10) for i in range(6)]]
+    plan = plan_sections(candidates, top_k=3, max_reuse=2)
+    assert indexes(plan.section_hits[0]) == [0, 1, 2]
+
+
+def test_starved_section_tops_up_from_its_own_candidates_past_the_cap():
+    # Section 1's only matches are taken (cap 1) by sections that score them higher.
+    candidates = [
+        [hit(0, 0.9), hit(1, 0.8)],
+        [hit(0, 0.5), hit(1, 0.4), hit(2, 0.1)],
+    ]
+    plan = plan_sections(candidates, top_k=3, max_reuse=1, min_hits=2)
+    assert indexes(plan.section_hits[0]) == [0, 1]
+    # Only chunk 2 was free; the top-up adds its best candidate, chunk 0, despite the cap.
+    assert indexes(plan.section_hits[1]) == [0, 2]
+    assert plan.reuse[("d", 0)] == 2
+
+
+def test_same_chunk_index_in_different_documents_is_distinct():
+    candidates = [[hit(0, 0.9, doc="a")], [hit(0, 0.9, doc="b")]]
+    plan = plan_sections(candidates, top_k=1, max_reuse=1, min_hits=0)
+    assert [h[0]["doc_id"] for h in plan.section_hits] == ["a", "b"]
+
+
+def test_reuse_zero_disables_the_planner(monkeypatch):
+    shared = [hit(i, 1.0 - i / 10) for i in range(8)]
+    fetched = []
+
+    def retrieve(queries, top_k, document_id, path):
+        fetched.append(top_k)
+        return [list(shared) for _ in queries]
+
+    def no_plan(*args, **kwargs):
+        raise AssertionError("plan_sections must not run with max_chunk_reuse=0")
+
+    monkeypatch.setattr(handbook, "retrieve_context_batch", retrieve)
+    monkeypatch.setattr(handbook, "plan_sections", no_plan)
+    result = generate_handbook_markdown(
+        MockLLM(), "Topic", ["d"], target_words=200, top_k_context=4, max_chunk_reuse=0
+    )
+    assert fetched == [4]  # no over-fetch
+    assert result.planner_tokens_saved == 0
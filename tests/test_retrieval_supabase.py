@@ -0,0 +1,48 @@
+import re
+from pathlib import Path
+
+import pytest
+
+import retrieval_supabase
+from retrieval_supabase import SupabaseBackend
+
+SQL = Path(__file__).resolve().parents[1] / "sql"
+
+
+class FakeRPC:
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return type("Res", (), {"data": []})()
+
+
+def declared_params(function):
+    """Parameter names of `create or replace function <function>(...)` across sql/*.sql."""
+    for path in sorted(SQL.glob("*.sql")):
+        m = re.search(rf"function {function}\s*\((.*?)\)\s*returns", path.read_text(encoding="utf-8"), re.S)
+        if m:
+            return {line.split()[0] for line in m.group(1).split(",") if line.strip()}
+    raise AssertionError(f"{function} is not defined in sql/")
+
+
+@pytest.mark.parametrize(
+    "backend, call",
+    [
+        (SupabaseBackend(), lambda b: b.search([0.1], top_k=3, document_id="d1")),
+        (SupabaseBackend(ef_search=40), lambda b: b.search([0.1], top_k=3, document_id="d1")),
+        (SupabaseBackend(), lambda b: b.search_batch([[0.1]], top_k=3, document_id="d1")),
+        (SupabaseBackend(), lambda b: b.search_batch([[0.1]], top_k=3, document_id=["d1", "d2"])),
+        (SupabaseBackend(quantize="binary"), lambda b: b.search([0.1], top_k=3, document_id="d1")),
+    ],
+)
+def test_rpc_arguments_match_the_sql_signatures(monkeypatch, backend, call):
+    fake = FakeRPC()
+    monkeypatch.setattr(retrieval_supabase, "get_supabase", lambda: fake)
+    call(backend)
+    [(name, params)] = fake.calls
+    assert set(params) <= declared_params(name), name
@@ -0,0 +1,30 @@
+import retrieve
+from lexical import BM25Index
+from retrieval_supabase import SupabaseBackend
+
+
+def test_missing_supabase_documents_are_backfilled_once(tmp_path, monkeypatch):
+    stored = {
+        "doc-a": [{"doc_id": "doc-a", "chunk_index": 0, "content": "error E-1042 on boot", "pages": [1]}],
+        "doc-b": [],
+    }
+    fetched = []
+
+    def chunk_rows(document_id):
+        fetched.append(document_id)
+        return stored[document_id]
+
+    monkeypatch.setattr(retrieve, "stored_document_ids", lambda: list(stored))
+    monkeypatch.setattr(retrieve, "stored_chunk_rows", chunk_rows)
+    monkeypatch.setattr(retrieve, "_backfilled", set())
+    index = BM25Index(str(tmp_path))
+    monkeypatch.setattr(retrieve, "get_lexical_index", lambda: index)
+
+    assert retrieve._hybrid_index(True, None, SupabaseBackend(), None) is index
+    assert index.document_ids() == {"doc-a"}
+    assert BM25Index(str(tmp_path)).document_ids() == {"doc-a"}  # saved
+
+    retrieve._hybrid_index(True, None, SupabaseBackend(), ["doc-a", "doc-b"])
+    assert fetched == ["doc-a", "doc-b"]
+
+    assert retrieve._hybrid_index(False, None, SupabaseBackend(), None) is None